@@ -0,0 +1,217 @@
+# -*- coding: UTF-8 -*-
+"""
+asyncio variant of ActigraphClient, built on httpx (pip install actigraph[async]).
+
+Requires Python 3.8+, as httpx does.
+"""
+import asyncio
+import time
+
+import httpx
+
+from actigraph.client import ActigraphAuth, ActigraphClient
+from actigraph.instrumentation import RequestEvent, endpoint_template
+from actigraph.scheduler import RequestScheduler
+
+#Default number of requests allowed in flight at once
+DEFAULT_MAX_CONCURRENCY = 20
+
+#Errors making a request that are worth retrying
+RETRY_ERRORS = (httpx.TransportError,)
+
+
+class AsyncSingleFlight(object):
+    """Tasks awaiting do() with the same key while a call for it is in flight share its outcome"""
+    def __init__(self):
+        self.calls = {}
+
+    async def do(self, key, factory):
+        """Returns the result of awaiting factory(), or of the call already in flight for key"""
+        future = self.calls.get(key)
+        if future is None:
+            future = self.calls[key] = asyncio.ensure_future(factory())
+            future.add_done_callback(lambda _: self.calls.pop(key, None))
+        # Shielded so that one waiter being cancelled does not cancel the call for the others
+        return await asyncio.shield(future)
+
+
+class AsyncActigraphClient(ActigraphClient):
+    """An asyncio client for the Actigraph API
+
+    Has the same API methods as ActigraphClient but each returns an awaitable:
+
+        >>> async with AsyncActigraphClient(url, "access_key", "secret_key") as ac:
+        ...     result = await ac.get_all_studies()
+
+    Requests are signed with ActigraphAuth as usual, share one httpx connection pool and no more than
+    max_concurrency of them are in flight at once, however many are awaited. Attempts are scheduled and retried by
+    scheduler as for ActigraphClient.
+
+    The thread pool based bulk methods of ActigraphClient (get_study_snapshot, iter_study_subject_data,
+    iter_subject_*) are not available and raise TypeError, use gather_subjects instead. Streaming is not available
+    either, the API methods raise TypeError given stream=True.
+
+    The concurrency semaphore is made on the first request, so a client may be made before its event loop is
+    started but must then be used in that one loop.
+    """
+    def __init__(self, base_url, access_key, secret_key, max_concurrency=DEFAULT_MAX_CONCURRENCY, scheduler=None,
+                 instrumentation=None, coalesce=True, http2=False, http1=True):
+        # Deliberately does not call ActigraphClient.__init__, the requests session is replaced by an httpx one
+        self.auth = ActigraphAuth(base_url, access_key, secret_key)
+        self.max_concurrency = max_concurrency
+        # Made on first use, in the running loop, as asyncio primitives before 3.10 bind to a loop when made
+        self.semaphore = None
+        self.session = self._make_session(max_concurrency, http2, http1)
+        self.scheduler = RequestScheduler() if scheduler is None else scheduler
+        self.instrumentation = instrumentation
+        self.singleflight = AsyncSingleFlight() if coalesce else None
+        # The range cache fetches gaps synchronously so is not available
+        self.range_cache = None
+
+    def _make_session(self, max_concurrency, http2=False, http1=True):
+        """Make the shared httpx client, its pool sized to the concurrency limit"""
+        limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        #Verify = False because actigraph SSL cert signed by authority that is not in requests root cert store
+        return httpx.AsyncClient(limits=limits, verify=False, http2=http2, http1=http1)
+
+    async def close(self):
+        """Close the httpx client and any pooled connections"""
+        await self.session.aclose()
+
+    def __enter__(self):
+        raise TypeError("Use 'async with' with AsyncActigraphClient")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def get(self, api_url):
+        """Make a get request, each attempt signed afresh
+
+        With coalesce, tasks that get the same URL at the same time share one request and its response.
+
+        Instrumentation events have the latency, signing time, bytes and retries of the call, httpx does not expose
+        the connect, ttfb and body phases.
+        """
+        url = self.auth.make_url(api_url)
+        if self.singleflight is not None:
+            return await self.singleflight.do(url, lambda: self._get(url))
+        return await self._get(url)
+
+    async def _get(self, url):
+        """Send a request, telling the instrumentation if there is one"""
+        if self.instrumentation is None:
+            return await self._send(url, {})
+
+        timing = {}
+        start = time.time()
+        try:
+            response = await self._send(url, timing)
+        except Exception as e:
+            self.instrumentation.emit(RequestEvent(endpoint_template(url), url, latency=time.time() - start,
+                                                   retries=timing['attempts'] - 1, error=e))
+            raise
+        self.instrumentation.emit(RequestEvent(endpoint_template(url), url, status=response.status_code,
+                                               latency=time.time() - start, sign=timing['sign'],
+                                               bytes=len(response.content), retries=timing['attempts'] - 1))
+        return response
+
+    async def _send(self, url, timing):
+        """Send a request through the scheduler, recording the attempts made and last signing time in timing"""
+        scheduler = self.scheduler
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        attempt = 0
+        while True:
+            timing['attempts'] = attempt + 1
+            wait = scheduler.reserve()
+            if wait:
+                await asyncio.sleep(wait)
+            await self._acquire(scheduler)
+            try:
+                async with self.semaphore:
+                    # Time queued for the semaphore is not the server's, so is left out of the attempt's latency
+                    start = time.time()
+                    signing = time.time()
+                    headers = self.auth.make_headers(url)
+                    timing['sign'] = time.time() - signing
+                    response = await self.session.get(url, headers=headers)
+            except RETRY_ERRORS as e:
+                delay = scheduler.done(attempt, latency=time.time() - start, error=e)
+                if delay is None:
+                    raise
+            except BaseException:
+                if scheduler.limiter is not None:
+                    scheduler.limiter.release(failed=True)
+                raise
+            else:
+                delay = scheduler.done(attempt, response, latency=time.time() - start)
+                if delay is None:
+                    return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _acquire(self, scheduler):
+        """Take a concurrency slot of the scheduler's limiter, waiting for one to be given back without polling"""
+        limiter = scheduler.limiter
+        if limiter is None or limiter.try_acquire():
+            return
+        loop = asyncio.get_running_loop()
+        released = asyncio.Event()
+
+        def wake():
+            loop.call_soon_threadsafe(released.set)
+
+        # Added before trying again so that a slot given back in between is not missed
+        limiter.add_waiter(wake)
+        try:
+            while not limiter.try_acquire():
+                await released.wait()
+                released.clear()
+        finally:
+            limiter.remove_waiter(wake)
+
+    def _thread_pool_method(self, *args, **kwargs):
+        raise TypeError("AsyncActigraphClient has no thread pool bulk methods, use gather_subjects")
+
+    get_study_snapshot = _thread_pool_method
+    iter_study_subject_data = _thread_pool_method
+    iter_subject_daily_minutes = _thread_pool_method
+    iter_subject_sleep_epochs = _thread_pool_method
+    iter_subject_sleep_score = _thread_pool_method
+
+    def stream(self, api_url):
+        """Not available, httpx responses are read whole. Raises TypeError, as do the API methods given stream=True"""
+        raise TypeError("AsyncActigraphClient does not stream records, await the method without stream=True")
+
+    def _to_model(self, response, model_class, many):
+        """Make the payload of an awaitable response into a model or list of models, raising for failed responses"""
+        async def to_model():
+            return ActigraphClient._to_model(self, await response, model_class, many)
+        return to_model()
+
+    async def gather_subjects(self, method, subject_ids, *args, **kwargs):
+        """
+        Call an API method for many subjects concurrently, yielding (subject_id, result) as each completes
+
+            >>> async for subject_id, result in ac.gather_subjects('get_subject_daily_stats', [1, 2, 3]):
+            ...     print(subject_id, result.json())
+
+        method is the name of a subject API method, the subject id is passed as its first argument followed by any
+        other args. At most max_concurrency calls are in flight at once, an exception from any call is raised and
+        the outstanding calls are cancelled.
+        """
+        call = getattr(self, method)
+
+        async def one(subject_id):
+            return subject_id, await call(subject_id, *args, **kwargs)
+
+        tasks = [asyncio.ensure_future(one(subject_id)) for subject_id in subject_ids]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,163 @@
+# -*- coding: UTF-8 -*-
+"""
+Local sleep scoring of epoch payloads with NumPy (pip install actigraph[numpy]).
+
+Scores the epochs already fetched with get_subject_sleep_epochs so that the sleepscore call for the same night is not
+needed, and nights can be re-scored with other parameters without the network. Nights are scored as a batch: they
+are padded to the longest night and every step is vectorized over all of them at once.
+
+    >>> from actigraph.analysis import score_nights
+    >>> nights = [ac.get_subject_sleep_epochs(999, inbed, outbed) for inbed, outbed in bed_times]
+    >>> scores = score_nights(nights, algorithm='sadeh')
+    >>> scores['TotalSleepTime'], scores['Efficiency']
+
+The algorithms expect 60 second epochs of vertical axis counts, scaled and capped the way ActiLife does.
+"""
+__author__ = 'isparks'
+
+import numpy as np
+
+from actigraph.decode import records
+
+#Epoch key scored by default, the vertical axis
+AXIS = 'AxisYCounts'
+
+#Cole-Kripke (1992) weights of the epochs 4 before to 2 after the one scored, for 60 second epochs
+COLE_KRIPKE_WEIGHTS = (106, 54, 58, 76, 230, 74, 67)
+COLE_KRIPKE_BEFORE = 4
+
+#Sadeh (1994) window of 5 epochs either side for the mean and NAT, the epoch and 5 before it for the SD
+SADEH_WINDOW = 5
+SADEH_SD_WINDOW = 6
+
+#Per night summary, named after the keys of the sleepscore payload, times in minutes
+SLEEP_SUMMARY = [
+    ('TotalMinutesInBed', 'f8'),
+    ('TotalSleepTime', 'f8'),
+    ('WakeAfterSleepOnset', 'f8'),
+    ('Efficiency', 'f8'),
+    ('Latency', 'f8'),
+]
+
+
+def night_values(source, key=AXIS):
+    """Returns the values of key for the epochs of a night as floats, from a response, payload, decoded array or
+    array of values"""
+    if isinstance(source, np.ndarray):
+        return (source[key] if source.dtype.names else source).astype('f8')
+    return np.array([np.nan if epoch.get(key) is None else epoch[key] for epoch in records(source)], dtype='f8')
+
+
+def pad_nights(nights, key=AXIS):
+    """
+    Gather the values of key for many nights into one array of a row per night, padded with NaN to the longest
+
+    Returns (values, lengths), lengths being the number of epochs of each night.
+    """
+    rows = [night_values(night, key) for night in nights]
+    lengths = np.array([len(row) for row in rows], dtype='i8')
+    values = np.full((len(rows), lengths.max() if len(rows) else 0), np.nan)
+    for i, row in enumerate(rows):
+        values[i, :len(row)] = row
+    return values, lengths
+
+
+def _shifted(values, before, after, fill):
+    """Stack the values offset by -before to +after epochs along a new last axis, fill past the ends of a night"""
+    length = values.shape[-1]
+    padded = np.full(values.shape[:-1] + (before + length + after,), fill, dtype=values.dtype)
+    padded[..., before:before + length] = values
+    return np.stack([padded[..., offset:offset + length] for offset in range(before + after + 1)], axis=-1)
+
+
+def cole_kripke(counts, scale=100.0, cap=300.0, threshold=1.0, weights=COLE_KRIPKE_WEIGHTS,
+                before=COLE_KRIPKE_BEFORE):
+    """
+    Score epochs with the Cole-Kripke algorithm, True for sleep
+
+    counts is one night or a padded batch of nights (NaN padding, see pad_nights). Counts are divided by scale and
+    capped at cap, then an epoch is sleep when 0.001 times the sum of the weighted counts from before epochs before it
+    is below threshold. Epochs beyond the ends of a night count as 0, padding is scored False.
+    """
+    counts = np.asarray(counts, dtype='f8')
+    valid = ~np.isnan(counts)
+    scaled = np.minimum(np.where(valid, counts, 0.0) / scale, cap)
+    windows = _shifted(scaled, before, len(weights) - before - 1, 0.0)
+    activity = 0.001 * windows.dot(np.asarray(weights, dtype='f8'))
+    return (activity < threshold) & valid
+
+
+def sadeh(counts, cap=300.0, threshold=-4.0):
+    """
+    Score epochs with the Sadeh algorithm, True for sleep
+
+    counts is one night or a padded batch of nights (NaN padding, see pad_nights). Counts are capped at cap, then
+
+        PS = 7.601 - 0.065 MEAN - 1.08 NAT - 0.056 SD - 0.703 ln(counts + 1)
+
+    MEAN and NAT (the number of epochs with 50 <= counts < 100) are over the 11 epochs centred on the epoch scored and
+    SD over it and the 5 before, an epoch being sleep when PS > threshold. Windows are cut short at the ends of a
+    night, padding is scored False.
+    """
+    counts = np.asarray(counts, dtype='f8')
+    valid = ~np.isnan(counts)
+    capped = np.minimum(np.where(valid, counts, 0.0), cap)
+
+    windows = _shifted(capped, SADEH_WINDOW, SADEH_WINDOW, 0.0)
+    in_window = _shifted(valid, SADEH_WINDOW, SADEH_WINDOW, False)
+    mean = windows.sum(axis=-1) / np.maximum(in_window.sum(axis=-1), 1)
+    nat = (in_window & (windows >= 50) & (windows < 100)).sum(axis=-1)
+
+    windows = _shifted(capped, SADEH_SD_WINDOW - 1, 0, 0.0)
+    in_window = _shifted(valid, SADEH_SD_WINDOW - 1, 0, False)
+    n = np.maximum(in_window.sum(axis=-1), 1)
+    sd_mean = windows.sum(axis=-1) / n
+    sd = np.sqrt(np.maximum((windows ** 2).sum(axis=-1) / n - sd_mean ** 2, 0.0))
+
+    ps = 7.601 - 0.065 * mean - 1.08 * nat - 0.056 * sd - 0.703 * np.log(capped + 1)
+    return (ps > threshold) & valid
+
+
+ALGORITHMS = {
+    'cole_kripke': cole_kripke,
+    'sadeh': sadeh,
+}
+
+
+def sleep_summary(sleep, lengths=None, epoch_seconds=60):
+    """
+    Summarise scored nights, returns a structured array of SLEEP_SUMMARY with a row per night
+
+    sleep is one night or a batch of nights of True for sleep, lengths the number of epochs of each night (by default
+    the whole row). Latency is the time to the first sleep epoch, wake after sleep onset every wake epoch after it and
+    efficiency the percentage of the time in bed spent asleep. Times are in minutes.
+    """
+    sleep = np.atleast_2d(np.asarray(sleep, dtype=bool))
+    lengths = np.full(len(sleep), sleep.shape[1]) if lengths is None else np.asarray(lengths)
+    epoch_minutes = epoch_seconds / 60.0
+
+    in_night = np.arange(sleep.shape[1]) < lengths[:, np.newaxis]
+    sleep = sleep & in_night
+    total_sleep = sleep.sum(axis=1)
+    latency = np.where(sleep.any(axis=1), sleep.argmax(axis=1), lengths)
+
+    summary = np.zeros(len(sleep), dtype=SLEEP_SUMMARY)
+    summary['TotalMinutesInBed'] = lengths * epoch_minutes
+    summary['TotalSleepTime'] = total_sleep * epoch_minutes
+    summary['WakeAfterSleepOnset'] = (lengths - total_sleep - latency) * epoch_minutes
+    summary['Latency'] = latency * epoch_minutes
+    summary['Efficiency'] = np.where(lengths > 0, 100.0 * total_sleep / np.maximum(lengths, 1), 0.0)
+    return summary
+
+
+def score_nights(nights, algorithm='cole_kripke', key=AXIS, epoch_seconds=60, **params):
+    """
+    Score and summarise many nights in one batch
+
+    nights are sleepepochs responses, payloads, decoded arrays or arrays of counts. algorithm is a name from
+    ALGORITHMS, params are passed to it. Returns the sleep_summary of the nights.
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError("Unknown algorithm %r, choose from %s" % (algorithm, sorted(ALGORITHMS)))
+    counts, lengths = pad_nights(nights, key)
+    return sleep_summary(ALGORITHMS[algorithm](counts, **params), lengths, epoch_seconds)
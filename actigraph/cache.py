@@ -0,0 +1,342 @@
+# -*- coding: UTF-8 -*-
+"""
+Response caches for ActigraphClient.
+
+Minute data, sleep epochs and scores for past dates do not change once a device has synced, so their responses can be
+kept on disk and re-used across runs:
+
+    >>> from actigraph.cache import ResponseCache
+    >>> ac = ActigraphClient(url, "access_key", "secret_key", cache=ResponseCache('actigraph-cache.db'))
+
+Responses are keyed on the full resource URL. Rules decide which URLs are cached and for how long, the cache is
+bounded to max_bytes of bodies by evicting the least recently used entries.
+
+Bout periods and bed times are asked for over arbitrary start to stop ranges, so a RangeCache remembers which ranges
+of each subject's periods it holds and only fetches the parts of a range it does not:
+
+    >>> from actigraph.cache import RangeCache
+    >>> ac = ActigraphClient(url, "access_key", "secret_key", range_cache=RangeCache())
+"""
+__author__ = 'isparks'
+
+import bisect
+import datetime
+import itertools
+import json
+import re
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from six.moves.urllib.parse import urlsplit
+
+from actigraph.client import parse_isodatetime, payload_records
+from actigraph.intervals import IntervalIndex
+
+#TTL of responses that never expire
+FOREVER = float('inf')
+
+#Default bound on the total size of cached bodies
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+#Days after which data is taken not to change, allowing a couple of days for devices to sync
+DEFAULT_IMMUTABLE_AFTER = 2
+
+#Default bound on the number of resources a RangeCache holds the periods of
+DEFAULT_MAX_RESOURCES = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+"""
+
+
+def make_response(url, status, headers, body):
+    """Make a requests.Response for url as if it had been received"""
+    response = requests.Response()
+    response.status_code = status
+    response.reason = 'OK'
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = body
+    response.url = url
+    return response
+
+
+class CacheRule(object):
+    """
+    A rule for how long responses for matching resource URLs may be cached
+
+    pattern is a regular expression searched for in the resource URL (path and query string). ttl is the number
+    of seconds a response may be cached, FOREVER, or None to not cache it. If immutable_after (days) is given the
+    pattern must have a named group 'date' (YYYY-MM-DD) and responses for dates at least that many days ago never
+    expire.
+    """
+    def __init__(self, pattern, ttl=None, immutable_after=None):
+        self.pattern = re.compile(pattern)
+        self.ttl = ttl
+        self.immutable_after = immutable_after
+
+    def match(self, resource_url, today):
+        """Returns (matched, ttl) for a resource URL"""
+        match = self.pattern.search(resource_url)
+        if match is None:
+            return False, None
+        if self.immutable_after is not None:
+            date = datetime.datetime.strptime(match.group('date'), '%Y-%m-%d').date()
+            if (today - date).days >= self.immutable_after:
+                return True, FOREVER
+        return True, self.ttl
+
+
+#Minutes, epochs and scores are immutable once the device has synced
+DEFAULT_RULES = [
+    CacheRule(r'/dayminutes/(?P<date>\d{4}-\d{2}-\d{2})$', immutable_after=DEFAULT_IMMUTABLE_AFTER),
+    CacheRule(r'/sleep(epochs|score)\?.*outbed=(?P<date>\d{4}-\d{2}-\d{2})',
+              immutable_after=DEFAULT_IMMUTABLE_AFTER),
+]
+
+
+class ResponseCache(object):
+    """
+    SQLite backed cache of successful responses
+
+    path is the database file, ':memory:' for a cache that lasts as long as the object. Safe to share between
+    threads. hits and misses count lookups of cacheable URLs.
+    """
+    def __init__(self, path=':memory:', rules=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.size = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def ttl(self, url):
+        """Returns the number of seconds a response for url may be cached by the first matching rule, or None"""
+        parts = urlsplit(url)
+        resource_url = parts.path + ('?' + parts.query if parts.query else '')
+        today = datetime.datetime.utcnow().date()
+        for rule in self.rules:
+            matched, ttl = rule.match(resource_url, today)
+            if matched:
+                return ttl
+        return None
+
+    def get(self, url):
+        """Returns the cached response for url, or None"""
+        if self.ttl(url) is None:
+            return None
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT status, headers, body, expires FROM responses WHERE url = ?",
+                                  (url,)).fetchone()
+            if row is not None and row[3] is not None and row[3] <= now:
+                self._delete(url)
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE responses SET accessed = ? WHERE url = ?", (now, url))
+            self.db.commit()
+
+        return make_response(url, row[0], json.loads(row[1]), bytes(row[2]))
+
+    def put(self, url, response):
+        """Cache response for url if it was successful and a rule allows it"""
+        ttl = self.ttl(url)
+        if ttl is None or response.status_code != 200:
+            return
+        now = time.time()
+        expires = None if ttl == FOREVER else now + ttl
+        body = response.content
+        with self.lock:
+            self._delete(url)
+            self.db.execute("INSERT INTO responses (url, status, headers, body, size, expires, accessed) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (url, response.status_code, json.dumps(dict(response.headers)), sqlite3.Binary(body),
+                             len(body), expires, now))
+            self.size += len(body)
+            self._evict()
+            self.db.commit()
+
+    def _delete(self, url):
+        """Delete any entry for url, caller holds the lock"""
+        row = self.db.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is not None:
+            self.db.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self.size -= row[0]
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes, caller holds the lock"""
+        while self.size > self.max_bytes:
+            url, size = self.db.execute("SELECT url, size FROM responses ORDER BY accessed LIMIT 1").fetchone()
+            self.db.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self.size -= size
+
+    def clear(self):
+        """Delete every entry"""
+        with self.lock:
+            self.db.execute("DELETE FROM responses")
+            self.db.commit()
+            self.size = 0
+
+    def close(self):
+        """Close the database"""
+        self.db.close()
+
+
+class PeriodRecords(object):
+    """
+    The period records held for one resource and the ranges they cover, sorted by the start of each period
+
+    claims are the (start, stop) ranges being fetched to be covered.
+    """
+    def __init__(self):
+        self.covered = IntervalIndex()
+        self.starts = []
+        self.periods = []
+        self.seen = set()
+        self.claims = []
+        self.used = 0
+
+    def add(self, records, keys):
+        """Add period records, dropping any already held"""
+        start_key, end_key = keys
+        for record in records:
+            identity = json.dumps(record, sort_keys=True)
+            if identity in self.seen:
+                continue
+            self.seen.add(identity)
+            start = parse_isodatetime(record[start_key])
+            i = bisect.bisect_right(self.starts, start)
+            self.starts.insert(i, start)
+            self.periods.insert(i, (parse_isodatetime(record[end_key]), record))
+
+    def overlapping(self, start, stop):
+        """Returns the records of the periods overlapping start to stop"""
+        last = bisect.bisect_left(self.starts, stop)
+        return [record for end, record in self.periods[:last] if end > start]
+
+    def claimed(self, ranges):
+        """True if any of the ranges overlaps a claim"""
+        return any(start < claim_stop and claim_start < stop
+                   for start, stop in ranges for claim_start, claim_stop in self.claims)
+
+
+class RangeCache(object):
+    """
+    In memory cache of period records (bout periods, bed times) by the time ranges they have been fetched for
+
+    For each resource the ranges already fetched are merged in an IntervalIndex. A request for a range only fetches
+    its gaps, one request per gap, and is answered with the held periods overlapping the range, as the API answers.
+
+    As for the ResponseCache rules, only data at least immutable_after days old is taken to be final: periods ending
+    later, say a bout still open, are returned but not held and the ranges they touch are never covered, so they are
+    fetched again every time. The periods of at most max_resources resources (subject and endpoint) are held, the
+    least recently used being dropped. A caller needing a gap another is already fetching waits for it rather than
+    fetching it too.
+
+    Failed responses are returned as they are and not cached. Safe to share between threads. hits counts ranges
+    answered without a request, misses those that needed one, requests the requests made.
+    """
+    def __init__(self, immutable_after=DEFAULT_IMMUTABLE_AFTER, max_resources=DEFAULT_MAX_RESOURCES):
+        self.immutable_after = immutable_after
+        self.max_resources = max_resources
+        self.condition = threading.Condition()
+        self.resources = {}
+        self.used = itertools.count()
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+
+    def _resource(self, url):
+        """Returns the periods of url, dropping the least recently used resource if over max_resources, caller holds
+        the condition"""
+        periods = self.resources.get(url)
+        if periods is None:
+            periods = self.resources[url] = PeriodRecords()
+            if len(self.resources) > self.max_resources:
+                # Resources being fetched for are kept
+                idle = [(other.used, key) for key, other in self.resources.items() if key != url and not other.claims]
+                if idle:
+                    del self.resources[min(idle)[1]]
+        periods.used = next(self.used)
+        return periods
+
+    def get(self, url, start, stop, keys, fetch):
+        """
+        Returns a response of the records of url (a resource URL without a query string) for start to stop
+
+        keys are the (start, end) keys of a period record, fetch(gap_start, gap_stop) gets the response for a range.
+        """
+        horizon = datetime.datetime.utcnow() - datetime.timedelta(days=self.immutable_after)
+        with self.condition:
+            periods = self._resource(url)
+            while True:
+                gaps = periods.covered.gaps(start, stop)
+                # Only the parts of gaps that can be covered are claimed, more recent parts are always fetched
+                claims = [(gap_start, min(gap_stop, horizon)) for gap_start, gap_stop in gaps if gap_start < horizon]
+                if not periods.claimed(claims):
+                    break
+                self.condition.wait()
+            periods.claims.extend(claims)
+            if gaps:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        start_key, end_key = keys
+        fresh = {}
+        try:
+            for gap_start, gap_stop in gaps:
+                response = fetch(gap_start, gap_stop)
+                if response.status_code != 200:
+                    return response
+                records = payload_records(response.json())
+                # Periods ending after the horizon may yet change, they are returned but not held and the gap is
+                # only covered up to the first of them
+                cut = min(gap_stop, horizon)
+                final = []
+                for record in records:
+                    if parse_isodatetime(record[end_key]) <= horizon:
+                        final.append(record)
+                    else:
+                        fresh[json.dumps(record, sort_keys=True)] = record
+                        cut = min(cut, parse_isodatetime(record[start_key]))
+                with self.condition:
+                    self.requests += 1
+                    periods.add(final, keys)
+                    if gap_start < cut:
+                        periods.covered.add(gap_start, cut)
+        finally:
+            with self.condition:
+                for claim in claims:
+                    periods.claims.remove(claim)
+                self.condition.notify_all()
+
+        with self.condition:
+            records = periods.overlapping(start, stop)
+        if fresh:
+            records = sorted(records + list(fresh.values()), key=lambda record: parse_isodatetime(record[start_key]))
+        return make_response(url, 200, {'Content-Type': 'application/json; charset=utf-8'},
+                             json.dumps(records).encode('utf-8'))
+
+    def clear(self):
+        """Forget every range"""
+        with self.condition:
+            self.resources = {}
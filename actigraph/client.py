@@ -3,13 +3,29 @@ __author__ = 'isparks'
 
 import requests
 import datetime
+import threading
+import time
 import hmac
 import hashlib
 import base64
 from six.moves.urllib.parse import urlencode
 
+from actigraph.instrumentation import TimedHTTPAdapter
+from actigraph.models import BedTime, BoutPeriod, DayStat, SleepEpoch, Study, Subject
+from actigraph.parallel import DEFAULT_MAX_WORKERS, imap_ordered, imap_unordered
+from actigraph.scheduler import RequestScheduler
+from actigraph.singleflight import SingleFlight
+from actigraph.streaming import iter_response_records
+
 SECONDS_IN_24_HOURS = 24 * 60 * 60
 
+#Key of the timestamp of each epoch/minute record
+TIMESTAMP_KEY = 'Timestamp'
+
+#Connection pool defaults, see requests.adapters.HTTPAdapter
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
 def isodatetime(dt):
     """Takes a date, returns ISO8601 date/time format"""
     return dt.strftime('%Y-%m-%dT%H:%M:%S')
@@ -18,25 +34,88 @@ def isodate(dt):
     """Takes a date, returns ISO8601 date format"""
     return dt.strftime('%Y-%m-%d')
 
+def parse_isodatetime(value):
+    """Takes an ISO8601 date/time string as returned by Actigraph (with or without trailing Z), returns a datetime"""
+    return datetime.datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+
+def payload_records(payload):
+    """
+    Takes a decoded JSON payload, returns its list of records
+
+    The payload is either the list itself or an object with a single list-valued member, e.g.
+    {"SubjectId": 1, "Epochs": [...]}
+    """
+    if isinstance(payload, list):
+        return payload
+    lists = [value for value in payload.values() if isinstance(value, list)]
+    if len(lists) != 1:
+        raise ValueError("Cannot find the records in payload with keys %s" % sorted(payload))
+    return lists[0]
+
+def daterange(start_date, end_date):
+    """Takes two dates, returns every date from start_date to end_date inclusive"""
+    return [start_date + datetime.timedelta(days=days) for days in range((end_date - start_date).days + 1)]
+
+def twenty_four_hour_windows(start, end):
+    """Split the span start to end into consecutive windows of no more than 24 hours, returns (start, end) tuples"""
+    windows = []
+    step = datetime.timedelta(seconds=SECONDS_IN_24_HOURS)
+    while start < end:
+        windows.append((start, min(start + step, end)))
+        start += step
+    return windows
+
+#Keys of the start and end of period records
+PERIOD_KEYS = {
+    'bouts': ('StartDateTime', 'EndDateTime'),
+    'bedtimes': ('InBed', 'OutBed'),
+}
+
+#Errors making a request that are worth retrying
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+#Names that can be included in a study snapshot, mapped to the client method called for each subject
+SNAPSHOT_METHODS = {
+    'subject': 'get_subject',
+    'stats': 'get_subject_stats',
+    'daily_stats': 'get_subject_daily_stats',
+}
+
 class ActigraphAuth(requests.auth.AuthBase):
-    """Custom requests authorizer for Actigraph"""
+    """Custom requests authorizer for Actigraph
+
+    The HMAC keyed with the secret key is prepared once and copied for each signature, and the date strings of the
+    last second signed in are kept, so signing many requests a second costs little more than hashing them.
+    """
     def __init__(self, base_url, access_key, secret_key):
         self.base_url = base_url
         self.access_key = access_key.encode('utf-8')
         self.secret_key = secret_key.encode('utf-8')
+        self._timing = threading.local()
+        self._mac = hmac.new(self.secret_key, digestmod=hashlib.sha256)
+        self._authorization = u"AGS " + access_key + u":"
+        #(second, ISO date, Date header) of the last second signed in, replaced whole so threads can share it
+        self._dates = (None, None, None)
 
     def __call__(self, r):
         """Call is made like:
            requests.get(url, auth=MyAuth())
         """
+        start = time.time()
         r.headers.update(self.make_headers(r.url))
+        self._timing.sign_seconds = time.time() - start
         return r
 
+    @property
+    def last_sign_seconds(self):
+        """Seconds taken to sign the last request signed by this thread, None if it has signed none"""
+        return getattr(self._timing, 'sign_seconds', None)
+
     def sign(self, signature_string):
         """Return the signed value of the signature string"""
-        return base64.b64encode(hmac.new(self.secret_key,
-                                         signature_string.encode('utf-8'),
-                                         hashlib.sha256).digest())
+        mac = self._mac.copy()
+        mac.update(signature_string.encode('utf-8'))
+        return base64.b64encode(mac.digest())
 
     def make_url(self, resource_url):
         """
@@ -45,21 +124,45 @@ class ActigraphAuth(requests.auth.AuthBase):
         url = u"%s%s" % (self.base_url, resource_url,)
         return url
 
+    def _date_strings(self, dt):
+        """Returns the ISO date and Date header strings of dt, formatted once a second"""
+        second = dt.replace(microsecond=0)
+        dates = self._dates
+        if dates[0] != second:
+            dates = self._dates = (second, isodatetime(dt), dt.strftime('%a, %d %b %Y %H:%M:%S +0000'))
+        return dates[1], dates[2]
+
     def make_headers(self, url):
         """Make headers for the request."""
 
         #Get the time of the request
         date_time = datetime.datetime.utcnow()
+        iso_date, date_header = self._date_strings(date_time)
 
-        #Make signature string
-        signature_string = self.make_signature_string(url, date_time)
-
-        #Sign it
-        signed = self.sign(signature_string)
+        #Make signature string and sign it
+        signed = self.sign('GET\n\n\n' + iso_date + 'Z\n' + url)
 
         #Set the headers
-        headers = self.make_authentication_headers(signed, date_time)
+        return {
+            'Authorization': self._authorization + signed.decode('utf-8'),
+            'Date': date_header,
+        }
 
+    def sign_many(self, urls):
+        """Make the headers for many requests at once, returns a list of them in the order of urls
+
+        The requests are signed as made now and must be sent before the API stops accepting that date.
+        """
+        iso_date, date_header = self._date_strings(datetime.datetime.utcnow())
+        prefix = 'GET\n\n\n' + iso_date + 'Z\n'
+        headers = []
+        for url in urls:
+            mac = self._mac.copy()
+            mac.update((prefix + url).encode('utf-8'))
+            headers.append({
+                'Authorization': self._authorization + base64.b64encode(mac.digest()).decode('utf-8'),
+                'Date': date_header,
+            })
         return headers
 
     def make_authentication_headers(self, signed_string, dt):
@@ -71,9 +174,8 @@ class ActigraphAuth(requests.auth.AuthBase):
 
         """
         return {
-                'Authorization' : u"AGS {}:{}".format(self.access_key.decode('utf-8'),
-                                                      signed_string.decode('utf-8')),
-                'Date' : dt.strftime('%a, %d %b %Y %H:%M:%S +0000')
+                'Authorization' : self._authorization + signed_string.decode('utf-8'),
+                'Date' : self._date_strings(dt)[1]
                 }
 
     def make_signature_string(self, url_path, dt):
@@ -97,28 +199,155 @@ class ActigraphAuth(requests.auth.AuthBase):
 
         """
         #API only has GET requests so there is no body to md5 hash, verb is always GET and content type is always ''
-        vals = dict(body_md5 = '',
-                    verb='GET',
-                    url_path=url_path,
-                    date=isodatetime(dt),
-                    content_type='',
-                    )
+        return 'GET\n\n\n' + self._date_strings(dt)[0] + 'Z\n' + url_path
+
+
+class SubjectSnapshot(object):
+    """The results of the calls made for one subject of a study snapshot
+
+    results maps each included name to its response, errors maps each included name whose call failed (including
+    non-2xx responses) to the exception raised.
+    """
+    def __init__(self, subject_id):
+        self.subject_id = subject_id
+        self.results = {}
+        self.errors = {}
 
-        string_to_sign = '{verb}\n{body_md5}\n{content_type}\n{date}Z\n{url_path}'.format(**vals)
-        return string_to_sign
+    @property
+    def ok(self):
+        """True if every call for the subject succeeded"""
+        return not self.errors
+
+    def __repr__(self):
+        return "<SubjectSnapshot %s results=%s errors=%s>" % (self.subject_id, sorted(self.results),
+                                                             sorted(self.errors))
 
 
 class ActigraphClient(object):
-    """A simple client that wraps the requests and authorization"""
-    def __init__(self, base_url, access_key, secret_key):
+    """A simple client that wraps the requests and authorization
+
+    The client owns a pooled, keep-alive requests.Session so repeated calls reuse TCP/TLS connections instead of
+    paying a handshake per call. The session may be shared by many threads; pool_maxsize should be at least the
+    number of threads making calls at once or surplus connections will be opened and thrown away.
+
+    Use close() (or the client as a context manager) to release the pooled connections.
+
+    cache is an optional actigraph.cache.ResponseCache, responses it holds are returned without a request.
+
+    range_cache is an optional actigraph.cache.RangeCache, bout periods and bed times asked for with both start and
+    stop are answered from it, only the parts of the range it does not hold being requested.
+
+    scheduler is an actigraph.scheduler.RequestScheduler that rate limits and retries requests, by default one that
+    retries throttled, unavailable and failed connections with jittered exponential backoff.
+
+    instrumentation is an optional actigraph.instrumentation.Instrumentation told about every request made.
+
+    adapter is an optional requests transport adapter mounted instead of the pooled HTTPAdapter, for example an
+    actigraph.http2.HTTP2Adapter to multiplex requests over HTTP/2. pool_connections and pool_maxsize are then the
+    adapter's business, and the instrumentation gets no connect or ttfb times.
+
+    With coalesce (the default) threads that get the same URL at the same time share one request and its response.
+    """
+    def __init__(self, base_url, access_key, secret_key,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE, cache=None,
+                 scheduler=None, instrumentation=None, coalesce=True, range_cache=None, adapter=None):
         self.auth = ActigraphAuth(base_url, access_key, secret_key)
+        self.instrumentation = instrumentation
+        self.session = self._make_session(pool_connections, pool_maxsize, adapter)
+        self.cache = cache
+        self.range_cache = range_cache
+        self.scheduler = RequestScheduler() if scheduler is None else scheduler
+        self.singleflight = SingleFlight() if coalesce else None
+
+    def _make_session(self, pool_connections, pool_maxsize, adapter=None):
+        """Make the shared session, mounting the given adapter or one with the requested pool sizes"""
+        session = requests.Session()
+        if adapter is None:
+            # The timed adapter measures connection set up for the instrumentation
+            adapter_class = requests.adapters.HTTPAdapter if self.instrumentation is None else TimedHTTPAdapter
+            adapter = adapter_class(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def close(self):
+        """Close the session and any pooled connections"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, api_url, stream=False):
+        """Make a get request
+
+        With stream=True see stream(), an iterator of the records of the response is returned instead.
+        """
+        if stream:
+            return self.stream(api_url)
 
-    def get(self, api_url):
-        """Make a get request"""
         url = self.auth.make_url(api_url)
+        if self.singleflight is not None:
+            return self.singleflight.do(url, lambda: self._get(url))
+        return self._get(url)
+
+    def _get(self, url):
+        """Get url from the cache if there is one, else send a request"""
+        if self.cache is None:
+            return self._send(url)
+
+        response = self.cache.get(url)
+        if response is None:
+            response = self._send(url)
+            self.cache.put(url, response)
+        return response
+
+    def _send(self, url, stream=False):
+        """Send a request through the scheduler, each attempt signed afresh by the auth"""
         #Verify = False because actigraph SSL cert signed by authority that is not in requests root cert store
         #TODO: Check that Verify still required
-        return requests.get(url, auth=self.auth, verify=False)
+        send = lambda: self.session.get(url, auth=self.auth, verify=False, stream=stream)
+        if self.instrumentation is not None:
+            timed = isinstance(self.session.get_adapter(url), TimedHTTPAdapter)
+            return self.instrumentation.call(self.scheduler, send, url, self.auth, retry_errors=RETRY_ERRORS,
+                                             connect_timed=timed)
+        return self.scheduler.call(send, retry_errors=RETRY_ERRORS)
+
+    def stream(self, api_url):
+        """
+        Make a get request, returning an iterator of the records of the response as they are read from the socket
+
+        Raises requests.HTTPError for a failed response. The body is parsed incrementally so memory does not grow
+        with the size of the response. The connection is held until the iterator is exhausted. Does not use the
+        cache.
+        """
+        url = self.auth.make_url(api_url)
+        response = self._send(url, stream=True)
+        if not response.ok:
+            response.close()
+            response.raise_for_status()
+        return iter_response_records(response)
+
+    def _result(self, api_url, model_class=None, many=False, stream=False):
+        """
+        Get api_url as an API method returns it: the response, or an iterator of records if stream. With a
+        model_class the payload (or each streamed record) is made into models, a list of them if many.
+        """
+        if stream:
+            records = self.stream(api_url)
+            return records if model_class is None else (model_class.from_record(record) for record in records)
+        response = self.get(api_url)
+        if model_class is None:
+            return response
+        return self._to_model(response, model_class, many)
+
+    def _to_model(self, response, model_class, many):
+        """Make the payload of a response into a model or list of models, raising for failed responses"""
+        response.raise_for_status()
+        payload = response.json()
+        return model_class.from_records(payload_records(payload)) if many else model_class.from_record(payload)
 
     def _check_start_end(self, start, end):
         """Check start < end or raise ValueError"""
@@ -134,41 +363,41 @@ class ActigraphClient(object):
 
     #- API Methods -----------------------------------------------------------------------------------------------------
 
-    def get_all_studies(self):
+    def get_all_studies(self, model=False):
         """
-        Get all studies that these credentials can access
+        Get all studies that these credentials can access, with model=True a list of Study
 
         https://github.com/actigraph/StudyAdminAPIDocumentation/blob/master/sections/studies.md#get-all-studies
         """
         url = "/v1/studies"
-        return self.get(url)
+        return self._result(url, Study if model else None, many=True)
 
-    def get_study(self, study_id):
+    def get_study(self, study_id, model=False):
         """
-        Get details of a particular study
+        Get details of a particular study, with model=True a Study
 
         https://github.com/actigraph/StudyAdminAPIDocumentation/blob/master/sections/studies.md#get-a-study
         """
         url = "/v1/studies/{0!s}".format(study_id)
-        return self.get(url)
+        return self._result(url, Study if model else None)
 
-    def get_all_subjects(self, study_id):
+    def get_all_subjects(self, study_id, model=False):
         """
-        Get all subjects for a study
+        Get all subjects for a study, with model=True a list of Subject
 
         https://github.com/actigraph/StudyAdminAPIDocumentation/blob/master/sections/studies.md#get-all-subjects-within-a-study
         """
         url = "/v1/studies/{0!s}/subjects".format(study_id)
-        return self.get(url)
+        return self._result(url, Subject if model else None, many=True)
 
-    def get_subject(self, subject_id):
+    def get_subject(self, subject_id, model=False):
         """
-        Get Subject Details
+        Get Subject Details, with model=True a Subject
 
         https://github.com/actigraph/StudyAdminAPIDocumentation/blob/master/sections/subjects.md#get-a-subject
         """
         url = "/v1/subjects/{0!s}".format(subject_id)
-        return self.get(url)
+        return self._result(url, Subject if model else None)
 
 
     def get_subject_stats(self, subject_id):
@@ -180,27 +409,28 @@ class ActigraphClient(object):
         url = "/v1/subjects/{0!s}/stats".format(subject_id)
         return self.get(url)
 
-    def get_subject_daily_stats(self, subject_id):
+    def get_subject_daily_stats(self, subject_id, model=False):
         """
-        Get Daily stats for a subject
+        Get Daily stats for a subject, with model=True a list of DayStat
 
         https://github.com/actigraph/StudyAdminAPIDocumentation/blob/master/sections/subjects.md#get-daily-stats-for-a-subject
         """
         url = "/v1/subjects/{0!s}/daystats".format(subject_id)
-        return self.get(url)
+        return self._result(url, DayStat if model else None, many=True)
 
-    def get_subject_daily_minutes(self, subject_id, date):
+    def get_subject_daily_minutes(self, subject_id, date, stream=False):
         """
-        Get daily minutes for subject
+        Get daily minutes for subject, with stream=True an iterator of the minute records (see stream())
 
         https://github.com/actigraph/StudyAdminAPIDocumentation/blob/master/sections/subjects.md#get-daily-minutes-for-a-subject
         """
         url = "/v1/subjects/{0!s}/dayminutes/{1}".format(subject_id, isodate(date))
-        return self.get(url)
+        return self.stream(url) if stream else self.get(url)
 
-    def get_subject_sleep_epochs(self, subject_id, inbed, outbed):
+    def get_subject_sleep_epochs(self, subject_id, inbed, outbed, stream=False, model=False):
         """
-        Get Sleep Epochs for a subject
+        Get Sleep Epochs for a subject, with stream=True an iterator of the epoch records (see stream()), with
+        model=True (a list or iterator of) SleepEpoch
         https://github.com/actigraph/StudyAdminAPIDocumentation/blob/master/sections/subjects.md#get-sleep-epochs-for-a-subject-v11
         """
         # Validations
@@ -208,7 +438,7 @@ class ActigraphClient(object):
         self._check_twenty_four_hours(inbed, outbed)
 
         url = "/v1/subjects/{0!s}/sleepepochs?inbed={1}&outbed={2}".format(subject_id, isodatetime(inbed), isodatetime(outbed))
-        return self.get(url)
+        return self._result(url, SleepEpoch if model else None, many=True, stream=stream)
 
     def get_subject_sleep_score(self, subject_id, inbed, outbed):
         """
@@ -237,32 +467,170 @@ class ActigraphClient(object):
             url = "{0}?{1}".format(url, urlencode(params)).replace('%3A',':')
         return url
 
-    def get_subject_bout_periods(self, subject_id, start=None, stop=None):
-        """
-        Get Subject Bout periods (when they are wearing and not wearing device)
-
-        https://github.com/actigraph/StudyAdminAPIDocumentation/blob/master/sections/subjects.md#get-bout-periods-for-a-subject-v12
-        """
-        url = "/v1/subjects/{0!s}/bouts".format(subject_id)
+    def _periods(self, endpoint, subject_id, start, stop, model_class, stream):
+        """Get the bout periods or bed times of a subject, through the range cache if there is one"""
+        url = "/v1/subjects/{0!s}/{1}".format(subject_id, endpoint)
 
         if start and stop:
             self._check_start_end(start, stop)
 
+        if self.range_cache is not None and start and stop and not stream:
+            fetch = lambda gap_start, gap_stop: self.get(self._mergeStartStopParams(url, gap_start, gap_stop))
+            response = self.range_cache.get(url, start, stop, PERIOD_KEYS[endpoint], fetch)
+            return response if model_class is None else self._to_model(response, model_class, True)
+
         url = self._mergeStartStopParams(url, start, stop)
 
-        return self.get(url)
+        return self._result(url, model_class, many=True, stream=stream)
 
-    def get_subject_bed_times(self, subject_id, start=None, stop=None):
+    def get_subject_bout_periods(self, subject_id, start=None, stop=None, stream=False, model=False):
         """
-        Get Subject in and out of bed times
+        Get Subject Bout periods (when they are wearing and not wearing device), with stream=True an iterator of the
+        bout records (see stream()), with model=True (a list or iterator of) BoutPeriod
+
+        https://github.com/actigraph/StudyAdminAPIDocumentation/blob/master/sections/subjects.md#get-bout-periods-for-a-subject-v12
+        """
+        return self._periods('bouts', subject_id, start, stop, BoutPeriod if model else None, stream)
+
+    def get_subject_bed_times(self, subject_id, start=None, stop=None, stream=False, model=False):
+        """
+        Get Subject in and out of bed times, with stream=True an iterator of the bed time records (see stream()), with
+        model=True (a list or iterator of) BedTime
 
         https://github.com/actigraph/StudyAdminAPIDocumentation/blob/master/sections/subjects.md#get-bed-times-for-a-subject-v13
         """
-        url = "/v1/subjects/{0!s}/bedtimes".format(subject_id)
+        return self._periods('bedtimes', subject_id, start, stop, BedTime if model else None, stream)
+
+    #- Bulk Methods ----------------------------------------------------------------------------------------------------
+
+    def _snapshot_subject(self, subject_id, include):
+        """Make the included calls for one subject, collecting rather than raising any failures"""
+        snapshot = SubjectSnapshot(subject_id)
+        for name in include:
+            try:
+                response = getattr(self, SNAPSHOT_METHODS[name])(subject_id)
+                response.raise_for_status()
+            except Exception as e:
+                snapshot.errors[name] = e
+            else:
+                snapshot.results[name] = response
+        return snapshot
+
+    def get_study_snapshot(self, study_id, include=None, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Get all subjects of a study then, on a pool of max_workers threads, make the included calls for each subject
 
-        if start and stop:
-            self._check_start_end(start, stop)
+        include is a list of names from SNAPSHOT_METHODS, by default all of them. Yields a SubjectSnapshot per subject
+        as soon as its calls are finished, in no particular order. A failed call is recorded on its snapshot and
+        does not stop the others. For best throughput pool_maxsize should be at least max_workers.
+        """
+        return self._iter_study_snapshot(study_id, self._check_include(include), max_workers)
+
+    def _check_include(self, include):
+        """Returns the list of snapshot calls to make, by default all, raising ValueError for unknown names"""
+        include = list(include or sorted(SNAPSHOT_METHODS))
+        for name in include:
+            if name not in SNAPSHOT_METHODS:
+                raise ValueError("Cannot include %r in a snapshot, choose from %s" % (name, sorted(SNAPSHOT_METHODS)))
+        return include
+
+    def _study_subject_ids(self, study_id):
+        """Returns the ids of the subjects of a study, raising for a failed response"""
+        response = self.get_all_subjects(study_id)
+        response.raise_for_status()
+        return [subject['Id'] for subject in response.json()]
+
+    def _iter_study_snapshot(self, study_id, include, max_workers):
+        """Generator behind get_study_snapshot, so that arguments are validated when it is called"""
+        for _, snapshot in imap_unordered(lambda subject_id: self._snapshot_subject(subject_id, include),
+                                          self._study_subject_ids(study_id), max_workers):
+            yield snapshot
+
+    def iter_study_subject_data(self, study_id, fetch=None, prefetch=DEFAULT_MAX_WORKERS, max_workers=None):
+        """
+        Get all subjects of a study then yield a SubjectSnapshot of the fetch calls for each, in subject order
 
-        url = self._mergeStartStopParams(url, start, stop)
+        fetch is a list of names from SNAPSHOT_METHODS, by default all of them. While the caller works on one subject
+        the calls for the next prefetch subjects are made in the background on max_workers threads (default
+        prefetch), so network and processing overlap. No more than prefetch snapshots are fetched ahead of the caller,
+        so memory stays bounded however many subjects there are.
+        """
+        return self._iter_study_subject_data(study_id, self._check_include(fetch), prefetch, max_workers or prefetch)
+
+    def _iter_study_subject_data(self, study_id, fetch, prefetch, max_workers):
+        """Generator behind iter_study_subject_data, so that arguments are validated when it is called"""
+        for _, snapshot in imap_ordered(lambda subject_id: self._snapshot_subject(subject_id, fetch),
+                                        self._study_subject_ids(study_id), max_workers, window=prefetch):
+            yield snapshot
+
+    def _get_window(self, window, method, subject_id):
+        """Call a sleep method for one (inbed, outbed) window, raising for failed responses"""
+        response = method(subject_id, window[0], window[1])
+        response.raise_for_status()
+        return response
+
+    def iter_subject_daily_minutes(self, subject_id, start_date, end_date, max_workers=DEFAULT_MAX_WORKERS,
+                                   stream=False):
+        """
+        Get daily minutes for subject for every date from start_date to end_date inclusive
 
-        return self.get(url)
+        Days are fetched concurrently and (date, response) is yielded for each in date order as soon as it and every
+        earlier day are ready. No more than max_workers days are fetched ahead of the day being yielded.
+
+        With stream=True (date, records) is yielded instead, records being an iterator parsing the day's minutes
+        as they are read. Consume each day's records before moving on to the next day.
+        """
+        if start_date > end_date:
+            raise ValueError("Start date after End date")
+
+        def fetch(date):
+            if stream:
+                return self.get_subject_daily_minutes(subject_id, date, stream=True)
+            response = self.get_subject_daily_minutes(subject_id, date)
+            response.raise_for_status()
+            return response
+
+        return imap_ordered(fetch, daterange(start_date, end_date), max_workers)
+
+    def iter_subject_sleep_epochs(self, subject_id, start, end, max_workers=DEFAULT_MAX_WORKERS, stream=False):
+        """
+        Get Sleep Epochs for a subject over a span of any length
+
+        The span is split into windows of no more than 24 hours which are fetched concurrently. Yields the epoch
+        records in time order, dropping epochs repeated where windows meet.
+
+        With stream=True each window's epochs are parsed as they are read rather than loaded whole, and are taken
+        to be in time order as the API returns them.
+        """
+        self._check_start_end(start, end)
+        return self._iter_sleep_epochs(subject_id, start, end, max_workers, stream)
+
+    def _iter_sleep_epochs(self, subject_id, start, end, max_workers, stream):
+        """Generator behind iter_subject_sleep_epochs, so that arguments are validated when it is called"""
+        if stream:
+            fetch = lambda window: self.get_subject_sleep_epochs(subject_id, window[0], window[1], stream=True)
+        else:
+            fetch = lambda window: self._get_window(window, self.get_subject_sleep_epochs, subject_id)
+        last = None
+        for _, result in imap_ordered(fetch, twenty_four_hour_windows(start, end), max_workers):
+            if stream:
+                epochs = ((parse_isodatetime(epoch[TIMESTAMP_KEY]), epoch) for epoch in result)
+            else:
+                epochs = [(parse_isodatetime(epoch[TIMESTAMP_KEY]), epoch) for epoch in payload_records(result.json())]
+                epochs.sort(key=lambda timed: timed[0])
+            for timestamp, epoch in epochs:
+                if last is None or timestamp > last:
+                    last = timestamp
+                    yield epoch
+
+    def iter_subject_sleep_score(self, subject_id, start, end, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Get Sleep Scores for a subject over a span of any length
+
+        The span is split into windows of no more than 24 hours which are fetched concurrently. Yields
+        (inbed, outbed, response) for each window in time order.
+        """
+        self._check_start_end(start, end)
+        fetch = lambda window: self._get_window(window, self.get_subject_sleep_score, subject_id)
+        return ((window[0], window[1], response)
+                for window, response in imap_ordered(fetch, twenty_four_hour_windows(start, end), max_workers))
@@ -0,0 +1,136 @@
+# -*- coding: UTF-8 -*-
+"""
+Columnar decoding of minute, epoch and daily stats payloads into NumPy structured arrays (pip install actigraph[numpy]).
+
+    >>> from actigraph.decode import decode_day_minutes, decode_many, DAY_MINUTES
+    >>> minutes = decode_day_minutes(ac.get_subject_daily_minutes(999, date))
+    >>> minutes['Timestamp'], minutes['AxisYCounts']
+    >>> month = decode_many((response for _, response in ac.iter_subject_daily_minutes(999, start, end)), DAY_MINUTES)
+
+Columns are named after the payload keys. Timestamps are datetime64, missing values are filled with NaT, NaN, 0 or
+False. A filled 0 or False cannot be told from a real one, so decode and decode_many can also return a mask of the
+missing values:
+
+    >>> minutes, missing = decode(response, DAY_MINUTES, mask=True)
+    >>> minutes['Steps'][~missing['Steps']]
+"""
+__author__ = 'isparks'
+
+import numpy as np
+
+from actigraph.client import payload_records
+
+#Schemas are lists of (payload key, dtype)
+DAY_MINUTES = [
+    ('Timestamp', 'datetime64[s]'),
+    ('AxisXCounts', 'i4'),
+    ('AxisYCounts', 'i4'),
+    ('AxisZCounts', 'i4'),
+    ('Steps', 'i4'),
+    ('Calories', 'f8'),
+    ('HeartRate', 'f8'),
+]
+
+SLEEP_EPOCHS = [
+    ('Timestamp', 'datetime64[s]'),
+    ('AxisXCounts', 'i4'),
+    ('AxisYCounts', 'i4'),
+    ('AxisZCounts', 'i4'),
+    ('Sleep', '?'),
+]
+
+DAY_STATS = [
+    ('Date', 'datetime64[D]'),
+    ('Steps', 'i8'),
+    ('Calories', 'f8'),
+    ('WearMinutes', 'i4'),
+]
+
+#Length of the ISO string each datetime64 unit is parsed from, drops any trailing Z
+DATETIME_LENGTHS = {'D': 10, 's': 19}
+
+
+def records(source):
+    """Takes a response, decoded payload or list of records, returns the list of records"""
+    if hasattr(source, 'json'):
+        source = source.json()
+    return payload_records(source)
+
+
+def _fill_column(column, key, dtype, rows):
+    """
+    Fill one column of a structured array from a list of record dicts
+
+    The column's values are gathered by one comprehension over the rows and assigned at once, which measures faster
+    than building the whole array from a tuple per row.
+    """
+    if dtype.kind == 'M':
+        length = DATETIME_LENGTHS[np.datetime_data(dtype)[0]]
+        column[:] = [row[key][:length] if row.get(key) else 'NaT' for row in rows]
+    elif dtype.kind == 'f':
+        column[:] = [np.nan if row.get(key) is None else row[key] for row in rows]
+    else:
+        column[:] = [row.get(key) or 0 for row in rows]
+
+
+def _mask_dtype(dtype):
+    return np.dtype([(name, '?') for name in dtype.names])
+
+
+def decode(source, schema, mask=False):
+    """
+    Decode the records of a response or payload into a structured array with the given schema
+
+    With mask=True returns (array, missing), missing being a structured array of booleans with the same columns,
+    True where the record did not have the key or it was null.
+    """
+    rows = records(source)
+    dtype = np.dtype([(str(key), field_dtype) for key, field_dtype in schema])
+    result = np.empty(len(rows), dtype=dtype)
+    for key in dtype.names:
+        _fill_column(result[key], key, dtype.fields[key][0], rows)
+    if not mask:
+        return result
+    missing = np.empty(len(rows), dtype=_mask_dtype(dtype))
+    for key in dtype.names:
+        missing[key] = [row.get(key) is None for row in rows]
+    return result, missing
+
+
+def decode_many(sources, schema, mask=False):
+    """
+    Decode the records of many responses or payloads into one structured array with the given schema
+
+    Each source is decoded as it is reached, so only one source's records are held as Python objects at a time,
+    and the decoded blocks are joined with a single concatenate. With mask=True returns (array, missing) as decode.
+    """
+    dtype = np.dtype([(str(key), field_dtype) for key, field_dtype in schema])
+    blocks = [decode(source, schema, mask=True) for source in sources] if mask else \
+        [decode(source, schema) for source in sources]
+    if not mask:
+        return np.concatenate(blocks or [np.empty(0, dtype=dtype)])
+    if not blocks:
+        return np.empty(0, dtype=dtype), np.empty(0, dtype=_mask_dtype(dtype))
+    return np.concatenate([block for block, _ in blocks]), np.concatenate([missing for _, missing in blocks])
+
+
+def decode_day_minutes(source, mask=False):
+    """Decode a dayminutes response or payload"""
+    return decode(source, DAY_MINUTES, mask)
+
+
+def decode_sleep_epochs(source, mask=False):
+    """Decode a sleepepochs response or payload"""
+    return decode(source, SLEEP_EPOCHS, mask)
+
+
+def decode_day_stats(source, mask=False):
+    """Decode a daystats response or payload"""
+    return decode(source, DAY_STATS, mask)
+
+
+def to_arrow(array):
+    """Convert a decoded structured array to a pyarrow Table (pip install pyarrow)"""
+    import pyarrow
+    return pyarrow.Table.from_arrays([pyarrow.array(array[name]) for name in array.dtype.names],
+                                     names=list(array.dtype.names))
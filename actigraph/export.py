@@ -0,0 +1,460 @@
+# -*- coding: UTF-8 -*-
+"""
+Bulk export of a study to files, resumable after an interruption.
+
+    $ actigraph-export 21 export/ --url https://studyadmin-api.actigraphcorp.com --format csv \\
+          --start 2014-06-01 --end 2014-06-30
+
+Each endpoint is written to its own file in the output directory (a directory of part files for Parquet), every
+record tagged with the SubjectId it belongs to. The work is split into units, one per subject and endpoint and for
+day minutes and sleep epochs one per subject and day, which are fetched on a pool of worker threads and written as
+they complete so memory is bounded by the units in flight rather than the size of the study.
+
+Every checkpoint_every units the files are flushed and the finished units recorded in a checkpoint file. Running the
+same export again skips the recorded units and cuts the files back to the last checkpoint, so nothing is fetched or
+written twice. A unit that fails, say with a 404, is recorded in the checkpoint as failed and skipped, the export
+carrying on without it. Running the export again retries the failed units. pyarrow is only imported when writing
+Parquet.
+
+The columns of each endpoint are fixed by FIELDS, so every CSV row and Parquet part has the same columns whatever
+the records hold. NDJSON records are written whole. Keys not in an endpoint's fields are left out of CSV and Parquet
+with a warning the first time each is seen, and listed in the exporter's dropped after a run.
+"""
+__author__ = 'isparks'
+
+import argparse
+import csv
+import datetime
+import io
+import json
+import os
+import sys
+import warnings
+
+import requests
+import six
+
+from actigraph.client import ActigraphClient, daterange, isodate, payload_records
+from actigraph.parallel import DEFAULT_MAX_WORKERS, imap_unordered
+
+#Endpoints that can be exported
+SUBJECTS = 'subjects'
+DAYSTATS = 'daystats'
+DAYMINUTES = 'dayminutes'
+SLEEPEPOCHS = 'sleepepochs'
+BOUTS = 'bouts'
+BEDTIMES = 'bedtimes'
+ENDPOINTS = (SUBJECTS, DAYSTATS, DAYMINUTES, SLEEPEPOCHS, BOUTS, BEDTIMES)
+
+#Endpoints exported for a span of dates
+RANGED_ENDPOINTS = (DAYMINUTES, SLEEPEPOCHS, BOUTS, BEDTIMES)
+
+#Key every exported record is tagged with
+SUBJECT_KEY = 'SubjectId'
+
+#The columns of each endpoint, (key, type) with type one of int, float, bool or string. Dates and times are kept as
+#the ISO strings the API returns
+FIELDS = {
+    SUBJECTS: [('Id', 'int'), ('StudyId', 'int'), ('SubjectIdentifier', 'string'), ('Gender', 'string'),
+               ('DOB', 'string')],
+    DAYSTATS: [(SUBJECT_KEY, 'int'), ('Date', 'string'), ('Steps', 'int'), ('Calories', 'float'),
+               ('WearMinutes', 'int')],
+    DAYMINUTES: [(SUBJECT_KEY, 'int'), ('Timestamp', 'string'), ('AxisXCounts', 'int'), ('AxisYCounts', 'int'),
+                 ('AxisZCounts', 'int'), ('Steps', 'int'), ('Calories', 'float'), ('HeartRate', 'float')],
+    SLEEPEPOCHS: [(SUBJECT_KEY, 'int'), ('Timestamp', 'string'), ('AxisXCounts', 'int'), ('AxisYCounts', 'int'),
+                  ('AxisZCounts', 'int'), ('Sleep', 'bool')],
+    BOUTS: [(SUBJECT_KEY, 'int'), ('StartDateTime', 'string'), ('EndDateTime', 'string'), ('Type', 'string')],
+    BEDTIMES: [(SUBJECT_KEY, 'int'), ('InBed', 'string'), ('OutBed', 'string')],
+}
+
+DEFAULT_CHECKPOINT_EVERY = 100
+CHECKPOINT_FILE = 'checkpoint.json'
+
+#os.replace is python 3 only, rename replaces an existing file on POSIX
+replace_file = getattr(os, 'replace', os.rename)
+
+
+def known_fields(records, names, dropped, path):
+    """
+    Returns the records with only the keys in names
+
+    Keys not in names are added to the set dropped, with a warning for each key not already in it.
+    """
+    unknown = set()
+    for record in records:
+        unknown.update(key for key in record if key not in names)
+    if not unknown:
+        return records
+    for key in sorted(unknown - dropped):
+        warnings.warn("Leaving %r out of %s, it is not one of the exported fields" % (key, path))
+    dropped.update(unknown)
+    return [dict((key, value) for key, value in record.items() if key in names) for record in records]
+
+
+class NdjsonWriter(object):
+    """
+    Writes records as newline delimited JSON to path, state is the byte offset of the last commit
+
+    fields are the (key, type) fields of the records, records are written whole whatever keys they have. The file
+    is cut back to the committed offset when opened so that records written after the last checkpoint of an
+    interrupted export are dropped.
+    """
+    extension = 'ndjson'
+
+    def __init__(self, path, fields, state=None):
+        self.path = path
+        self.names = set(key for key, _ in fields)
+        self.dropped = set()
+        self.file = io.open(path, 'ab')
+        self.offset = state['offset'] if state else 0
+        self.file.truncate(self.offset)
+
+    def encode(self, records):
+        return b''.join(json.dumps(record, sort_keys=True).encode('utf-8') + b'\n' for record in records)
+
+    def write(self, records):
+        """Write a unit's records"""
+        self.file.write(self.encode(records))
+        self.offset = self.file.tell()
+
+    def commit(self):
+        """Flush what has been written to disk and return the state to resume from"""
+        self.file.truncate(self.offset)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {'offset': self.offset}
+
+    def close(self):
+        self.file.close()
+
+
+class CsvWriter(NdjsonWriter):
+    """
+    Writes records as CSV to path, a column for each of the fields in order
+
+    The header is written when the file is started. Missing keys are left empty, other keys are left out and added
+    to dropped.
+    """
+    extension = 'csv'
+
+    def __init__(self, path, fields, state=None):
+        super(CsvWriter, self).__init__(path, fields, state)
+        self.columns = [key for key, _ in fields]
+        if not self.offset:
+            self.file.write(self.encode([dict(zip(self.columns, self.columns))]))
+            self.offset = self.file.tell()
+
+    def write(self, records):
+        """Write a unit's records"""
+        super(CsvWriter, self).write(known_fields(records, self.names, self.dropped, self.path))
+
+    def encode(self, records):
+        buf = six.StringIO()
+        writer = csv.writer(buf, lineterminator='\n')
+        for record in records:
+            writer.writerow([record.get(column, '') for column in self.columns])
+        return buf.getvalue().encode('utf-8')
+
+
+class ParquetWriter(object):
+    """
+    Writes records to a directory of Parquet part files, one per commit, state is the number of parts
+
+    Every part has the schema of the fields, so that the directory reads back as one dataset even when a part has
+    only nulls in a column. Keys not in the fields are left out and added to dropped. Records are held in memory until
+    committed. Part files beyond the committed number are removed when opened.
+    """
+    extension = 'parquet'
+
+    def __init__(self, path, fields, state=None):
+        # Imported here so that pyarrow is only needed, and paid for, when writing Parquet
+        import pyarrow
+        import pyarrow.parquet
+        self.pyarrow = pyarrow
+        types = {'int': pyarrow.int64(), 'float': pyarrow.float64(), 'bool': pyarrow.bool_(),
+                 'string': pyarrow.string()}
+        self.schema = pyarrow.schema([(key, types[field_type]) for key, field_type in fields])
+        self.names = set(key for key, _ in fields)
+        self.dropped = set()
+        self.path = path
+        self.parts = state['parts'] if state else 0
+        self.records = []
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name in os.listdir(path):
+            if not name.endswith('.parquet') or int(name.split('-')[1].split('.')[0]) >= self.parts:
+                os.remove(os.path.join(path, name))
+
+    def write(self, records):
+        """Write a unit's records"""
+        self.records.extend(known_fields(records, self.names, self.dropped, self.path))
+
+    def commit(self):
+        """Write the records held to a new part file and return the state to resume from"""
+        if self.records:
+            table = self.pyarrow.Table.from_pylist(self.records, schema=self.schema)
+            part = os.path.join(self.path, 'part-%05d.parquet' % self.parts)
+            self.pyarrow.parquet.write_table(table, part + '.tmp')
+            replace_file(part + '.tmp', part)
+            self.parts += 1
+            self.records = []
+        return {'parts': self.parts}
+
+    def close(self):
+        pass
+
+
+WRITERS = {
+    'ndjson': NdjsonWriter,
+    'csv': CsvWriter,
+    'parquet': ParquetWriter,
+}
+
+
+class Checkpoint(object):
+    """
+    JSON file of the units an export has finished and the state of its writers, replaced atomically when saved
+
+    failed maps the key of each unit that failed to the error it failed with.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.failed = {}
+        self.writers = {}
+        self.options = None
+        if os.path.exists(path):
+            with io.open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            self.done = set(saved['done'])
+            self.failed = saved.get('failed', {})
+            self.writers = saved['writers']
+            self.options = saved['options']
+
+    def save(self, options, writers):
+        """Save the finished units and the state of each writer"""
+        self.options = options
+        self.writers = writers
+        tmp = self.path + '.tmp'
+        with io.open(tmp, 'w', encoding='utf-8') as f:
+            f.write(six.text_type(json.dumps({'options': options, 'done': sorted(self.done), 'failed': self.failed,
+                                              'writers': writers})))
+            f.flush()
+            os.fsync(f.fileno())
+        replace_file(tmp, self.path)
+
+
+class StudyExporter(object):
+    """
+    Exports the endpoints of every subject of a study to output_dir in format (ndjson, csv or parquet)
+
+    Units are fetched on a pool of max_workers threads. checkpoint is the path of the checkpoint file, by default
+    checkpoint.json in output_dir, saved every checkpoint_every units and when the export stops. After a run failed
+    maps the key of each unit that failed to its error, and dropped each endpoint to the sorted keys left out of its
+    file because they are not in its fields.
+    """
+    def __init__(self, client, output_dir, format='ndjson', endpoints=ENDPOINTS, max_workers=DEFAULT_MAX_WORKERS,
+                 checkpoint=None, checkpoint_every=DEFAULT_CHECKPOINT_EVERY):
+        if format not in WRITERS:
+            raise ValueError("Cannot export as %r, choose from %s" % (format, sorted(WRITERS)))
+        for endpoint in endpoints:
+            if endpoint not in ENDPOINTS:
+                raise ValueError("Cannot export %r, choose from %s" % (endpoint, ENDPOINTS))
+        self.client = client
+        self.output_dir = output_dir
+        self.format = format
+        self.endpoints = [endpoint for endpoint in ENDPOINTS if endpoint in endpoints]
+        self.max_workers = max_workers
+        self.checkpoint_path = checkpoint or os.path.join(output_dir, CHECKPOINT_FILE)
+        self.checkpoint_every = checkpoint_every
+        self.failed = {}
+        self.dropped = {}
+
+    def _units(self, subject_ids, start_date, end_date, done):
+        """Yields (key, endpoint, subject_id, date) for each unit not yet done, date None for whole endpoints"""
+        for subject_id in subject_ids:
+            for endpoint in self.endpoints:
+                if endpoint == SUBJECTS:
+                    continue
+                if endpoint in (DAYMINUTES, SLEEPEPOCHS):
+                    dates = daterange(start_date, end_date)
+                else:
+                    dates = [None]
+                for date in dates:
+                    key = "%s/%s" % (endpoint, subject_id) if date is None else \
+                        "%s/%s/%s" % (endpoint, subject_id, isodate(date))
+                    if key not in done:
+                        yield key, endpoint, subject_id, date
+
+    def _records(self, response):
+        """Returns the records of a response, raising for failures"""
+        response.raise_for_status()
+        return payload_records(response.json())
+
+    def _try_fetch(self, unit, start_date, end_date):
+        """Fetch the records of a unit, returns (records, None) or (None, error) if the request failed"""
+        try:
+            return self._fetch(unit, start_date, end_date), None
+        except (requests.RequestException, ValueError) as e:
+            return None, e
+
+    def _fetch(self, unit, start_date, end_date):
+        """Fetch the records of a unit, each tagged with its subject"""
+        _, endpoint, subject_id, date = unit
+        if endpoint in (BOUTS, BEDTIMES):
+            start = datetime.datetime.combine(start_date, datetime.time())
+            stop = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time())
+        if endpoint == DAYSTATS:
+            records = self._records(self.client.get_subject_daily_stats(subject_id))
+        elif endpoint == DAYMINUTES:
+            records = list(self.client.get_subject_daily_minutes(subject_id, date, stream=True))
+        elif endpoint == SLEEPEPOCHS:
+            # The day's epochs, in a window stopping short of the next day's first epoch
+            inbed = datetime.datetime.combine(date, datetime.time())
+            outbed = inbed + datetime.timedelta(days=1, seconds=-1)
+            records = list(self.client.get_subject_sleep_epochs(subject_id, inbed, outbed, stream=True))
+        elif endpoint == BOUTS:
+            records = self._records(self.client.get_subject_bout_periods(subject_id, start=start, stop=stop))
+        else:
+            records = self._records(self.client.get_subject_bed_times(subject_id, start=start, stop=stop))
+        for record in records:
+            record[SUBJECT_KEY] = subject_id
+        return records
+
+    def run(self, study_id, start_date=None, end_date=None):
+        """
+        Export the study, dates from start_date to end_date inclusive for the endpoints exported for a span
+
+        Returns a dict of the number of records written for each endpoint by this run. Units that fail are skipped and
+        left in failed. If the export is interrupted the checkpoint is saved before the exception is raised, and
+        calling run again resumes it, retrying the failed units.
+        """
+        if any(endpoint in RANGED_ENDPOINTS for endpoint in self.endpoints):
+            if start_date is None or end_date is None:
+                raise ValueError("start_date and end_date are needed to export %s" % (RANGED_ENDPOINTS,))
+            if start_date > end_date:
+                raise ValueError("Start date after End date")
+
+        options = {'study_id': str(study_id), 'format': self.format, 'endpoints': self.endpoints,
+                   'start_date': start_date and isodate(start_date), 'end_date': end_date and isodate(end_date)}
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        checkpoint = Checkpoint(self.checkpoint_path)
+        if checkpoint.options is not None and checkpoint.options != options:
+            raise ValueError("Checkpoint %s is of a different export %s" % (self.checkpoint_path, checkpoint.options))
+
+        writer_class = WRITERS[self.format]
+        writers = dict((endpoint, writer_class(os.path.join(self.output_dir, endpoint + '.' + writer_class.extension),
+                                               FIELDS[endpoint], checkpoint.writers.get(endpoint)))
+                       for endpoint in self.endpoints)
+        counts = dict((endpoint, 0) for endpoint in self.endpoints)
+
+        def commit():
+            checkpoint.save(options, dict((endpoint, writer.commit()) for endpoint, writer in writers.items()))
+
+        try:
+            subjects = self._records(self.client.get_all_subjects(study_id))
+            if SUBJECTS in self.endpoints and SUBJECTS not in checkpoint.done:
+                writers[SUBJECTS].write(subjects)
+                checkpoint.done.add(SUBJECTS)
+                counts[SUBJECTS] = len(subjects)
+
+            units = self._units([subject['Id'] for subject in subjects], start_date, end_date, checkpoint.done)
+            since_commit = 0
+            for unit, (records, error) in imap_unordered(lambda unit: self._try_fetch(unit, start_date, end_date),
+                                                         units, self.max_workers):
+                key, endpoint = unit[:2]
+                if error is None:
+                    writers[endpoint].write(records)
+                    checkpoint.done.add(key)
+                    checkpoint.failed.pop(key, None)
+                    counts[endpoint] += len(records)
+                else:
+                    checkpoint.failed[key] = "%s: %s" % (type(error).__name__, error)
+                since_commit += 1
+                if since_commit >= self.checkpoint_every:
+                    commit()
+                    since_commit = 0
+        finally:
+            commit()
+            for writer in writers.values():
+                writer.close()
+            self.failed = dict(checkpoint.failed)
+            self.dropped = dict((endpoint, sorted(writer.dropped)) for endpoint, writer in writers.items()
+                                if writer.dropped)
+        return counts
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD command line argument"""
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError("%r is not a YYYY-MM-DD date" % value)
+
+
+def parse_endpoints(value):
+    """Parse a comma separated list of endpoints"""
+    endpoints = [endpoint.strip() for endpoint in value.split(',') if endpoint.strip()]
+    for endpoint in endpoints:
+        if endpoint not in ENDPOINTS:
+            raise argparse.ArgumentTypeError("Cannot export %r, choose from %s" % (endpoint, ", ".join(ENDPOINTS)))
+    return endpoints
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog='actigraph-export', description="Export an Actigraph study to files")
+    parser.add_argument('study_id', help="id of the study to export")
+    parser.add_argument('output_dir', help="directory the files are written to")
+    parser.add_argument('--url', default=os.environ.get('ACTIGRAPH_URL', 'https://studyadmin-api.actigraphcorp.com'),
+                        help="API base URL (default $ACTIGRAPH_URL or %(default)s)")
+    parser.add_argument('--access-key', default=os.environ.get('ACTIGRAPH_ACCESS_KEY'),
+                        help="access key (default $ACTIGRAPH_ACCESS_KEY)")
+    parser.add_argument('--secret-key', default=os.environ.get('ACTIGRAPH_SECRET_KEY'),
+                        help="secret key (default $ACTIGRAPH_SECRET_KEY)")
+    parser.add_argument('--format', choices=sorted(WRITERS), default='ndjson', help="file format (default ndjson)")
+    parser.add_argument('--endpoints', type=parse_endpoints, default=list(ENDPOINTS),
+                        help="comma separated endpoints to export (default %s)" % ",".join(ENDPOINTS))
+    parser.add_argument('--start', type=parse_date, help="first date of minutes, epochs, bouts and bed times")
+    parser.add_argument('--end', type=parse_date, help="last date of minutes, epochs, bouts and bed times")
+    parser.add_argument('--max-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help="requests made at once (default %(default)s)")
+    parser.add_argument('--checkpoint', help="checkpoint file (default OUTPUT_DIR/%s)" % CHECKPOINT_FILE)
+    parser.add_argument('--checkpoint-every', type=int, default=DEFAULT_CHECKPOINT_EVERY,
+                        help="units between checkpoints (default %(default)s)")
+    return parser
+
+
+def main(argv=None):
+    """Entry point of the actigraph-export command"""
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    if not args.access_key or not args.secret_key:
+        parser.error("an access key and secret key are needed, by argument or environment")
+    if any(endpoint in RANGED_ENDPOINTS for endpoint in args.endpoints) and (args.start is None or args.end is None):
+        parser.error("--start and --end are needed to export %s" % ", ".join(RANGED_ENDPOINTS))
+
+    with ActigraphClient(args.url, args.access_key, args.secret_key,
+                         pool_connections=args.max_workers, pool_maxsize=args.max_workers) as client:
+        exporter = StudyExporter(client, args.output_dir, format=args.format, endpoints=args.endpoints,
+                                 max_workers=args.max_workers, checkpoint=args.checkpoint,
+                                 checkpoint_every=args.checkpoint_every)
+        try:
+            counts = exporter.run(args.study_id, args.start, args.end)
+        except KeyboardInterrupt:
+            sys.stderr.write("Interrupted, run again to resume\n")
+            return 1
+    for endpoint in exporter.endpoints:
+        sys.stdout.write("%s: %d records\n" % (endpoint, counts[endpoint]))
+    for endpoint in sorted(exporter.dropped):
+        sys.stderr.write("%s: left out %s, not exported fields\n" % (endpoint, ", ".join(exporter.dropped[endpoint])))
+    if exporter.failed:
+        for key in sorted(exporter.failed):
+            sys.stderr.write("failed %s: %s\n" % (key, exporter.failed[key]))
+        sys.stderr.write("%d units failed, run again to retry them\n" % len(exporter.failed))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,416 @@
+# -*- coding: UTF-8 -*-
+"""
+A local stand-in for the Actigraph Study Admin API, for tests and benchmarks.
+
+    >>> from actigraph.fakeserver import FakeActigraphServer
+    >>> with FakeActigraphServer('access_key', 'secret_key', subjects=100, latency=0.01) as server:
+    ...     ac = ActigraphClient(server.base_url, 'access_key', 'secret_key')
+    ...     ac.get_all_subjects(1).json()
+
+Every request must carry a valid AGS signature, checked with ActigraphAuth, or is refused with 401. Studies,
+subjects, daily stats, minutes, sleep epochs and scores, bouts and bed times are generated deterministically from
+the subject and date so repeated requests return the same data.
+
+FakeHTTP2Server answers the same requests over cleartext HTTP/2, many at once on each connection.
+"""
+__author__ = 'isparks'
+
+import datetime
+import json
+import random
+import re
+import socket
+import threading
+import time
+
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import parse_qs, urlsplit
+
+from actigraph.client import ActigraphAuth, isodate, isodatetime, parse_isodatetime
+
+#Format of the Date header sent by ActigraphAuth
+DATE_HEADER_FORMAT = '%a, %d %b %Y %H:%M:%S +0000'
+
+#Subject ids of study n are n * SUBJECTS_PER_STUDY + 1 and up
+SUBJECTS_PER_STUDY = 100000
+
+
+#Routes are regular expressions matched against the path and the FakeData method answering them
+ROUTES = [
+    (re.compile(r'^/v1/studies$'), 'studies'),
+    (re.compile(r'^/v1/studies/(\d+)$'), 'study'),
+    (re.compile(r'^/v1/studies/(\d+)/subjects$'), 'subjects'),
+    (re.compile(r'^/v1/subjects/(\d+)$'), 'subject'),
+    (re.compile(r'^/v1/subjects/(\d+)/stats$'), 'subject_stats'),
+    (re.compile(r'^/v1/subjects/(\d+)/daystats$'), 'day_stats'),
+    (re.compile(r'^/v1/subjects/(\d+)/dayminutes/(\d{4}-\d{2}-\d{2})$'), 'day_minutes'),
+    (re.compile(r'^/v1/subjects/(\d+)/sleepepochs$'), 'sleep_epochs'),
+    (re.compile(r'^/v1/subjects/(\d+)/sleepscore$'), 'sleep_score'),
+    (re.compile(r'^/v1/subjects/(\d+)/bouts$'), 'bouts'),
+    (re.compile(r'^/v1/subjects/(\d+)/bedtimes$'), 'bed_times'),
+]
+
+
+class FakeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Keep-alive HTTP/1.1 request handler"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.count('connections')
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        status, body = self.server.respond(self.path, self.headers)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeHTTP2Handler(socketserver.BaseRequestHandler):
+    """
+    HTTP/2 (h2c with prior knowledge) connection handler, needs the h2 package
+
+    Each request is answered on its own thread so that many are in flight on one connection at once.
+    """
+    def setup(self):
+        import h2.config
+        import h2.connection
+        self.server.count('connections')
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.connection = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False,
+                                                                               header_encoding='utf-8'))
+        self.condition = threading.Condition()
+        self.closed = False
+
+    def flush(self):
+        """Send what the connection has to send, caller holds the condition"""
+        data = self.connection.data_to_send()
+        if data:
+            self.request.sendall(data)
+
+    def handle(self):
+        import h2.events
+        with self.condition:
+            self.connection.initiate_connection()
+            self.flush()
+        try:
+            while not self.closed:
+                data = self.request.recv(65536)
+                if not data:
+                    break
+                with self.condition:
+                    for event in self.connection.receive_data(data):
+                        if isinstance(event, h2.events.RequestReceived):
+                            thread = threading.Thread(target=self.answer, args=(event.stream_id, dict(event.headers)))
+                            thread.daemon = True
+                            thread.start()
+                        elif isinstance(event, h2.events.ConnectionTerminated):
+                            self.closed = True
+                    self.flush()
+                    self.condition.notify_all()
+        except (IOError, OSError):
+            pass
+        finally:
+            with self.condition:
+                self.closed = True
+                self.condition.notify_all()
+
+    def answer(self, stream_id, headers):
+        import h2.exceptions
+        status, body = self.server.respond(headers[':path'], {'Authorization': headers.get('authorization'),
+                                                              'Date': headers.get('date'),
+                                                              'Host': headers.get(':authority')})
+        connection = self.connection
+        try:
+            with self.condition:
+                connection.send_headers(stream_id, [(':status', str(status)),
+                                                    ('content-type', 'application/json; charset=utf-8'),
+                                                    ('content-length', str(len(body)))])
+                while body and not self.closed:
+                    # Send what flow control allows, waiting for the client to open the window for the rest
+                    size = min(connection.local_flow_control_window(stream_id), connection.max_outbound_frame_size)
+                    if size <= 0:
+                        self.condition.wait()
+                        continue
+                    chunk, body = body[:size], body[size:]
+                    connection.send_data(stream_id, chunk, end_stream=not body)
+                    self.flush()
+        except (h2.exceptions.ProtocolError, IOError, OSError):
+            pass
+
+
+class FakeData(object):
+    """
+    Deterministic synthetic data for studies of subjects followed for days from start_date
+
+    Each subject wears the device all day on about wear_fraction of days and is in bed from 22:30 to 06:30 after
+    each of them.
+    """
+    def __init__(self, studies=1, subjects=10, start_date=datetime.date(2014, 6, 1), days=30, wear_fraction=1.0):
+        self.study_count = studies
+        self.subject_count = subjects
+        self.start_date = start_date
+        self.days = days
+        self.wear_fraction = wear_fraction
+
+    def _random(self, subject_id, date):
+        return random.Random(int(subject_id) * 1000003 + date.toordinal())
+
+    def _subject(self, subject_id):
+        subject_id = int(subject_id)
+        study_id, index = divmod(subject_id, SUBJECTS_PER_STUDY)
+        if not 1 <= study_id <= self.study_count or not 1 <= index <= self.subject_count:
+            return None
+        return study_id
+
+    def _dates(self):
+        return [self.start_date + datetime.timedelta(days=i) for i in range(self.days)]
+
+    def worn(self, subject_id, date):
+        """True if the subject wore the device on date"""
+        in_study = self.start_date <= date < self.start_date + datetime.timedelta(days=self.days)
+        return in_study and self._random(subject_id, date).random() < self.wear_fraction
+
+    def _day_counts(self, subject_id, date):
+        """Vertical axis counts for each minute of a day, low at night and zero if the device was not worn"""
+        if not self.worn(subject_id, date):
+            return [0] * (24 * 60)
+        rng = self._random(subject_id, date)
+        return [rng.randint(0, 40) if minute < 7 * 60 or minute >= 22 * 60 else rng.randint(0, 3000)
+                for minute in range(24 * 60)]
+
+    def studies(self):
+        return [self.study(i) for i in range(1, self.study_count + 1)]
+
+    def study(self, study_id):
+        study_id = int(study_id)
+        if not 1 <= study_id <= self.study_count:
+            return None
+        return {'Id': study_id, 'Name': 'Study %d' % study_id, 'DateCreated': '2014-05-28T21:12:36Z'}
+
+    def subjects(self, study_id):
+        if self.study(study_id) is None:
+            return None
+        return [self.subject(int(study_id) * SUBJECTS_PER_STUDY + i) for i in range(1, self.subject_count + 1)]
+
+    def subject(self, subject_id):
+        study_id = self._subject(subject_id)
+        if study_id is None:
+            return None
+        return {'Id': int(subject_id), 'StudyId': study_id, 'SubjectIdentifier': 'S%s' % subject_id,
+                'Gender': 'Female' if int(subject_id) % 2 else 'Male', 'DOB': '1980-01-01T00:00:00'}
+
+    def subject_stats(self, subject_id):
+        stats = self.day_stats(subject_id)
+        if stats is None:
+            return None
+        return {'SubjectId': int(subject_id), 'TotalSteps': sum(day['Steps'] for day in stats),
+                'TotalCalories': round(sum(day['Calories'] for day in stats), 2),
+                'WearMinutes': sum(day['WearMinutes'] for day in stats)}
+
+    def day_stats(self, subject_id):
+        if self._subject(subject_id) is None:
+            return None
+        stats = []
+        for date in self._dates():
+            worn = self.worn(subject_id, date)
+            rng = self._random(subject_id, date)
+            stats.append({'Date': isodate(date) + 'T00:00:00', 'Steps': rng.randint(2000, 15000) if worn else 0,
+                          'Calories': round(rng.uniform(200, 900), 2) if worn else 0.0,
+                          'WearMinutes': 24 * 60 if worn else 0})
+        return stats
+
+    def day_minutes(self, subject_id, date):
+        if self._subject(subject_id) is None:
+            return None
+        date = datetime.datetime.strptime(date, '%Y-%m-%d')
+        minutes = []
+        for minute, counts in enumerate(self._day_counts(subject_id, date.date())):
+            timestamp = date + datetime.timedelta(minutes=minute)
+            minutes.append({'Timestamp': isodatetime(timestamp), 'AxisXCounts': counts // 2,
+                            'AxisYCounts': counts, 'AxisZCounts': counts // 3, 'Steps': counts // 30,
+                            'Calories': round(counts * 0.001, 3), 'HeartRate': None})
+        return {'SubjectId': int(subject_id), 'Date': isodate(date), 'Minutes': minutes}
+
+    def sleep_epochs(self, subject_id, inbed, outbed):
+        if self._subject(subject_id) is None:
+            return None
+        inbed, outbed = parse_isodatetime(inbed), parse_isodatetime(outbed)
+        if not inbed < outbed:
+            raise ValueError(inbed)
+        epochs = []
+        day_counts = {}
+        timestamp = inbed.replace(second=0)
+        while timestamp <= outbed:
+            date = timestamp.date()
+            if date not in day_counts:
+                day_counts[date] = self._day_counts(subject_id, date)
+            counts = day_counts[date][timestamp.hour * 60 + timestamp.minute]
+            epochs.append({'Timestamp': isodatetime(timestamp), 'AxisXCounts': counts // 2, 'AxisYCounts': counts,
+                           'AxisZCounts': counts // 3, 'Sleep': counts < 20})
+            timestamp += datetime.timedelta(minutes=1)
+        return {'SubjectId': int(subject_id), 'InBed': isodatetime(inbed), 'OutBed': isodatetime(outbed),
+                'Epochs': epochs}
+
+    def sleep_score(self, subject_id, inbed, outbed):
+        epochs = self.sleep_epochs(subject_id, inbed, outbed)
+        if epochs is None:
+            return None
+        asleep = [epoch['Sleep'] for epoch in epochs['Epochs']]
+        total = len(asleep)
+        sleep_time = sum(asleep)
+        latency = asleep.index(True) if True in asleep else total
+        return {'SubjectId': int(subject_id), 'InBed': epochs['InBed'], 'OutBed': epochs['OutBed'],
+                'TotalSleepTime': sleep_time, 'WakeAfterSleepOnset': total - sleep_time - latency,
+                'Efficiency': round(100.0 * sleep_time / total, 2) if total else 0.0, 'Latency': latency}
+
+    def _periods(self, subject_id, start, stop, make):
+        """Daily periods made by make(date) overlapping start to stop"""
+        if self._subject(subject_id) is None:
+            return None
+        start = parse_isodatetime(start) if start else datetime.datetime.combine(self.start_date, datetime.time())
+        stop = parse_isodatetime(stop) if stop else start + datetime.timedelta(days=self.days + 1)
+        periods = []
+        date = start.date() - datetime.timedelta(days=1)
+        while date <= stop.date():
+            for period_start, period_end, record in make(date):
+                if period_start < stop and period_end > start:
+                    periods.append(record)
+            date += datetime.timedelta(days=1)
+        return periods
+
+    def bouts(self, subject_id, start=None, stop=None):
+        def make(date):
+            day = datetime.datetime.combine(date, datetime.time())
+            bouts = []
+            if self.worn(subject_id, date):
+                wear_start, wear_end = day, day + datetime.timedelta(days=1)
+                bouts.append((wear_start, wear_end, {'StartDateTime': isodatetime(wear_start),
+                                                     'EndDateTime': isodatetime(wear_end), 'Type': 'Wear'}))
+            return bouts
+        return self._periods(subject_id, start, stop, make)
+
+    def bed_times(self, subject_id, start=None, stop=None):
+        def make(date):
+            day = datetime.datetime.combine(date, datetime.time())
+            inbed, outbed = day + datetime.timedelta(hours=22, minutes=30), day + datetime.timedelta(hours=30, minutes=30)
+            if not self.worn(subject_id, date):
+                return []
+            return [(inbed, outbed, {'InBed': isodatetime(inbed), 'OutBed': isodatetime(outbed)})]
+        return self._periods(subject_id, start, stop, make)
+
+
+class FakeActigraphServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Threaded HTTP/1.1 keep-alive server for the fake API, on a free port of 127.0.0.1
+
+    latency is seconds added to every request, other keyword arguments configure the FakeData. requests,
+    connections, rejected and bytes_sent count what the server has seen.
+    """
+    daemon_threads = True
+    handler_class = FakeHandler
+
+    def __init__(self, access_key, secret_key, latency=0.0, **data):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), self.handler_class)
+        self.latency = latency
+        self.data = FakeData(**data)
+        self.auths = {}
+        self.add_key(access_key, secret_key)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.reset_counters()
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    def add_key(self, access_key, secret_key):
+        """Accept requests signed with another key pair"""
+        self.auths[access_key] = ActigraphAuth('', access_key, secret_key)
+
+    def respond(self, path, headers):
+        """Answer a GET of path, returns (status, JSON body)"""
+        self.count('requests')
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.signature_valid(path, headers):
+            self.count('rejected')
+            return self.body(401, {'Message': 'Authorization has been denied for this request.'})
+
+        parts = urlsplit(path)
+        query = dict((key, values[0]) for key, values in parse_qs(parts.query).items())
+        for pattern, name in ROUTES:
+            match = pattern.match(parts.path)
+            if match:
+                try:
+                    payload = getattr(self.data, name)(*match.groups(), **query)
+                except (KeyError, TypeError, ValueError):
+                    return self.body(400, {'Message': 'The request is invalid.'})
+                if payload is None:
+                    return self.body(404, {'Message': 'Not found.'})
+                return self.body(200, payload)
+        return self.body(404, {'Message': 'Not found.'})
+
+    def body(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.count('bytes_sent', len(body))
+        return status, body
+
+    def signature_valid(self, path, headers):
+        """Check the Authorization header is an AGS signature of this request by a known key pair"""
+        try:
+            scheme, credentials = headers['Authorization'].split(' ', 1)
+            access_key, signature = credentials.split(':', 1)
+            date_time = datetime.datetime.strptime(headers['Date'], DATE_HEADER_FORMAT)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return False
+        auth = self.auths.get(access_key)
+        if scheme != 'AGS' or auth is None:
+            return False
+        url = 'http://%s%s' % (headers['Host'], path)
+        expected = auth.sign(auth.make_signature_string(url, date_time)).decode('utf-8')
+        return signature == expected
+
+    def count(self, counter, amount=1):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def reset_counters(self):
+        self.requests = 0
+        self.connections = 0
+        self.rejected = 0
+        self.bytes_sent = 0
+
+    def start(self):
+        """Serve requests on a background thread"""
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket"""
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class FakeHTTP2Server(FakeActigraphServer):
+    """
+    FakeActigraphServer speaking cleartext HTTP/2 with prior knowledge instead of HTTP/1.1, needs the h2 package
+
+    Clients must be told to use HTTP/2 without negotiating it, e.g. HTTP2Adapter(http1=False).
+    """
+    handler_class = FakeHTTP2Handler
@@ -0,0 +1,144 @@
+# -*- coding: UTF-8 -*-
+"""
+HTTP/2 transport for ActigraphClient (pip install actigraph[http2]).
+
+HTTP/1.1 carries one request at a time per connection, so many requests in flight need as many sockets. Over HTTP/2
+they are multiplexed on one connection. HTTP2Adapter is a requests transport adapter sending through an httpx client
+with HTTP/2 enabled, requests are still signed by ActigraphAuth as they are prepared:
+
+    >>> from actigraph.http2 import HTTP2Adapter
+    >>> ac = ActigraphClient(url, "access_key", "secret_key", adapter=HTTP2Adapter())
+
+HTTP/2 is negotiated over TLS and HTTP/1.1 used if the server does not offer it. With http1=False HTTP/2 is spoken
+without negotiation, as cleartext http:// servers need.
+"""
+__author__ = 'isparks'
+
+import os
+import ssl
+import threading
+
+import httpx
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import DEFAULT_CA_BUNDLE_PATH, get_encoding_from_headers, select_proxy
+
+DEFAULT_MAX_CONNECTIONS = 10
+
+
+def ssl_context(verify, cert=None):
+    """Make the SSL context for requests' verify (a bool or CA bundle path) and cert (a path or (cert, key))"""
+    if verify is False:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    elif verify is True:
+        context = ssl.create_default_context(cafile=DEFAULT_CA_BUNDLE_PATH)
+    elif os.path.isdir(verify):
+        context = ssl.create_default_context(capath=verify)
+    else:
+        context = ssl.create_default_context(cafile=verify)
+    if cert:
+        if isinstance(cert, tuple):
+            context.load_cert_chain(*cert)
+        else:
+            context.load_cert_chain(cert)
+    return context
+
+
+class HTTP2Body(object):
+    """File-like reader of an httpx response body, the raw of the requests.Response made from it"""
+    def __init__(self, response):
+        self.response = response
+        self.chunks = response.iter_bytes()
+        self.buffer = bytearray()
+
+    def read(self, amt=None):
+        while amt is None or len(self.buffer) < amt:
+            try:
+                self.buffer.extend(next(self.chunks))
+            except StopIteration:
+                break
+            except httpx.TransportError as e:
+                raise requests.ConnectionError(e)
+        if amt is None or amt >= len(self.buffer):
+            data, self.buffer = bytes(self.buffer), bytearray()
+        else:
+            data = bytes(self.buffer[:amt])
+            del self.buffer[:amt]
+        return data
+
+    def close(self):
+        self.response.close()
+
+
+class HTTP2Adapter(requests.adapters.BaseAdapter):
+    """
+    requests transport adapter sending over HTTP/2 with httpx
+
+    One httpx client is kept per verify, cert and proxy setting of the requests sent, each pooling up to
+    max_connections connections. Proxies and client certificates are those requests gives the adapter, from the
+    session or the environment. Safe to share between threads. httpx connection and timeout errors are raised as
+    their requests equivalents so that they are retried as usual.
+    """
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS, http1=True):
+        super(HTTP2Adapter, self).__init__()
+        self.max_connections = max_connections
+        self.http1 = http1
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def _client(self, verify, cert, proxy):
+        key = (verify, cert, proxy)
+        with self.lock:
+            client = self.clients.get(key)
+            if client is None:
+                limits = httpx.Limits(max_connections=self.max_connections,
+                                      max_keepalive_connections=self.max_connections)
+                # requests has already applied the environment, so httpx is told not to
+                client = self.clients[key] = httpx.Client(http1=self.http1, http2=True,
+                                                          verify=ssl_context(verify, cert), proxy=proxy,
+                                                          trust_env=False, limits=limits)
+            return client
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        """Send a prepared request, returns a requests.Response"""
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        if isinstance(cert, list):
+            cert = tuple(cert)
+        client = self._client(verify, cert, select_proxy(request.url, proxies or {}))
+        outgoing = client.build_request(request.method, request.url, headers=dict(request.headers),
+                                        content=request.body, timeout=httpx.Timeout(timeout))
+        try:
+            incoming = client.send(outgoing, stream=True)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(e, request=request)
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(e, request=request)
+        return self.build_response(request, incoming, stream)
+
+    def build_response(self, request, incoming, stream):
+        """Make a requests.Response of an httpx response, reading the body unless stream"""
+        response = requests.Response()
+        response.status_code = incoming.status_code
+        response.reason = incoming.reason_phrase
+        response.headers = CaseInsensitiveDict(incoming.headers.items())
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.raw = HTTP2Body(incoming)
+        if not stream:
+            try:
+                response.content
+            finally:
+                incoming.close()
+        return response
+
+    def close(self):
+        """Close the httpx clients and their connections"""
+        with self.lock:
+            for client in self.clients.values():
+                client.close()
+            self.clients = {}
@@ -0,0 +1,294 @@
+# -*- coding: UTF-8 -*-
+"""
+Per-request instrumentation of the client.
+
+    >>> from actigraph.instrumentation import Instrumentation, MetricsAggregator
+    >>> metrics = MetricsAggregator()
+    >>> ac = ActigraphClient(url, "access_key", "secret_key", instrumentation=Instrumentation([metrics]))
+    >>> ...
+    >>> print(metrics.to_prometheus())
+
+Every call that goes to the network emits a RequestEvent to each listener. Its latency is the whole call including
+retries, the phases (sign, connect, ttfb, body) are those of its final attempt. Connect times are only measured by a
+TimedHTTPAdapter, without one connect and ttfb (which would include connecting) are None.
+"""
+__author__ = 'isparks'
+
+import bisect
+import re
+import socket
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from six.moves.urllib.parse import urlsplit
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+#Upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+PHASES = ('sign', 'connect', 'ttfb', 'body')
+
+#Path segments replaced to make endpoint templates, e.g. /v1/subjects/{subject_id}/dayminutes/{date}
+TEMPLATE_PATTERNS = [
+    (re.compile(r'/studies/\d+'), '/studies/{study_id}'),
+    (re.compile(r'/subjects/\d+'), '/subjects/{subject_id}'),
+    (re.compile(r'/\d{4}-\d{2}-\d{2}$'), '/{date}'),
+]
+
+#Seconds spent connecting by the current thread, see TimedHTTPAdapter
+_connect_timing = threading.local()
+
+
+def endpoint_template(url):
+    """Takes a request URL, returns its endpoint template without ids, dates or query string"""
+    path = urlsplit(url).path
+    for pattern, replacement in TEMPLATE_PATTERNS:
+        path = pattern.sub(replacement, path)
+    return path
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.time()
+        HTTPConnection.connect(self)
+        _connect_timing.seconds = getattr(_connect_timing, 'seconds', 0.0) + time.time() - start
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.time()
+        HTTPSConnection.connect(self)
+        _connect_timing.seconds = getattr(_connect_timing, 'seconds', 0.0) + time.time() - start
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections record the time spent connecting (TCP and TLS) by the current thread"""
+    def init_poolmanager(self, *args, **kwargs):
+        HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool,
+                                                   'https': TimedHTTPSConnectionPool}
+
+
+class RequestEvent(object):
+    """
+    What happened making one call
+
+    Times are in seconds, a phase that could not be measured is None. status is None if the call raised, error
+    is then the exception.
+    """
+    __slots__ = ('endpoint', 'url', 'status', 'latency', 'sign', 'connect', 'ttfb', 'body', 'bytes', 'retries',
+                 'error')
+
+    def __init__(self, endpoint, url, status=None, latency=None, sign=None, connect=None, ttfb=None, body=None,
+                 bytes=None, retries=0, error=None):
+        self.endpoint = endpoint
+        self.url = url
+        self.status = status
+        self.latency = latency
+        self.sign = sign
+        self.connect = connect
+        self.ttfb = ttfb
+        self.body = body
+        self.bytes = bytes
+        self.retries = retries
+        self.error = error
+
+    def __repr__(self):
+        return "<RequestEvent %s %s %.4fs>" % (self.endpoint, self.status, self.latency or 0.0)
+
+
+class Instrumentation(object):
+    """Passes the RequestEvent of each call to listeners, callables taking the event"""
+    def __init__(self, listeners=None):
+        self.listeners = list(listeners or [])
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def emit(self, event):
+        for listener in self.listeners:
+            listener(event)
+
+    def call(self, scheduler, send, url, auth, retry_errors=(), connect_timed=True):
+        """
+        Make a call of send() through the scheduler as ActigraphClient does, emitting its RequestEvent
+
+        connect_timed is whether send() connects through a TimedHTTPAdapter.
+        """
+        timings = []
+
+        def timed_send():
+            _connect_timing.seconds = 0.0
+            timings.append([time.time(), None])
+            response = send()
+            timings[-1][1] = time.time()
+            return response
+
+        start = time.time()
+        try:
+            response = scheduler.call(timed_send, retry_errors=retry_errors)
+        except Exception as e:
+            self.emit(RequestEvent(endpoint_template(url), url, latency=time.time() - start,
+                                   retries=max(0, len(timings) - 1), error=e))
+            raise
+
+        attempt_start, attempt_end = timings[-1]
+        sign = auth.last_sign_seconds
+        headers = response.elapsed.total_seconds()
+        if connect_timed:
+            connect = getattr(_connect_timing, 'seconds', 0.0)
+            ttfb = max(0.0, headers - connect)
+        else:
+            connect = ttfb = None
+        if getattr(response, '_content_consumed', False):
+            size = len(response.content)
+        else:
+            # Streamed, the body has not been read yet
+            size = int(response.headers['Content-Length']) if 'Content-Length' in response.headers else None
+        self.emit(RequestEvent(endpoint_template(url), url, status=response.status_code,
+                               latency=time.time() - start, sign=sign, connect=connect, ttfb=ttfb,
+                               body=max(0.0, attempt_end - attempt_start - headers - (sign or 0.0)),
+                               bytes=size, retries=len(timings) - 1))
+        return response
+
+
+class Histogram(object):
+    """Cumulative-bucket histogram of observed values, as exported to Prometheus"""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """Returns (upper bound, count of values <= it) for each bucket"""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, fraction):
+        """Returns the upper bound of the bucket holding the given quantile, None if nothing observed"""
+        rank = fraction * self.count
+        for bound, total in self.cumulative():
+            if self.count and total >= rank:
+                return bound
+        return None
+
+
+class EndpointMetrics(object):
+    """Metrics of the calls to one endpoint template"""
+    def __init__(self, buckets):
+        self.statuses = {}
+        self.latency = Histogram(buckets)
+        self.phases = dict((phase, Histogram(buckets)) for phase in PHASES)
+        self.bytes = 0
+        self.retries = 0
+
+
+class MetricsAggregator(object):
+    """In-memory listener aggregating events per endpoint template, thread safe"""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        status = 'error' if event.status is None else str(event.status)
+        with self.lock:
+            metrics = self.endpoints.get(event.endpoint)
+            if metrics is None:
+                metrics = self.endpoints[event.endpoint] = EndpointMetrics(self.buckets)
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.latency.observe(event.latency)
+            for phase in PHASES:
+                value = getattr(event, phase)
+                if value is not None:
+                    metrics.phases[phase].observe(value)
+            metrics.bytes += event.bytes or 0
+            metrics.retries += event.retries
+
+    def to_prometheus(self, prefix='actigraph'):
+        """Returns the metrics in the Prometheus text exposition format"""
+        lines = ['# TYPE %s_requests_total counter' % prefix]
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            for endpoint, metrics in endpoints:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append('%s_requests_total{endpoint="%s",status="%s"} %d' % (prefix, endpoint, status, count))
+            lines.append('# TYPE %s_response_bytes_total counter' % prefix)
+            for endpoint, metrics in endpoints:
+                lines.append('%s_response_bytes_total{endpoint="%s"} %d' % (prefix, endpoint, metrics.bytes))
+            lines.append('# TYPE %s_retries_total counter' % prefix)
+            for endpoint, metrics in endpoints:
+                lines.append('%s_retries_total{endpoint="%s"} %d' % (prefix, endpoint, metrics.retries))
+            lines.append('# TYPE %s_request_duration_seconds histogram' % prefix)
+            for endpoint, metrics in endpoints:
+                lines.extend(self._histogram_lines('%s_request_duration_seconds' % prefix,
+                                                   'endpoint="%s"' % endpoint, metrics.latency))
+            lines.append('# TYPE %s_request_phase_seconds histogram' % prefix)
+            for endpoint, metrics in endpoints:
+                for phase in PHASES:
+                    lines.extend(self._histogram_lines('%s_request_phase_seconds' % prefix,
+                                                       'endpoint="%s",phase="%s"' % (endpoint, phase),
+                                                       metrics.phases[phase]))
+        return '\n'.join(lines) + '\n'
+
+    def _histogram_lines(self, name, labels, histogram):
+        lines = []
+        for bound, total in histogram.cumulative():
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, le, total))
+        lines.append('%s_sum{%s} %r' % (name, labels, histogram.sum))
+        lines.append('%s_count{%s} %d' % (name, labels, histogram.count))
+        return lines
+
+
+class StatsdExporter(object):
+    """Listener sending each event to a StatsD server over UDP as timings and counters"""
+    def __init__(self, host='127.0.0.1', port=8125, prefix='actigraph'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def metric_name(self, endpoint):
+        """StatsD name of an endpoint template, e.g. v1.subjects.subject_id.dayminutes.date"""
+        return re.sub(r'[{}]', '', endpoint.strip('/')).replace('/', '.')
+
+    def __call__(self, event):
+        name = '%s.%s' % (self.prefix, self.metric_name(event.endpoint))
+        status = 'error' if event.status is None else event.status
+        lines = ['%s.requests.%s:1|c' % (name, status), '%s.latency:%.3f|ms' % (name, event.latency * 1000)]
+        for phase in PHASES:
+            value = getattr(event, phase)
+            if value is not None:
+                lines.append('%s.%s:%.3f|ms' % (name, phase, value * 1000))
+        if event.bytes:
+            lines.append('%s.bytes:%d|c' % (name, event.bytes))
+        if event.retries:
+            lines.append('%s.retries:%d|c' % (name, event.retries))
+        try:
+            self.socket.sendto('\n'.join(lines).encode('utf-8'), self.address)
+        except socket.error:
+            # Metrics are best effort, never fail a request for them
+            pass
+
+    def close(self):
+        self.socket.close()
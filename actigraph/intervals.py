@@ -0,0 +1,68 @@
+# -*- coding: UTF-8 -*-
+"""
+Sorted index of disjoint half-open intervals.
+
+    >>> index = IntervalIndex([(start, end) for start, end in wear_periods])
+    >>> index.overlaps(day_start, day_end)
+    >>> index.gaps(start, end)
+
+Intervals are (start, end) pairs of anything ordered, usually datetimes, covering start up to but not including end.
+Added intervals that overlap or meet are merged, and lookups are binary searches over the merged intervals.
+"""
+__author__ = 'isparks'
+
+import bisect
+
+
+class IntervalIndex(object):
+    """A set of points held as the fewest disjoint, non-adjacent half-open intervals"""
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        for start, end in intervals:
+            self.add(start, end)
+
+    def add(self, start, end):
+        """Add the interval start to end, merging it with any it overlaps or meets"""
+        if not start < end:
+            return
+        # Merged intervals are those ending at or after start and starting at or before end
+        first = bisect.bisect_left(self.ends, start)
+        last = bisect.bisect_right(self.starts, end)
+        if first < last:
+            start = min(start, self.starts[first])
+            end = max(end, self.ends[last - 1])
+        self.starts[first:last] = [start]
+        self.ends[first:last] = [end]
+
+    def overlaps(self, start, end):
+        """True if any point from start to end is in the index"""
+        i = bisect.bisect_right(self.ends, start)
+        return i < len(self.starts) and self.starts[i] < end
+
+    def covers(self, start, end):
+        """True if every point from start to end is in the index"""
+        return not self.gaps(start, end)
+
+    def gaps(self, start, end):
+        """Returns the (start, end) intervals from start to end that are not in the index"""
+        gaps = []
+        i = bisect.bisect_right(self.ends, start)
+        while start < end:
+            if i == len(self.starts) or self.starts[i] >= end:
+                gaps.append((start, end))
+                break
+            if self.starts[i] > start:
+                gaps.append((start, self.starts[i]))
+            start = self.ends[i]
+            i += 1
+        return gaps
+
+    def __iter__(self):
+        return iter(zip(self.starts, self.ends))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __repr__(self):
+        return "<IntervalIndex %r>" % list(self)
@@ -0,0 +1,132 @@
+# -*- coding: UTF-8 -*-
+"""
+Compact result models.
+
+API methods called with model=True return these instead of a response. Each model stores its fields in __slots__
+rather than a dict and keeps date/time fields as the raw ISO string until first accessed, when it is parsed and the
+datetime kept in its place.
+
+    >>> for subject in ac.get_all_subjects(21, model=True):
+    ...     print(subject.id, subject.dob.year)
+"""
+__author__ = 'isparks'
+
+import datetime
+
+import six
+
+
+class LazyDateTime(object):
+    """Descriptor parsing the ISO date/time string held in a slot the first time it is read"""
+    def __init__(self, slot, date_only=False):
+        self.slot = slot
+        self.date_only = date_only
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if isinstance(value, six.string_types):
+            if self.date_only:
+                value = datetime.datetime.strptime(value[:10], '%Y-%m-%d').date()
+            else:
+                value = datetime.datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+            setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj, value):
+        setattr(obj, self.slot, value)
+
+
+class Model(object):
+    """
+    Base of the result models
+
+    FIELDS lists (slot, payload key) pairs, a missing key leaves its slot None.
+    """
+    __slots__ = ()
+    FIELDS = ()
+
+    @classmethod
+    def from_record(cls, record):
+        """Make a model from a decoded payload record"""
+        obj = cls.__new__(cls)
+        for slot, key in cls.FIELDS:
+            setattr(obj, slot, record.get(key))
+        return obj
+
+    @classmethod
+    def from_records(cls, records):
+        """Make a list of models from a list of decoded payload records"""
+        from_record = cls.from_record
+        return [from_record(record) for record in records]
+
+    def to_record(self):
+        """Returns the model as a payload record, date/time fields as they were received if not yet read"""
+        record = {}
+        for slot, key in self.FIELDS:
+            value = getattr(self, slot)
+            if isinstance(value, datetime.datetime):
+                value = value.strftime('%Y-%m-%dT%H:%M:%S')
+            elif isinstance(value, datetime.date):
+                value = value.strftime('%Y-%m-%d')
+            record[key] = value
+        return record
+
+    def __eq__(self, other):
+        #Compare through the public names so a parsed field equals its unparsed string
+        return type(self) is type(other) and all(getattr(self, slot.lstrip('_')) == getattr(other, slot.lstrip('_'))
+                                                 for slot, _ in self.FIELDS)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "<%s %s>" % (type(self).__name__, " ".join("%s=%r" % (slot.lstrip('_'), getattr(self, slot))
+                                                         for slot, _ in self.FIELDS))
+
+
+class Study(Model):
+    """A study"""
+    __slots__ = ('id', 'name', '_date_created')
+    FIELDS = (('id', 'Id'), ('name', 'Name'), ('_date_created', 'DateCreated'))
+    date_created = LazyDateTime('_date_created')
+
+
+class Subject(Model):
+    """A subject of a study"""
+    __slots__ = ('id', 'study_id', 'subject_identifier', 'gender', '_dob')
+    FIELDS = (('id', 'Id'), ('study_id', 'StudyId'), ('subject_identifier', 'SubjectIdentifier'),
+              ('gender', 'Gender'), ('_dob', 'DOB'))
+    dob = LazyDateTime('_dob', date_only=True)
+
+
+class DayStat(Model):
+    """Statistics of one day for a subject"""
+    __slots__ = ('_date', 'steps', 'calories', 'wear_minutes')
+    FIELDS = (('_date', 'Date'), ('steps', 'Steps'), ('calories', 'Calories'), ('wear_minutes', 'WearMinutes'))
+    date = LazyDateTime('_date', date_only=True)
+
+
+class SleepEpoch(Model):
+    """One sleep epoch of a subject"""
+    __slots__ = ('_timestamp', 'axis_x_counts', 'axis_y_counts', 'axis_z_counts', 'sleep')
+    FIELDS = (('_timestamp', 'Timestamp'), ('axis_x_counts', 'AxisXCounts'), ('axis_y_counts', 'AxisYCounts'),
+              ('axis_z_counts', 'AxisZCounts'), ('sleep', 'Sleep'))
+    timestamp = LazyDateTime('_timestamp')
+
+
+class BoutPeriod(Model):
+    """A period of a subject wearing (or not wearing) the device"""
+    __slots__ = ('_start', '_end', 'type')
+    FIELDS = (('_start', 'StartDateTime'), ('_end', 'EndDateTime'), ('type', 'Type'))
+    start = LazyDateTime('_start')
+    end = LazyDateTime('_end')
+
+
+class BedTime(Model):
+    """A subject's time in bed"""
+    __slots__ = ('_inbed', '_outbed')
+    FIELDS = (('_inbed', 'InBed'), ('_outbed', 'OutBed'))
+    inbed = LazyDateTime('_inbed')
+    outbed = LazyDateTime('_outbed')
@@ -0,0 +1,68 @@
+# -*- coding: UTF-8 -*-
+"""
+Helpers for running client calls on a pool of worker threads.
+
+Both helpers only keep a bounded window of calls submitted ahead of the consumer so that memory stays bounded
+however many items there are, and both cancel outstanding calls if the consumer stops iterating early.
+"""
+__author__ = 'isparks'
+
+import collections
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def imap_unordered(fn, items, max_workers=DEFAULT_MAX_WORKERS):
+    """Call fn(item) for each item on a worker pool, yield (item, result) as each call completes"""
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        try:
+            while True:
+                while len(pending) < max_workers:
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        break
+                    pending[executor.submit(fn, item)] = item
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def imap_ordered(fn, items, max_workers=DEFAULT_MAX_WORKERS, window=None):
+    """
+    Call fn(item) for each item on a worker pool, yield (item, result) in the order of items
+
+    The window calls (default max_workers) after the item being yielded are kept submitted, so they run while the
+    consumer handles it, and a slow item holds back at most that many finished results.
+    """
+    window = window or max_workers
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = collections.deque()
+
+        def fill():
+            while len(pending) < window:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                pending.append((item, executor.submit(fn, item)))
+
+        try:
+            fill()
+            while pending:
+                item, future = pending.popleft()
+                #Top the window up before waiting so window calls are in flight while the consumer has this item
+                fill()
+                yield item, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
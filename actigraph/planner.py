@@ -0,0 +1,181 @@
+# -*- coding: UTF-8 -*-
+"""
+Wear-aware fetching of minutes and sleep data.
+
+Days when the device was not worn have nothing worth fetching. A WearPlanner first gets a subject's bout periods for
+the span asked for, indexes when the device was worn and then only requests the days and nights that overlap wear:
+
+    >>> from actigraph.planner import WearPlanner
+    >>> planner = WearPlanner(ac, use_bed_times=True)
+    >>> for date, response in planner.iter_subject_daily_minutes(999, start_date, end_date):
+    ...     print(date, response.json())
+    >>> planner.saved
+    23
+
+saved is the number of requests avoided less the requests made for planning.
+"""
+__author__ = 'isparks'
+
+import datetime
+import threading
+
+from actigraph.client import daterange, parse_isodatetime, payload_records, twenty_four_hour_windows
+from actigraph.intervals import IntervalIndex
+from actigraph.parallel import DEFAULT_MAX_WORKERS, imap_ordered
+
+#Bout period keys
+BOUT_START_KEY = 'StartDateTime'
+BOUT_END_KEY = 'EndDateTime'
+BOUT_TYPE_KEY = 'Type'
+WEAR = 'Wear'
+
+#Bed time keys
+INBED_KEY = 'InBed'
+OUTBED_KEY = 'OutBed'
+
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def midnight(date):
+    """Returns the datetime of the start of a date"""
+    return datetime.datetime.combine(date, datetime.time())
+
+
+class WearPlan(object):
+    """
+    When a subject wore the device from start to end
+
+    wear is an IntervalIndex of the wear periods, bed_times the (inbed, outbed) periods in bed or None if they were not
+    fetched.
+    """
+    def __init__(self, subject_id, start, end, wear, bed_times=None):
+        self.subject_id = subject_id
+        self.start = start
+        self.end = end
+        self.wear = wear
+        self.bed_times = bed_times
+
+    def worn_days(self, start_date, end_date):
+        """Returns the dates from start_date to end_date inclusive that overlap wear"""
+        return [date for date in daterange(start_date, end_date)
+                if self.wear.overlaps(midnight(date), midnight(date) + ONE_DAY)]
+
+    def windows(self, start, end):
+        """Returns the (inbed, outbed) windows from start to end, the bed times if they were fetched and otherwise
+        consecutive windows of up to 24 hours. Bed times over 24 hours are split, sleep data being limited to 24 hours
+        a request"""
+        if self.bed_times is None:
+            return twenty_four_hour_windows(start, end)
+        return [window for inbed, outbed in self.bed_times if inbed < end and outbed > start
+                for window in twenty_four_hour_windows(inbed, outbed)]
+
+    def sleep_windows(self, start, end):
+        """Returns the windows from start to end that overlap wear"""
+        return [window for window in self.windows(start, end) if self.wear.overlaps(*window)]
+
+    def __repr__(self):
+        return "<WearPlan %s %r>" % (self.subject_id, self.wear)
+
+
+class WearPlanner(object):
+    """
+    Plans minute and sleep requests around when the device was worn
+
+    With use_bed_times the subject's bed times are also fetched and sleep data is requested for each night in bed
+    that overlaps wear rather than for every 24 hours that does. Counts of requests made, skipped and made for
+    planning are kept across calls.
+    """
+    def __init__(self, client, use_bed_times=False, max_workers=DEFAULT_MAX_WORKERS):
+        self.client = client
+        self.use_bed_times = use_bed_times
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.requested = 0
+        self.skipped = 0
+        self.planning_requests = 0
+
+    @property
+    def saved(self):
+        """Requests avoided less requests made for planning"""
+        return self.skipped - self.planning_requests
+
+    def _count(self, requested, skipped, planning=0):
+        with self.lock:
+            self.requested += requested
+            self.skipped += skipped
+            self.planning_requests += planning
+
+    def _records(self, response):
+        """Returns the records of a response, raising for failures"""
+        response.raise_for_status()
+        return payload_records(response.json())
+
+    def plan(self, subject_id, start, end):
+        """Get the bout periods (and bed times if used) of a subject from start to end, returns a WearPlan"""
+        wear = IntervalIndex()
+        for bout in self._records(self.client.get_subject_bout_periods(subject_id, start=start, stop=end)):
+            # Bouts without a type are taken to be wear
+            if bout.get(BOUT_TYPE_KEY, WEAR) == WEAR:
+                wear.add(parse_isodatetime(bout[BOUT_START_KEY]), parse_isodatetime(bout[BOUT_END_KEY]))
+        planning = 1
+
+        bed_times = None
+        if self.use_bed_times:
+            bed_times = [(parse_isodatetime(bed_time[INBED_KEY]), parse_isodatetime(bed_time[OUTBED_KEY]))
+                         for bed_time in self._records(self.client.get_subject_bed_times(subject_id, start=start,
+                                                                                         stop=end))]
+            planning += 1
+        self._count(0, 0, planning)
+        return WearPlan(subject_id, start, end, wear, bed_times)
+
+    def _fetch(self, method, subject_id, stream):
+        """Returns fetch(arg) calling method for the subject, raising for failed responses unless streaming"""
+        def fetch(arg):
+            args = arg if isinstance(arg, tuple) else (arg,)
+            if stream:
+                return method(subject_id, *args, stream=True)
+            response = method(subject_id, *args)
+            response.raise_for_status()
+            return response
+        return fetch
+
+    def iter_subject_daily_minutes(self, subject_id, start_date, end_date, max_workers=None, stream=False, plan=None):
+        """
+        Get daily minutes for the days from start_date to end_date inclusive that overlap wear
+
+        As ActigraphClient.iter_subject_daily_minutes, yielding (date, response) or with stream (date, records) in
+        date order, days not worn being left out. plan is a WearPlan covering the dates, made if not given.
+        """
+        if start_date > end_date:
+            raise ValueError("Start date after End date")
+        if plan is None:
+            plan = self.plan(subject_id, midnight(start_date), midnight(end_date) + ONE_DAY)
+        days = plan.worn_days(start_date, end_date)
+        self._count(len(days), (end_date - start_date).days + 1 - len(days))
+        return imap_ordered(self._fetch(self.client.get_subject_daily_minutes, subject_id, stream), days,
+                            max_workers or self.max_workers)
+
+    def _iter_sleep(self, method, subject_id, start, end, max_workers, plan, stream=False):
+        """Plan and count the sleep windows to fetch, returns the iterator of (inbed, outbed, result)"""
+        self.client._check_start_end(start, end)
+        if plan is None:
+            plan = self.plan(subject_id, start, end)
+        windows = plan.sleep_windows(start, end)
+        self._count(len(windows), len(plan.windows(start, end)) - len(windows))
+        results = imap_ordered(self._fetch(method, subject_id, stream), windows, max_workers or self.max_workers)
+        return ((window[0], window[1], result) for window, result in results)
+
+    def iter_subject_sleep_epochs(self, subject_id, start, end, max_workers=None, stream=False, plan=None):
+        """
+        Get sleep epochs for each night in bed (or 24 hours) from start to end that overlaps wear
+
+        Yields (inbed, outbed, response), or with stream (inbed, outbed, records), in time order. plan is a WearPlan
+        covering start to end, made if not given.
+        """
+        return self._iter_sleep(self.client.get_subject_sleep_epochs, subject_id, start, end, max_workers, plan,
+                                stream)
+
+    def iter_subject_sleep_score(self, subject_id, start, end, max_workers=None, plan=None):
+        """Get the sleep score of each night in bed (or 24 hours) from start to end that overlaps wear, yields
+        (inbed, outbed, response) in time order"""
+        return self._iter_sleep(self.client.get_subject_sleep_score, subject_id, start, end, max_workers, plan)
@@ -0,0 +1,202 @@
+# -*- coding: UTF-8 -*-
+"""
+A pool of clients for several access keys.
+
+Each access key gets its own client, so its own connection pool and its own scheduler and with it its own rate
+budget. Calls for a study are routed to a key that can access it, the least loaded if several can, so the throughput
+of a study shared by several keys is the sum of theirs:
+
+    >>> from actigraph.pool import ActigraphClientPool
+    >>> pool = ActigraphClientPool(url, [("access_key_1", "secret_key_1"), ("access_key_2", "secret_key_2")],
+    ...                            make_scheduler=lambda: RequestScheduler(rate=10))
+    >>> pool.get_all_subjects(21).json()
+    >>> pool.get_subject_daily_stats(999).json()
+
+The studies each key can access are found with get_all_studies the first time a study is routed, unless given when
+the key is added. The study of a subject is learned from get_all_subjects calls made through the pool, or else looked
+up with get_subject.
+"""
+__author__ = 'isparks'
+
+import itertools
+import threading
+
+from actigraph.client import ActigraphClient
+from actigraph.models import Subject
+from actigraph.parallel import DEFAULT_MAX_WORKERS, imap_ordered, imap_unordered
+
+#Methods taking a study id first, routed to a key that can access the study
+STUDY_METHODS = frozenset([
+    'get_study',
+])
+
+#Methods taking a subject id first, routed by the subject's study
+SUBJECT_METHODS = frozenset([
+    'get_subject',
+    'get_subject_stats',
+    'get_subject_daily_stats',
+    'get_subject_daily_minutes',
+    'get_subject_sleep_epochs',
+    'get_subject_sleep_score',
+    'get_subject_bout_periods',
+    'get_subject_bed_times',
+    'iter_subject_daily_minutes',
+    'iter_subject_sleep_epochs',
+    'iter_subject_sleep_score',
+])
+
+
+class PooledClient(ActigraphClient):
+    """An ActigraphClient that counts the requests it has in flight, so the pool can tell how loaded it is"""
+    def __init__(self, *args, **kwargs):
+        super(PooledClient, self).__init__(*args, **kwargs)
+        self.load_lock = threading.Lock()
+        self.in_flight = 0
+        self.studies = None
+
+    def _send(self, url, stream=False):
+        with self.load_lock:
+            self.in_flight += 1
+        try:
+            return super(PooledClient, self)._send(url, stream)
+        finally:
+            with self.load_lock:
+                self.in_flight -= 1
+
+
+class ActigraphClientPool(object):
+    """
+    Routes API calls across clients for several access keys
+
+    credentials is a list of (access_key, secret_key) or (access_key, secret_key, study_ids) tuples. make_scheduler()
+    makes the RequestScheduler of each key, by default each client makes its own. Other keyword arguments are passed
+    to every client. The pool has the API and bulk methods of ActigraphClient that take a study or subject id,
+    get_all_studies returns a list of the studies of every key. The per-subject calls of the study bulk methods are
+    each routed on their own, so they are spread across the keys of a shared study.
+    """
+    def __init__(self, base_url, credentials=(), make_scheduler=None, **client_kwargs):
+        self.base_url = base_url
+        self.make_scheduler = make_scheduler
+        self.client_kwargs = client_kwargs
+        self.clients = []
+        self.subject_studies = {}
+        self.lock = threading.Lock()
+        self.turn = itertools.count()
+        for credential in credentials:
+            self.add(*credential)
+
+    def add(self, access_key, secret_key, studies=None):
+        """Add a key, studies being the ids of the studies it can access or None to find them when needed"""
+        scheduler = self.make_scheduler() if self.make_scheduler is not None else None
+        client = PooledClient(self.base_url, access_key, secret_key, scheduler=scheduler, **self.client_kwargs)
+        if studies is not None:
+            client.studies = set(str(study_id) for study_id in studies)
+        with self.lock:
+            self.clients.append(client)
+        return client
+
+    def close(self):
+        """Close every client"""
+        for client in self.clients:
+            client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _studies(self, client):
+        """Returns the ids of the studies a client can access, getting them the first time"""
+        if client.studies is None:
+            response = client.get_all_studies()
+            response.raise_for_status()
+            client.studies = set(str(study['Id']) for study in response.json())
+        return client.studies
+
+    def clients_for_study(self, study_id):
+        """Returns the clients that can access a study"""
+        return [client for client in list(self.clients) if str(study_id) in self._studies(client)]
+
+    def client_for_study(self, study_id):
+        """Returns the least loaded client that can access a study, taking turns between equally loaded ones"""
+        clients = self.clients_for_study(study_id)
+        if not clients:
+            raise ValueError("No access key can access study %s" % study_id)
+        turn = next(self.turn)
+        return min(enumerate(clients), key=lambda c: (c[1].in_flight, (c[0] - turn) % len(clients)))[1]
+
+    def study_of(self, subject_id):
+        """Returns the id of the study of a subject, looking it up with get_subject if it is not known"""
+        study_id = self.subject_studies.get(str(subject_id))
+        if study_id is None:
+            for client in list(self.clients):
+                response = client.get_subject(subject_id)
+                if response.status_code == 200:
+                    study_id = str(response.json()['StudyId'])
+                    break
+            else:
+                raise ValueError("No access key can access subject %s" % subject_id)
+            self.subject_studies[str(subject_id)] = study_id
+        return study_id
+
+    def client_for_subject(self, subject_id):
+        """Returns the least loaded client that can access a subject's study"""
+        return self.client_for_study(self.study_of(subject_id))
+
+    def get_all_studies(self):
+        """Get the studies of every key, returns a list of study dicts without duplicates"""
+        studies = {}
+        for client in list(self.clients):
+            response = client.get_all_studies()
+            response.raise_for_status()
+            for study in response.json():
+                studies.setdefault(str(study['Id']), study)
+            client.studies = set(str(study['Id']) for study in response.json())
+        return list(studies.values())
+
+    def get_all_subjects(self, study_id, model=False):
+        """As ActigraphClient.get_all_subjects, remembering the study of each subject for routing"""
+        client = self.client_for_study(study_id)
+        response = client.get_all_subjects(study_id)
+        if response.status_code == 200:
+            for subject in response.json():
+                self.subject_studies[str(subject['Id'])] = str(study_id)
+        return client._to_model(response, Subject, True) if model else response
+
+    def _study_subject_ids(self, study_id):
+        """Returns the ids of the subjects of a study, raising for a failed response"""
+        response = self.get_all_subjects(study_id)
+        response.raise_for_status()
+        return [subject['Id'] for subject in response.json()]
+
+    def get_study_snapshot(self, study_id, include=None, max_workers=DEFAULT_MAX_WORKERS):
+        """As ActigraphClient.get_study_snapshot, each subject's calls made by the least loaded key for the study"""
+        include = self.client_for_study(study_id)._check_include(include)
+        return self._iter_snapshots(study_id, include, imap_unordered, max_workers)
+
+    def iter_study_subject_data(self, study_id, fetch=None, prefetch=DEFAULT_MAX_WORKERS, max_workers=None):
+        """As ActigraphClient.iter_study_subject_data, each subject's calls made by the least loaded key for the
+        study"""
+        fetch = self.client_for_study(study_id)._check_include(fetch)
+        return self._iter_snapshots(study_id, fetch, imap_ordered, max_workers or prefetch, window=prefetch)
+
+    def _iter_snapshots(self, study_id, include, imap, max_workers, **kwargs):
+        """Generator behind the snapshot methods, so that arguments are validated when they are called"""
+        snapshot = lambda subject_id: self.client_for_study(study_id)._snapshot_subject(subject_id, include)
+        for _, result in imap(snapshot, self._study_subject_ids(study_id), max_workers, **kwargs):
+            yield result
+
+    def __getattr__(self, name):
+        if name in STUDY_METHODS:
+            route = self.client_for_study
+        elif name in SUBJECT_METHODS:
+            route = self.client_for_subject
+        else:
+            raise AttributeError(name)
+
+        def call(routed_id, *args, **kwargs):
+            return getattr(route(routed_id), name)(routed_id, *args, **kwargs)
+        call.__name__ = name
+        call.__doc__ = getattr(ActigraphClient, name).__doc__
+        return call
@@ -0,0 +1,220 @@
+# -*- coding: UTF-8 -*-
+"""
+Scheduling of requests: rate limiting, adaptive concurrency and retries with backoff.
+
+    >>> from actigraph.scheduler import AIMDLimiter, RequestScheduler, RetryPolicy
+    >>> scheduler = RequestScheduler(retry=RetryPolicy(max_retries=5), rate=20, limiter=AIMDLimiter(maximum=32))
+    >>> ac = ActigraphClient(url, "access_key", "secret_key", scheduler=scheduler)
+
+Every attempt is a new request, so it is signed afresh by ActigraphAuth with a current Date header.
+"""
+__author__ = 'isparks'
+
+import email.utils
+import random
+import threading
+import time
+
+#Statuses worth retrying, the API is throttling us or is temporarily unavailable
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+#Status the API throttles with
+THROTTLED = 429
+
+
+class TokenBucket(object):
+    """Token bucket rate limit of rate requests a second with bursts of up to burst requests, thread safe"""
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.tokens = self.burst
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token, returns the number of seconds to wait before it may be used"""
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+
+class AIMDLimiter(object):
+    """
+    Adaptive limit on the number of requests in flight, thread safe
+
+    The limit grows additively (by about increase per limit successful requests) and is cut multiplicatively by
+    decrease whenever a request is throttled or, if latency_threshold is set, slower than latency_threshold seconds.
+    Requests that started before the last cut were sent under the old limit, so they do not cut it again: a burst of
+    throttled requests cuts the limit once. Failed requests leave the limit as it is.
+
+    Threads wait in acquire, callers that must not block (such as asyncio tasks) can add_waiter a callback to be told
+    when a slot is given back and then try_acquire again.
+    """
+    def __init__(self, initial=8, minimum=1, maximum=64, increase=1.0, decrease=0.5, latency_threshold=None):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_threshold = latency_threshold
+        self.in_flight = 0
+        self.last_decrease = None
+        self.condition = threading.Condition()
+        self.waiters = []
+
+    def try_acquire(self):
+        """Take a slot if one is free, returns whether one was taken"""
+        with self.condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        """Take a slot, waiting for one to be free"""
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def add_waiter(self, callback):
+        """Call callback(), from the releasing thread, each time a slot is given back until it is removed"""
+        with self.condition:
+            self.waiters.append(callback)
+
+    def remove_waiter(self, callback):
+        """Stop calling a callback added with add_waiter"""
+        with self.condition:
+            self.waiters.remove(callback)
+
+    def release(self, throttled=False, latency=None, failed=False):
+        """Give back a slot, adjusting the limit by how the request went unless it failed without a response"""
+        with self.condition:
+            self.in_flight -= 1
+            slow = self.latency_threshold is not None and latency is not None and latency > self.latency_threshold
+            if failed:
+                pass
+            elif throttled or slow:
+                now = time.time()
+                started = now - latency if latency is not None else now
+                if self.last_decrease is None or started >= self.last_decrease:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+            self.condition.notify_all()
+            waiters = list(self.waiters)
+        for waiter in waiters:
+            waiter()
+
+
+class RetryPolicy(object):
+    """
+    How failed requests are retried
+
+    A call is retried up to max_retries times for a status in statuses or a connection error. The wait before each
+    retry is the Retry-After header if the response has one, otherwise a random (full jitter) wait of up to
+    backoff * 2 ** attempt seconds. Either is capped at max_backoff.
+    """
+    def __init__(self, max_retries=3, backoff=0.5, max_backoff=30.0, statuses=RETRY_STATUSES):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+
+    def retry_after(self, response):
+        """Returns the seconds to wait given by a Retry-After header of the response (seconds or HTTP date), or None"""
+        value = response.headers.get('Retry-After') if response is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            parsed = email.utils.parsedate_tz(value)
+            if parsed is None:
+                return None
+            return max(0.0, email.utils.mktime_tz(parsed) - time.time())
+
+    def delay(self, attempt, response=None):
+        """Returns the seconds to wait before retry number attempt (counting from 0)"""
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            return min(self.max_backoff, retry_after)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+class RequestScheduler(object):
+    """
+    Schedules the attempts of each call: waits for the rate limit and a concurrency slot before each attempt, and
+    decides whether and when to retry after it
+
+    rate (requests a second) and burst configure an optional TokenBucket, limiter is an optional AIMDLimiter.
+    The default is to retry with the default RetryPolicy without any rate or concurrency limit.
+    """
+    def __init__(self, retry=None, rate=None, burst=None, limiter=None):
+        self.retry = RetryPolicy() if retry is None else retry
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.limiter = limiter
+
+    def reserve(self):
+        """Take a rate limit token, returns the seconds to wait before using it"""
+        return self.bucket.reserve() if self.bucket is not None else 0.0
+
+    def try_acquire(self):
+        """Take a concurrency slot if one is free, returns whether one was taken"""
+        return self.limiter.try_acquire() if self.limiter is not None else True
+
+    def acquire(self):
+        """Take a concurrency slot, waiting for one to be free"""
+        if self.limiter is not None:
+            self.limiter.acquire()
+
+    def done(self, attempt, response=None, latency=None, error=None):
+        """
+        Record the outcome of attempt (counting from 0), one of response or a retryable error, releasing its slot
+
+        Returns the seconds to wait before retrying, or None if the call is finished.
+        """
+        status = response.status_code if response is not None else None
+        if self.limiter is not None:
+            self.limiter.release(throttled=status == THROTTLED, latency=latency, failed=error is not None)
+        if attempt >= self.retry.max_retries:
+            return None
+        if error is None and status not in self.retry.statuses:
+            return None
+        return self.retry.delay(attempt, response)
+
+    def call(self, send, retry_errors=()):
+        """
+        Make a call, send() makes one attempt and returns its response, which is retried as the policy allows
+
+        Exceptions of the types in retry_errors are retried too, and raised once retries are exhausted. Returns
+        the response of the final attempt.
+        """
+        attempt = 0
+        while True:
+            wait = self.reserve()
+            if wait:
+                time.sleep(wait)
+            self.acquire()
+            start = time.time()
+            try:
+                response = send()
+            except retry_errors as e:
+                delay = self.done(attempt, latency=time.time() - start, error=e)
+                if delay is None:
+                    raise
+            except Exception:
+                if self.limiter is not None:
+                    self.limiter.release(failed=True)
+                raise
+            else:
+                delay = self.done(attempt, response, latency=time.time() - start)
+                if delay is None:
+                    return response
+                response.close()
+            time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,47 @@
+# -*- coding: UTF-8 -*-
+"""
+Request coalescing: concurrent calls for the same key share one call and its result.
+"""
+__author__ = 'isparks'
+
+import threading
+
+
+class _Call(object):
+    """A call in flight, its outcome is set before done is"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Threads calling do() with the same key while a call for it is in flight wait for and share its outcome"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn):
+        """Returns fn(), or the result of the call of fn already in flight for key. Its exception is raised to all"""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
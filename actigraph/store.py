@@ -0,0 +1,213 @@
+# -*- coding: UTF-8 -*-
+"""
+Local memory-mapped store of decoded minutes and sleep epochs (pip install actigraph[numpy]).
+
+Each subject's minutes and epochs are kept in an append-only directory of fixed-width binary column files, one per
+column of the decode schema, with a small index of the row each day starts at. Reads map the column files with
+numpy.memmap and slice them, so reading months of minutes parses no JSON and copies nothing:
+
+    >>> from actigraph.store import EpochStore, DAYMINUTES
+    >>> store = EpochStore('actigraph-store')
+    >>> store.fetch_daily_minutes(ac, 999, start_date, end_date)
+    >>> minutes = store.read(DAYMINUTES, 999, start, end)
+    >>> minutes['AxisYCounts'].mean()
+
+Rows are kept in time order. Appending records at or before the last stored timestamp drops them, so writing a day
+twice stores it once. A SyncEngine can write into a store with sync_handler().
+"""
+__author__ = 'isparks'
+
+import datetime
+import os
+import threading
+
+import numpy as np
+
+from actigraph.decode import DAY_MINUTES, SLEEP_EPOCHS, decode
+from actigraph.parallel import DEFAULT_MAX_WORKERS
+
+#Kinds of data stored, named as the endpoints they come from
+DAYMINUTES = 'dayminutes'
+SLEEPEPOCHS = 'sleepepochs'
+SCHEMAS = {
+    DAYMINUTES: DAY_MINUTES,
+    SLEEPEPOCHS: SLEEP_EPOCHS,
+}
+
+TIMESTAMP = 'Timestamp'
+INDEX_FILE = 'index.bin'
+
+#Epochs fetched are appended in batches of this many
+APPEND_BATCH = 24 * 60
+
+#The day index holds the first row of each day
+INDEX_DTYPE = np.dtype([('Day', 'datetime64[D]'), ('Row', 'i8')])
+
+
+def _column_file(name):
+    return name + '.bin'
+
+
+class EpochStore(object):
+    """
+    Store of minutes and epochs for many subjects under the directory path
+
+    Safe to share between threads, appends are serialised.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def _dir(self, kind, subject_id):
+        if kind not in SCHEMAS:
+            raise ValueError("Cannot store %r, choose from %s" % (kind, sorted(SCHEMAS)))
+        return os.path.join(self.path, kind, str(subject_id))
+
+    def _dtype(self, kind):
+        return np.dtype([(str(key), field_dtype) for key, field_dtype in SCHEMAS[kind]])
+
+    def _rows(self, directory, dtype):
+        """Number of complete rows, every column file holding at least that many values"""
+        rows = None
+        for name in dtype.names:
+            path = os.path.join(directory, _column_file(name))
+            count = os.path.getsize(path) // dtype.fields[name][0].itemsize if os.path.exists(path) else 0
+            rows = count if rows is None else min(rows, count)
+        return rows or 0
+
+    def _map(self, path, dtype, count):
+        """Map the first count values of a file, an empty array if there are none"""
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+    def _index(self, directory, rows):
+        """The day index, less any entries past the complete rows"""
+        path = os.path.join(directory, INDEX_FILE)
+        count = os.path.getsize(path) // INDEX_DTYPE.itemsize if os.path.exists(path) else 0
+        index = self._map(path, INDEX_DTYPE, count)
+        return index[index['Row'] < rows]
+
+    def rows(self, kind, subject_id):
+        """Returns the number of rows stored for a subject"""
+        return self._rows(self._dir(kind, subject_id), self._dtype(kind))
+
+    def last_timestamp(self, kind, subject_id):
+        """Returns the last timestamp stored for a subject as a datetime, or None"""
+        directory = self._dir(kind, subject_id)
+        rows = self._rows(directory, self._dtype(kind))
+        if not rows:
+            return None
+        column = self._map(os.path.join(directory, _column_file(TIMESTAMP)), self._dtype(kind)[TIMESTAMP], rows)
+        return column[-1].astype(datetime.datetime)
+
+    def append(self, kind, subject_id, source):
+        """
+        Append the records of a response, payload, list of records or decoded array, returns the number of rows
+        written
+
+        Records are sorted by time and those at or before the last stored timestamp dropped.
+        """
+        directory = self._dir(kind, subject_id)
+        dtype = self._dtype(kind)
+        new = source if isinstance(source, np.ndarray) else decode(source, SCHEMAS[kind])
+        new = new[np.argsort(new[TIMESTAMP], kind='mergesort')]
+
+        with self.lock:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            rows = self._rows(directory, dtype)
+            last = None
+            if rows:
+                last = self._map(os.path.join(directory, _column_file(TIMESTAMP)), dtype[TIMESTAMP], rows)[-1]
+                new = new[new[TIMESTAMP] > last]
+            if not len(new):
+                return 0
+
+            # Cut any column past the complete rows, left by an interrupted append, before appending
+            for name in dtype.names:
+                with open(os.path.join(directory, _column_file(name)), 'ab') as f:
+                    f.truncate(rows * dtype.fields[name][0].itemsize)
+                    f.write(np.ascontiguousarray(new[name]).tobytes())
+
+            days = new[TIMESTAMP].astype('datetime64[D]')
+            starts = np.flatnonzero(np.concatenate([[last is None or days[0] != np.datetime64(last, 'D')],
+                                                    days[1:] != days[:-1]]))
+            index = np.empty(len(starts), dtype=INDEX_DTYPE)
+            index['Day'] = days[starts]
+            index['Row'] = rows + starts
+            with open(os.path.join(directory, INDEX_FILE), 'ab') as f:
+                f.truncate(len(self._index(directory, rows)) * INDEX_DTYPE.itemsize)
+                f.write(index.tobytes())
+        return len(new)
+
+    def read(self, kind, subject_id, start=None, end=None):
+        """
+        Returns a dict of column name to a read-only memory-mapped array of the rows from start up to end
+
+        start and end are datetimes, dates or None for the first and last rows. Nothing is copied until the arrays are
+        used.
+        """
+        directory = self._dir(kind, subject_id)
+        dtype = self._dtype(kind)
+        rows = self._rows(directory, dtype)
+        timestamps = self._map(os.path.join(directory, _column_file(TIMESTAMP)), dtype[TIMESTAMP], rows)
+        index = self._index(directory, rows)
+        first = 0 if start is None else self._row(timestamps, index, rows, start)
+        last = rows if end is None else self._row(timestamps, index, rows, end)
+        return dict((name, self._map(os.path.join(directory, _column_file(name)), dtype.fields[name][0],
+                                     rows)[first:max(first, last)])
+                    for name in dtype.names)
+
+    def _row(self, timestamps, index, rows, when):
+        """The first row at or after when, found in the day index then searched for within the day"""
+        when = np.datetime64(when, 's')
+        day = np.searchsorted(index['Day'], when.astype('datetime64[D]'), side='right') - 1
+        low = index['Row'][day] if day >= 0 else 0
+        high = index['Row'][day + 1] if day + 1 < len(index) else rows
+        return low + np.searchsorted(timestamps[low:high], when)
+
+    def sync_handler(self, handler=None):
+        """
+        Returns a SyncEngine handler storing synced day minutes, passing every batch on to handler if given
+        """
+        def store_handler(subject_id, endpoint, records):
+            if endpoint == DAYMINUTES:
+                self.append(DAYMINUTES, subject_id, records)
+            if handler is not None:
+                handler(subject_id, endpoint, records)
+        return store_handler
+
+    def fetch_daily_minutes(self, client, subject_id, start_date, end_date, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Fetch and store the minutes of a subject from start_date to end_date inclusive, starting from the last day
+        stored so that a day stored in part is completed. Returns the number of rows written.
+        """
+        last = self.last_timestamp(DAYMINUTES, subject_id)
+        if last is not None:
+            # The last day is fetched again, append drops the minutes already stored
+            start_date = max(start_date, last.date())
+        if start_date > end_date:
+            return 0
+        return sum(self.append(DAYMINUTES, subject_id, list(records))
+                   for _, records in client.iter_subject_daily_minutes(subject_id, start_date, end_date,
+                                                                       max_workers=max_workers, stream=True))
+
+    def fetch_sleep_epochs(self, client, subject_id, start, end, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Fetch and store the epochs of a subject from start to end, starting after the last epoch stored. Returns the
+        number of rows written.
+        """
+        last = self.last_timestamp(SLEEPEPOCHS, subject_id)
+        if last is not None:
+            start = max(start, last + datetime.timedelta(seconds=1))
+        if start >= end:
+            return 0
+        written = 0
+        batch = []
+        for epoch in client.iter_subject_sleep_epochs(subject_id, start, end, max_workers=max_workers, stream=True):
+            batch.append(epoch)
+            if len(batch) == APPEND_BATCH:
+                written += self.append(SLEEPEPOCHS, subject_id, batch)
+                batch = []
+        return written + (self.append(SLEEPEPOCHS, subject_id, batch) if batch else 0)
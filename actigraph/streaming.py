@@ -0,0 +1,108 @@
+# -*- coding: UTF-8 -*-
+"""
+Incremental parsing of JSON payloads, so that records can be processed as they arrive from the socket.
+
+Only the record being parsed and the unparsed part of the last chunk read are held in memory, however large the
+payload.
+"""
+__author__ = 'isparks'
+
+import codecs
+import json
+
+#Bytes read from the socket at a time
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = ' \t\n\r'
+
+
+class _Reader(object):
+    """Buffer over an iterator of text chunks, parsing JSON values from it"""
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _more(self):
+        """Read another chunk into the buffer, dropping the consumed part. Returns False at the end of the input"""
+        for chunk in self.chunks:
+            if chunk:
+                self.buffer = self.buffer[self.pos:] + chunk
+                self.pos = 0
+                return True
+        self.eof = True
+        return False
+
+    def peek(self):
+        """Returns the next non-whitespace character without consuming it, '' at the end of the input"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._more():
+                return ''
+
+    def expect(self, chars):
+        """Consume the next non-whitespace character, which must be one of chars, and return it"""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError("Expected one of %r at offset %d of JSON payload, found %r" % (chars, self.pos, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Parse and return the next JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                end = None
+            # A value running to the end of the buffer may be a truncated number or literal
+            if end is not None and (end < len(self.buffer) or self.eof):
+                self.pos = end
+                return value
+            if not self._more() and end is None:
+                raise ValueError("Truncated JSON payload")
+
+
+def iter_json_records(chunks):
+    """
+    Takes an iterable of text chunks of a JSON payload, yields its records as they are parsed
+
+    The payload is either an array of records or an object with an array-valued member holding the records (see
+    actigraph.client.payload_records), in which case the first array-valued member is used.
+    """
+    reader = _Reader(chunks)
+    if reader.expect('[{') == '{':
+        while True:
+            if reader.peek() == '}':
+                raise ValueError("Cannot find the records in JSON payload")
+            reader.value()
+            reader.expect(':')
+            if reader.peek() == '[':
+                reader.expect('[')
+                break
+            reader.value()
+            reader.expect(',}')
+
+    if reader.peek() == ']':
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(',]') == ']':
+            return
+
+
+def iter_response_records(response, chunk_size=CHUNK_SIZE):
+    """Takes a streamed requests response, yields its records as they are read, closing the response at the end"""
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')()
+    try:
+        chunks = (decoder.decode(chunk) for chunk in response.iter_content(chunk_size))
+        for record in iter_json_records(chunks):
+            yield record
+    finally:
+        response.close()
@@ -0,0 +1,184 @@
+# -*- coding: UTF-8 -*-
+"""
+Incremental sync of subject data.
+
+A SyncEngine remembers, per subject and endpoint, how far data has been fetched (its watermark) in a local SQLite
+store, so each run only fetches what is new since the last:
+
+    >>> from actigraph.sync import SyncEngine, WatermarkStore
+    >>> engine = SyncEngine(ac, WatermarkStore('actigraph-sync.db'), start=datetime.datetime(2014, 1, 1))
+    >>> for subject_id, counts in engine.sync_study(21, handler):
+    ...     print(subject_id, counts)
+
+handler(subject_id, endpoint, records) is called with each batch of new records, and a watermark only moves on once
+the handler has returned, so an interrupted run picks up where it stopped. Devices upload late, so watermarks stop
+immutable_after days short of the time synced to and the days since are fetched again on the next run; handlers
+should expect to see those records more than once.
+"""
+__author__ = 'isparks'
+
+import datetime
+import sqlite3
+import threading
+
+from actigraph.cache import DEFAULT_IMMUTABLE_AFTER
+from actigraph.client import isodatetime, parse_isodatetime, payload_records
+from actigraph.parallel import DEFAULT_MAX_WORKERS, imap_unordered
+
+#Endpoints that can be synced
+DAYSTATS = 'daystats'
+DAYMINUTES = 'dayminutes'
+BOUTS = 'bouts'
+BEDTIMES = 'bedtimes'
+ENDPOINTS = (DAYSTATS, DAYMINUTES, BOUTS, BEDTIMES)
+
+#Key of the date of each daily stats record
+DATE_KEY = 'Date'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watermarks (
+    subject_id TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    watermark TEXT NOT NULL,
+    PRIMARY KEY (subject_id, endpoint)
+);
+"""
+
+
+class WatermarkStore(object):
+    """SQLite store of the time each subject's endpoints have been synced up to, safe to share between threads"""
+    def __init__(self, path=':memory:'):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def get(self, subject_id, endpoint):
+        """Returns the watermark of an endpoint for a subject, None if it has never been synced"""
+        with self.lock:
+            row = self.db.execute("SELECT watermark FROM watermarks WHERE subject_id = ? AND endpoint = ?",
+                                  (str(subject_id), endpoint)).fetchone()
+        return None if row is None else parse_isodatetime(row[0])
+
+    def set(self, subject_id, endpoint, watermark):
+        """Set the watermark of an endpoint for a subject"""
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO watermarks (subject_id, endpoint, watermark) VALUES (?, ?, ?)",
+                            (str(subject_id), endpoint, isodatetime(watermark)))
+            self.db.commit()
+
+    def close(self):
+        """Close the database"""
+        self.db.close()
+
+
+class SyncEngine(object):
+    """
+    Fetches only the data that is new since the last sync of each subject and endpoint
+
+    start is where subjects that have never been synced start from. Minutes and daily stats are synced for whole
+    days only, the current (partial) day is left for the next run. Bouts and bed times are fetched with start/stop
+    from the watermark so a period that spans a watermark may be delivered twice.
+
+    Watermarks move no further than immutable_after days before the time synced to, as the cache takes data to be
+    settled, so a day uploaded late is fetched again on later runs.
+    """
+    def __init__(self, client, store, start, max_workers=DEFAULT_MAX_WORKERS,
+                 immutable_after=DEFAULT_IMMUTABLE_AFTER):
+        self.client = client
+        self.store = store
+        self.start = start
+        self.max_workers = max_workers
+        self.immutable_after = immutable_after
+
+    def _watermark(self, subject_id, endpoint):
+        """Returns the watermark for a subject's endpoint, or the engine start if never synced"""
+        watermark = self.store.get(subject_id, endpoint)
+        return self.start if watermark is None else watermark
+
+    def _records(self, response):
+        """Returns the records of a response, raising for failures"""
+        response.raise_for_status()
+        return payload_records(response.json())
+
+    def _advance(self, subject_id, endpoint, watermark, mark, synced_to):
+        """Move a watermark on to mark, never back and no further than immutable_after days before synced_to"""
+        mark = min(mark, synced_to - datetime.timedelta(days=self.immutable_after))
+        if mark > watermark:
+            self.store.set(subject_id, endpoint, mark)
+
+    def _sync_daystats(self, subject_id, handler, until):
+        watermark = self._watermark(subject_id, DAYSTATS)
+        # Watermark is midnight of the first day not yet synced
+        last_day = datetime.datetime.combine(until.date(), datetime.time())
+        records = [record for record in self._records(self.client.get_subject_daily_stats(subject_id))
+                   if watermark <= datetime.datetime.strptime(record[DATE_KEY][:10], '%Y-%m-%d') < last_day]
+        if records:
+            handler(subject_id, DAYSTATS, records)
+        self._advance(subject_id, DAYSTATS, watermark, last_day, last_day)
+        return len(records)
+
+    def _sync_dayminutes(self, subject_id, handler, until):
+        watermark = self._watermark(subject_id, DAYMINUTES)
+        first_day = watermark.date()
+        last_day = until.date() - datetime.timedelta(days=1)
+        midnight = datetime.datetime.combine(until.date(), datetime.time())
+        count = 0
+        if first_day > last_day:
+            return count
+        for date, response in self.client.iter_subject_daily_minutes(subject_id, first_day, last_day,
+                                                                     max_workers=self.max_workers):
+            records = self._records(response)
+            handler(subject_id, DAYMINUTES, records)
+            count += len(records)
+            self._advance(subject_id, DAYMINUTES, watermark,
+                          datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time()), midnight)
+        return count
+
+    def _sync_periods(self, endpoint, method, subject_id, handler, until):
+        watermark = self._watermark(subject_id, endpoint)
+        if watermark >= until:
+            return 0
+        records = self._records(method(subject_id, start=watermark, stop=until))
+        if records:
+            handler(subject_id, endpoint, records)
+        self._advance(subject_id, endpoint, watermark, until, until)
+        return len(records)
+
+    def sync_subject(self, subject_id, handler, endpoints=ENDPOINTS, until=None):
+        """
+        Sync endpoints for one subject up to until (default now, UTC)
+
+        Returns a dict of the number of new records delivered to handler for each endpoint.
+        """
+        for endpoint in endpoints:
+            if endpoint not in ENDPOINTS:
+                raise ValueError("Cannot sync %r, choose from %s" % (endpoint, ENDPOINTS))
+
+        until = (until or datetime.datetime.utcnow()).replace(microsecond=0)
+        counts = {}
+        for endpoint in endpoints:
+            if endpoint == DAYSTATS:
+                counts[endpoint] = self._sync_daystats(subject_id, handler, until)
+            elif endpoint == DAYMINUTES:
+                counts[endpoint] = self._sync_dayminutes(subject_id, handler, until)
+            elif endpoint == BOUTS:
+                counts[endpoint] = self._sync_periods(BOUTS, self.client.get_subject_bout_periods,
+                                                      subject_id, handler, until)
+            else:
+                counts[endpoint] = self._sync_periods(BEDTIMES, self.client.get_subject_bed_times,
+                                                      subject_id, handler, until)
+        return counts
+
+    def sync_study(self, study_id, handler, endpoints=ENDPOINTS, until=None):
+        """
+        Sync endpoints for every subject of a study, subjects in parallel on the engine's worker pool
+
+        Yields (subject_id, counts) as each subject finishes, nothing is synced until the result is iterated. handler
+        is called from the worker threads.
+        """
+        until = until or datetime.datetime.utcnow()
+        response = self.client.get_all_subjects(study_id)
+        response.raise_for_status()
+        subject_ids = [subject['Id'] for subject in response.json()]
+        return imap_unordered(lambda subject_id: self.sync_subject(subject_id, handler, endpoints, until),
+                              subject_ids, self.max_workers)
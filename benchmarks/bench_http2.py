@@ -0,0 +1,80 @@
+# -*- coding: UTF-8 -*-
+"""
+Compare many concurrent requests over HTTP/1.1 and HTTP/2 against the local fake servers.
+
+Threads share one ActigraphClient, over HTTP/1.1 with its pooled HTTPAdapter and over HTTP/2 with HTTP2Adapter;
+tasks share one AsyncActigraphClient with and without http2. Reports requests/sec and the number of TCP connections
+the server accepted (sockets opened). Needs httpx and h2 (pip install actigraph[http2]).
+
+    $ python -m benchmarks.bench_http2 --calls 2000 --concurrency 50 --latency-ms 20
+"""
+from __future__ import print_function
+
+import argparse
+import asyncio
+import time
+
+from actigraph.aio import AsyncActigraphClient
+from actigraph.client import ActigraphClient
+from actigraph.fakeserver import FakeActigraphServer, FakeHTTP2Server
+from actigraph.http2 import HTTP2Adapter
+from actigraph.parallel import imap_unordered
+
+ACCESS_KEY = 'benchaccesskey'
+SECRET_KEY = 'benchsecretkey'
+
+
+def run_threads(client, calls, concurrency):
+    """Make calls from a pool of threads, returns elapsed seconds"""
+    start = time.time()
+    for _ in imap_unordered(lambda study_id: client.get_study(study_id).raise_for_status(), [1] * calls,
+                            concurrency):
+        pass
+    return time.time() - start
+
+
+def run_async(client, calls):
+    """Make calls as tasks, returns elapsed seconds"""
+    async def gather():
+        async with client:
+            responses = await asyncio.gather(*[client.get_study(1) for _ in range(calls)])
+            for response in responses:
+                response.raise_for_status()
+
+    start = time.time()
+    asyncio.run(gather())
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=20.0,
+                        help='server latency per request, the time concurrency hides')
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000.0
+
+    cases = [
+        ('threads HTTP/1.1', FakeActigraphServer, lambda url: run_threads(
+            ActigraphClient(url, ACCESS_KEY, SECRET_KEY, pool_maxsize=args.concurrency, coalesce=False),
+            args.calls, args.concurrency)),
+        ('threads HTTP/2', FakeHTTP2Server, lambda url: run_threads(
+            ActigraphClient(url, ACCESS_KEY, SECRET_KEY, coalesce=False, adapter=HTTP2Adapter(http1=False)),
+            args.calls, args.concurrency)),
+        ('async HTTP/1.1', FakeActigraphServer, lambda url: run_async(
+            AsyncActigraphClient(url, ACCESS_KEY, SECRET_KEY, max_concurrency=args.concurrency, coalesce=False),
+            args.calls)),
+        ('async HTTP/2', FakeHTTP2Server, lambda url: run_async(
+            AsyncActigraphClient(url, ACCESS_KEY, SECRET_KEY, max_concurrency=args.concurrency, coalesce=False,
+                                 http2=True, http1=False),
+            args.calls)),
+    ]
+    for name, server_class, run in cases:
+        with server_class(ACCESS_KEY, SECRET_KEY, latency=latency) as server:
+            elapsed = run(server.base_url)
+            print('%-18s %8.1f req/s %6d sockets' % (name, args.calls / elapsed, server.connections))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# -*- coding: UTF-8 -*-
+"""
+Compare request signing rates: keying an HMAC and formatting dates afresh for every request, as ActigraphAuth used to,
+against its prepared HMAC and per-second date strings, one request at a time and with sign_many.
+
+First checks that both give the documented example signature and the same headers for the same time.
+
+    $ python -m benchmarks.bench_signing --calls 100000
+"""
+from __future__ import print_function
+
+import argparse
+import base64
+import datetime
+import hashlib
+import hmac
+import time
+
+from actigraph.client import ActigraphAuth, isodatetime
+
+#https://github.com/actigraph/StudyAdminAPIDocumentation/blob/master/sections/authentication.md#example-1
+EXAMPLE_SIGNATURE_STRING = "GET\n\n\n2014-06-19T15:14:31Z\nhttps://studyadmin-api.actigraphcorp.com/v1/studies"
+EXAMPLE_SIGNATURE = b"J+9FTQTAkfGmUsaRmB/HBMJOXG+4Xqbo3drXBVQwZ4o="
+ACCESS_KEY = 'benchaccesskey'
+SECRET_KEY = 'testsecretkey'
+URL = 'https://studyadmin-api.actigraphcorp.com/v1/subjects/100001/dayminutes/2014-06-01'
+
+
+def reference_sign(secret_key, signature_string):
+    """Signing as it was, keying an HMAC for every signature"""
+    return base64.b64encode(hmac.new(secret_key.encode('utf-8'), signature_string.encode('utf-8'),
+                                     hashlib.sha256).digest())
+
+
+def reference_headers(access_key, secret_key, url, date_time):
+    """Headers as they were made, formatting the signature string and dates every time"""
+    vals = dict(body_md5='', verb='GET', url_path=url, date=isodatetime(date_time), content_type='')
+    signature_string = '{verb}\n{body_md5}\n{content_type}\n{date}Z\n{url_path}'.format(**vals)
+    return {
+        'Authorization': u"AGS {}:{}".format(access_key, reference_sign(secret_key, signature_string).decode('utf-8')),
+        'Date': date_time.strftime('%a, %d %b %Y %H:%M:%S +0000'),
+    }
+
+
+def check(auth):
+    """Raise unless the fast signing path gives exactly what the reference does"""
+    assert reference_sign(SECRET_KEY, EXAMPLE_SIGNATURE_STRING) == EXAMPLE_SIGNATURE
+    assert auth.sign(EXAMPLE_SIGNATURE_STRING) == EXAMPLE_SIGNATURE
+    date_time = datetime.datetime(2014, 6, 19, 15, 14, 31)
+    signature_string = auth.make_signature_string(URL, date_time)
+    headers = auth.make_authentication_headers(auth.sign(signature_string), date_time)
+    assert headers == reference_headers(ACCESS_KEY, SECRET_KEY, URL, date_time)
+
+
+def rate(sign, calls):
+    start = time.time()
+    sign(calls)
+    return calls / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=100000)
+    args = parser.parse_args()
+
+    auth = ActigraphAuth('https://studyadmin-api.actigraphcorp.com', ACCESS_KEY, SECRET_KEY)
+    check(auth)
+    print('identical to the reference signatures')
+
+    def reference(calls):
+        for _ in range(calls):
+            reference_headers(ACCESS_KEY, SECRET_KEY, URL, datetime.datetime.utcnow())
+
+    def fast(calls):
+        for _ in range(calls):
+            auth.make_headers(URL)
+
+    def batched(calls):
+        auth.sign_many([URL] * calls)
+
+    for name, sign in (('reference', reference), ('make_headers', fast), ('sign_many', batched)):
+        print('%-14s %10.0f signatures/s' % (name, rate(sign, args.calls)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: UTF-8 -*-
+"""
+Compare one-shot requests.get calls with the pooled ActigraphClient session against the local fake server.
+
+Reports requests/sec and the number of TCP connections the server accepted (each one a handshake). Every call gets the
+same URL, so the client is made without coalescing to send each one.
+
+    $ python -m benchmarks.bench_transport --calls 2000 --threads 8
+"""
+from __future__ import print_function
+
+import argparse
+import threading
+import time
+
+import requests
+
+from actigraph.client import ActigraphClient
+from actigraph.fakeserver import FakeActigraphServer
+
+ACCESS_KEY = 'benchaccesskey'
+SECRET_KEY = 'benchsecretkey'
+
+
+def run(get, calls, threads):
+    """Make calls spread over threads, returns elapsed seconds"""
+    per_thread = calls // threads
+
+    def work():
+        for _ in range(per_thread):
+            get('/v1/studies/1')
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.time() - start, per_thread * threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    with FakeActigraphServer(ACCESS_KEY, SECRET_KEY) as server:
+        client = ActigraphClient(server.base_url, ACCESS_KEY, SECRET_KEY, pool_maxsize=args.threads,
+                                 coalesce=False)
+
+        def one_shot(api_url):
+            url = client.auth.make_url(api_url)
+            return requests.get(url, auth=client.auth, verify=False)
+
+        for name, get in (('requests.get', one_shot), ('pooled session', client.get)):
+            server.reset_counters()
+            elapsed, made = run(get, args.calls, args.threads)
+            print('%-16s %8.1f req/s %8d handshakes' % (name, made / elapsed, server.connections))
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
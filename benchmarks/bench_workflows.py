@@ -0,0 +1,143 @@
+# -*- coding: UTF-8 -*-
+"""
+Throughput of the client's main workflows against the local fake Actigraph server.
+
+Reports for each workflow: requests/sec, p50/p99 request latency (to response headers), bytes received and peak RSS.
+Each workflow runs in its own process, with its own fake server, so that its peak RSS is its own rather than the
+highest of the workflows before it.
+
+    $ python -m benchmarks.bench_workflows --subjects 50 --days 14 --latency 0.005
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from actigraph.client import ActigraphClient
+from actigraph.fakeserver import FakeActigraphServer, SUBJECTS_PER_STUDY
+
+ACCESS_KEY = 'benchaccesskey'
+SECRET_KEY = 'benchsecretkey'
+START_DATE = datetime.date(2014, 6, 1)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0 if resource else float('nan')
+
+
+def workflows(ac, args):
+    """Returns (name, callable) for each workflow"""
+    subject_ids = [SUBJECTS_PER_STUDY + i for i in range(1, args.subjects + 1)]
+    end_date = START_DATE + datetime.timedelta(days=args.days - 1)
+    sleep_start = datetime.datetime.combine(START_DATE, datetime.time(22))
+
+    def get_study():
+        for _ in range(args.subjects):
+            ac.get_study(1)
+
+    def snapshot():
+        for _ in ac.get_study_snapshot(1, max_workers=args.workers):
+            pass
+
+    def daily_minutes():
+        for subject_id in subject_ids[:args.range_subjects]:
+            for _ in ac.iter_subject_daily_minutes(subject_id, START_DATE, end_date, max_workers=args.workers):
+                pass
+
+    def daily_minutes_stream():
+        for subject_id in subject_ids[:args.range_subjects]:
+            for _, records in ac.iter_subject_daily_minutes(subject_id, START_DATE, end_date,
+                                                            max_workers=args.workers, stream=True):
+                for _ in records:
+                    pass
+
+    def sleep_epochs():
+        for subject_id in subject_ids[:args.range_subjects]:
+            for _ in ac.iter_subject_sleep_epochs(subject_id, sleep_start,
+                                                  sleep_start + datetime.timedelta(days=args.days - 1),
+                                                  max_workers=args.workers):
+                pass
+
+    def bouts():
+        for subject_id in subject_ids:
+            ac.get_subject_bout_periods(subject_id).json()
+
+    def process(results):
+        # Stands in for CPU heavy work on a subject's data
+        deadline = time.time() + args.cpu_ms / 1000.0
+        while time.time() < deadline:
+            pass
+
+    def subjects_serial():
+        for subject_id in ac._study_subject_ids(1):
+            process([ac.get_subject_stats(subject_id), ac.get_subject_daily_stats(subject_id)])
+
+    def subjects_prefetch():
+        for snapshot in ac.iter_study_subject_data(1, fetch=['stats', 'daily_stats'], prefetch=args.workers):
+            process(snapshot.results)
+
+    return [('get_study', get_study), ('study_snapshot', snapshot), ('daily_minutes', daily_minutes),
+            ('daily_minutes_stream', daily_minutes_stream), ('sleep_epochs', sleep_epochs), ('bouts', bouts),
+            ('subjects_serial', subjects_serial), ('subjects_prefetch', subjects_prefetch)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subjects', type=int, default=50)
+    parser.add_argument('--range-subjects', type=int, default=3, help="Subjects to run the range workflows for")
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds the server adds to each request")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--cpu-ms', type=float, default=5.0, help="Milliseconds of work per subject in the subject "
+                                                                   "workflows")
+    parser.add_argument('--only', help="Run only this workflow")
+    parser.add_argument('--no-header', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if not args.no_header:
+        print('%-22s %10s %9s %9s %12s %10s' % ('workflow', 'req/s', 'p50 ms', 'p99 ms', 'bytes', 'peak MB'))
+        sys.stdout.flush()
+    if args.only is None:
+        # Run each workflow in a process of its own
+        for name, _ in workflows(None, args):
+            subprocess.check_call([sys.executable, '-m', 'benchmarks.bench_workflows'] + sys.argv[1:] +
+                                  ['--only', name, '--no-header'])
+        return
+
+    with FakeActigraphServer(ACCESS_KEY, SECRET_KEY, latency=args.latency, subjects=args.subjects,
+                             start_date=START_DATE, days=args.days) as server:
+        ac = ActigraphClient(server.base_url, ACCESS_KEY, SECRET_KEY, pool_maxsize=args.workers)
+        latencies = []
+        ac.session.hooks['response'].append(lambda r, *a, **k: latencies.append(r.elapsed.total_seconds()))
+
+        for name, workflow in workflows(ac, args):
+            if name != args.only:
+                continue
+            server.reset_counters()
+            del latencies[:]
+            start = time.time()
+            workflow()
+            elapsed = time.time() - start
+            print('%-22s %10.1f %9.2f %9.2f %12d %10.1f' % (name, server.requests / elapsed,
+                                                             percentile(latencies, 0.5) * 1000,
+                                                             percentile(latencies, 0.99) * 1000,
+                                                             server.bytes_sent, peak_rss_mb()))
+        ac.close()
+
+
+if __name__ == '__main__':
+    main()
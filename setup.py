@@ -16,7 +16,17 @@ setup(
     include_package_data=True,
     test_suite='tests',
     package_data = { '': ['README.md'] },
+    python_requires='>=3.8',
     install_requires=['requests', 'six'],
+    entry_points={
+        'console_scripts': ['actigraph-export = actigraph.export:main'],
+    },
+    extras_require={
+        'async': ['httpx'],
+        'http2': ['httpx[http2]'],
+        'numpy': ['numpy'],
+        'arrow': ['numpy', 'pyarrow'],
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Environment :: Web Environment',
@@ -24,8 +34,12 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2.7',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
         'Topic :: Internet :: WWW/HTTP',
         'Topic :: Software Development :: Libraries :: Python Modules',
     ]
@@ -1,12 +1,19 @@
 __author__ = 'isparks'
 
+import base64
+import hashlib
+import hmac
 import unittest
 import datetime
+import threading
+import time
+import json
 import requests
 import mock
 from six.moves.urllib.parse import urlparse, parse_qs
 
-from actigraph.client import ActigraphAuth, ActigraphClient, isodate, isodatetime
+from actigraph.client import ActigraphAuth, ActigraphClient, isodate, isodatetime, payload_records, \
+    twenty_four_hour_windows
 
 
 EXAMPLE_ACCESS_KEY = u'testaccesskey'
@@ -91,6 +98,34 @@ class TestAuthClient(unittest.TestCase):
         #Run it
         test_date()
 
+    def test_sign_matches_hmac(self):
+        """Signing with the prepared HMAC gives the same as keying one afresh, however often it is used"""
+        for url in ('https://studyadmin-api.actigraphcorp.com/v1/studies', u'http://example.com/v1/subjects/1'):
+            expected = base64.b64encode(hmac.new(EXAMPLE_SECRET_KEY.encode('utf-8'), url.encode('utf-8'),
+                                                 hashlib.sha256).digest())
+            self.assertEqual(expected, self.ac.sign(url))
+            self.assertEqual(expected, self.ac.sign(url))
+
+    def test_date_strings_follow_time(self):
+        """Date strings are reused within a second and made again for the next"""
+        dt = datetime.datetime(2014, 6, 19, 15, 14, 31)
+        self.assertEqual('2014-06-19T15:14:31Z', self.ac.make_signature_string('', dt).split('\n')[3])
+        self.assertEqual('2014-06-19T15:14:31Z',
+                         self.ac.make_signature_string('', dt.replace(microsecond=999)).split('\n')[3])
+        self.assertEqual('Thu, 19 Jun 2014 15:14:32 +0000',
+                         self.ac.make_authentication_headers(b'', dt.replace(second=32))['Date'])
+
+    def test_sign_many(self):
+        """Batch signing gives the headers make_headers would"""
+        fixed_time = datetime.datetime(2014, 1, 1, 15, 33)
+        urls = [self.ac.make_url("/v1/studies"), self.ac.make_url("/v1/subjects/1")]
+        with mock.patch('datetime.datetime') as mock_dt:
+            mock_dt.utcnow.return_value = fixed_time
+            self.assertEqual([self.ac.make_headers(url) for url in urls], self.ac.sign_many(urls))
+            self.assertEqual(u'AGS testaccesskey:HiPTGTljix5BP+cTLwCGLA23pYL2E1jFDLzrVjuxUJE=',
+                             self.ac.sign_many(urls)[0]['Authorization'])
+        self.assertEqual([], self.ac.sign_many([]))
+
 
 class ACMockTests(unittest.TestCase):
     """
@@ -268,14 +303,202 @@ class TestClientURLs(ACMockTests):
 
 
 class TestPatchRequests(ACMockTests):
-    """Gratuituous test patching requests.get to get to 100% coverage"""
+    """Gratuituous test patching the session get to get to 100% coverage"""
 
     def test_getAllStudies(self):
-        with mock.patch('actigraph.client.requests.get') as mocked:
+        with mock.patch.object(self.ac.session, 'get') as mocked:
             self.ac.get_all_studies()
             # Mocked call url we made is the first mocked call, second parameter, first element
             self.assertEqual('http://example.com/v1/studies',mocked.mock_calls[0][1][0])
 
 
+class TestClientSession(unittest.TestCase):
+    """Tests of the pooled session owned by the client"""
+
+    def test_pool_size(self):
+        ac = ActigraphClient('http://example.com', EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY,
+                             pool_connections=2, pool_maxsize=32)
+        for prefix in ('http://', 'https://'):
+            adapter = ac.session.get_adapter(prefix + 'example.com')
+            self.assertEqual(2, adapter._pool_connections)
+            self.assertEqual(32, adapter._pool_maxsize)
+
+    def test_session_reused(self):
+        ac = ActigraphClient('http://example.com', EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY)
+        with mock.patch.object(ac.session, 'get') as mocked:
+            ac.get_all_studies()
+            ac.get_study(1)
+            self.assertEqual(2, mocked.call_count)
+            self.assertTrue(mocked.call_args[1]['auth'] is ac.auth)
+
+    def test_context_manager_closes(self):
+        with ActigraphClient('http://example.com', EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY) as ac:
+            ac.session.close = mock.MagicMock('close')
+        ac.session.close.assert_called_once_with()
+
+
+class TestStudySnapshot(ACMockTests):
+    """Tests of the parallel study snapshot"""
+
+    def setUp(self):
+        super(TestStudySnapshot, self).setUp()
+        self.ac.get = mock.MagicMock('get', side_effect=self.fake_get)
+
+    def fake_get(self, url):
+        response = requests.Response()
+        response.status_code = 200
+        if url == '/v1/studies/9/subjects':
+            response._content = b'[{"Id": 1}, {"Id": 2}, {"Id": 3}]'
+        elif url == '/v1/subjects/2/stats':
+            response.status_code = 500
+        elif url == '/v1/subjects/3':
+            raise requests.ConnectionError('boom')
+        else:
+            response._content = b'{}'
+        return response
+
+    def test_snapshot(self):
+        snapshots = dict((s.subject_id, s) for s in self.ac.get_study_snapshot(9, max_workers=2))
+        self.assertEqual([1, 2, 3], sorted(snapshots))
+        self.assertTrue(snapshots[1].ok)
+        self.assertEqual(['daily_stats', 'stats', 'subject'], sorted(snapshots[1].results))
+        self.assertEqual(['stats'], list(snapshots[2].errors))
+        self.assertTrue(isinstance(snapshots[2].errors['stats'], requests.HTTPError))
+        self.assertTrue(isinstance(snapshots[3].errors['subject'], requests.ConnectionError))
+        self.assertEqual(['daily_stats', 'stats'], sorted(snapshots[3].results))
+
+    def test_snapshot_include(self):
+        snapshots = list(self.ac.get_study_snapshot(9, include=['stats']))
+        self.assertEqual(['stats'], list(snapshots[0].results) + list(snapshots[0].errors))
+        self.assertEqual(4, self.ac.get.call_count)
+
+    def test_snapshot_bad_include(self):
+        self.assertRaises(ValueError, self.ac.get_study_snapshot, 9, include=['bouts'])
+
+
+class TestStudySubjectData(ACMockTests):
+    """Tests of the prefetching iterator over a study's subjects"""
+
+    def setUp(self):
+        super(TestStudySubjectData, self).setUp()
+        self.lock = threading.Lock()
+        self.fetched = []
+        self.ac.get = mock.MagicMock('get', side_effect=self.fake_get)
+
+    def fake_get(self, url):
+        response = requests.Response()
+        response.status_code = 200
+        if url == '/v1/studies/9/subjects':
+            response._content = json.dumps([{'Id': i} for i in range(1, 21)]).encode('utf-8')
+        else:
+            # Later subjects answer sooner, they must still be yielded in order
+            subject_id = int(url.split('/')[3])
+            time.sleep(0.001 * (20 - subject_id))
+            with self.lock:
+                self.fetched.append(subject_id)
+            response._content = b'{}'
+        return response
+
+    def test_order(self):
+        snapshots = list(self.ac.iter_study_subject_data(9, fetch=['subject'], prefetch=4))
+        self.assertEqual(list(range(1, 21)), [snapshot.subject_id for snapshot in snapshots])
+        self.assertTrue(all(snapshot.ok for snapshot in snapshots))
+        self.assertEqual(['subject'], list(snapshots[0].results))
+
+    def test_prefetch_bounded(self):
+        snapshots = self.ac.iter_study_subject_data(9, fetch=['subject', 'stats'], prefetch=3)
+        first = next(snapshots)
+        self.assertEqual(1, first.subject_id)
+        time.sleep(0.1)
+        # The subject yielded and no more than the prefetch window after it have been fetched
+        with self.lock:
+            self.assertTrue(set(self.fetched) <= set(range(1, 5)))
+        snapshots.close()
+
+    def test_prefetch_overlaps(self):
+        snapshots = self.ac.iter_study_subject_data(9, fetch=['subject'], prefetch=1)
+        self.assertEqual(1, next(snapshots).subject_id)
+        time.sleep(0.1)
+        # The next subject is fetched while the caller has the first
+        with self.lock:
+            self.assertEqual([1, 2], sorted(self.fetched))
+        snapshots.close()
+
+    def test_bad_fetch(self):
+        self.assertRaises(ValueError, self.ac.iter_study_subject_data, 9, fetch=['bouts'])
+        self.assertEqual(0, self.ac.get.call_count)
+
+
+class TestDailyMinutesRange(ACMockTests):
+    """Tests of fetching daily minutes for a range of dates"""
+
+    def test_iter_daily_minutes(self):
+        self.ac.get = mock.MagicMock('get', side_effect=lambda url: mock.MagicMock(url=url))
+        start = datetime.date(2014, 6, 28)
+        days = list(self.ac.iter_subject_daily_minutes(123, start, datetime.date(2014, 7, 3), max_workers=4))
+        self.assertEqual([start + datetime.timedelta(days=i) for i in range(6)], [date for date, _ in days])
+        self.assertEqual(['/v1/subjects/123/dayminutes/%s' % isodate(date) for date, _ in days],
+                         [response.url for _, response in days])
+
+    def test_iter_daily_minutes_single_day(self):
+        self.ac.get = mock.MagicMock('get')
+        start = datetime.date(2014, 6, 28)
+        self.assertEqual(1, len(list(self.ac.iter_subject_daily_minutes(123, start, start))))
+
+    def test_iter_daily_minutes_start_after_end(self):
+        start = datetime.date(2014, 6, 28)
+        self.assertRaises(ValueError, self.ac.iter_subject_daily_minutes, 123, start,
+                          start - datetime.timedelta(days=1))
+
+
+class TestSleepRanges(ACMockTests):
+    """Tests of splitting sleep calls into 24 hour windows"""
+
+    def fake_epochs(self, subject_id, inbed, outbed):
+        # One epoch a minute, including both inbed and outbed
+        epochs = []
+        t = inbed
+        while t <= outbed:
+            epochs.append({'Timestamp': isodatetime(t), 'Sleep': 1})
+            t += datetime.timedelta(minutes=1)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({'SubjectId': subject_id, 'Epochs': list(reversed(epochs))}).encode('utf-8')
+        return response
+
+    def test_windows(self):
+        start = datetime.datetime(2014, 5, 29, 20, 0, 0)
+        windows = twenty_four_hour_windows(start, start + datetime.timedelta(hours=50))
+        self.assertEqual([(start, start + datetime.timedelta(hours=24)),
+                          (start + datetime.timedelta(hours=24), start + datetime.timedelta(hours=48)),
+                          (start + datetime.timedelta(hours=48), start + datetime.timedelta(hours=50))], windows)
+
+    def test_payload_records(self):
+        self.assertEqual([1], payload_records([1]))
+        self.assertEqual([1], payload_records({'SubjectId': 1, 'Epochs': [1]}))
+        self.assertRaises(ValueError, payload_records, {'SubjectId': 1})
+
+    def test_iter_sleep_epochs(self):
+        self.ac.get_subject_sleep_epochs = mock.MagicMock('get_subject_sleep_epochs', side_effect=self.fake_epochs)
+        start = datetime.datetime(2014, 5, 29, 20, 0, 0)
+        epochs = list(self.ac.iter_subject_sleep_epochs(999, start, start + datetime.timedelta(days=7), max_workers=3))
+        self.assertEqual(7, self.ac.get_subject_sleep_epochs.call_count)
+        self.assertEqual(7 * 24 * 60 + 1, len(epochs))
+        timestamps = [epoch['Timestamp'] for epoch in epochs]
+        self.assertEqual(sorted(set(timestamps)), timestamps)
+
+    def test_iter_sleep_epochs_start_after_end(self):
+        start = datetime.datetime(2014, 5, 29, 20, 0, 0)
+        self.assertRaises(ValueError, self.ac.iter_subject_sleep_epochs, 999, start, start)
+
+    def test_iter_sleep_score(self):
+        self.ac.get = mock.MagicMock('get', side_effect=lambda url: mock.MagicMock(url=url))
+        start = datetime.datetime(2014, 5, 29, 20, 0, 0)
+        scores = list(self.ac.iter_subject_sleep_score(999, start, start + datetime.timedelta(hours=30)))
+        self.assertEqual([start, start + datetime.timedelta(hours=24)], [inbed for inbed, _, _ in scores])
+        self.assertTrue(assert_urls_equal('/v1/subjects/999/sleepscore?inbed=2014-05-30T20:00:00&outbed=2014-05-31T02:00:00',
+                                          scores[1][2].url))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,155 @@
+__author__ = 'isparks'
+
+import asyncio
+import datetime
+import unittest
+
+try:
+    import httpx
+    from actigraph.aio import AsyncActigraphClient
+    from actigraph.scheduler import AIMDLimiter, RequestScheduler
+except ImportError:
+    httpx = None
+
+EXAMPLE_ACCESS_KEY = u'testaccesskey'
+EXAMPLE_SECRET_KEY = u'testsecretkey'
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@unittest.skipIf(httpx is None, "httpx not installed")
+class TestAsyncClient(unittest.TestCase):
+    """Tests of AsyncActigraphClient against an httpx mock transport"""
+
+    def setUp(self):
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def make_client(self, max_concurrency=20):
+        async def handler(request):
+            self.requests.append(request)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            return httpx.Response(200, json={'Path': request.url.path})
+
+        ac = AsyncActigraphClient('http://example.com', EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY,
+                                  max_concurrency=max_concurrency)
+        ac.session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return ac
+
+    def test_api_method_is_signed(self):
+        async def go():
+            async with self.make_client() as ac:
+                return await ac.get_study(123)
+
+        result = run(go())
+        self.assertEqual({'Path': '/v1/studies/123'}, result.json())
+        headers = self.requests[0].headers
+        self.assertTrue(headers['Authorization'].startswith('AGS testaccesskey:'))
+        self.assertTrue(headers['Date'].endswith('+0000'))
+
+    def test_validation_still_raises(self):
+        ac = self.make_client()
+        inbed = datetime.datetime(2014, 5, 29, 20, 0, 0)
+        self.assertRaises(ValueError, ac.get_subject_sleep_epochs, 999, inbed, inbed + datetime.timedelta(hours=25))
+
+    def test_gather_subjects_bounded(self):
+        # Made outside the loop, the semaphore must be made in the loop the requests contend in
+        ac = self.make_client(max_concurrency=3)
+        self.assertEqual(None, ac.semaphore)
+
+        async def go():
+            async with ac:
+                return [r async for r in ac.gather_subjects('get_subject_daily_stats', range(10))]
+
+        results = run(go())
+        self.assertEqual(list(range(10)), sorted(subject_id for subject_id, _ in results))
+        for subject_id, result in results:
+            self.assertEqual('/v1/subjects/%s/daystats' % subject_id, result.json()['Path'])
+        self.assertEqual(3, self.max_in_flight)
+
+    def test_retry_resigns(self):
+        statuses = [429, 503, 200]
+
+        def handler(request):
+            self.requests.append(request)
+            return httpx.Response(statuses.pop(0), headers={'Retry-After': '0'}, json=[])
+
+        async def go():
+            async with AsyncActigraphClient('http://example.com', EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY) as ac:
+                ac.session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+                return await ac.get_all_studies()
+
+        self.assertEqual(200, run(go()).status_code)
+        self.assertEqual(3, len(self.requests))
+        self.assertTrue(all('Authorization' in request.headers for request in self.requests))
+
+    def gather_with_limiter(self, limiter, subjects, max_concurrency=20):
+        ac = self.make_client(max_concurrency)
+        ac.scheduler = RequestScheduler(limiter=limiter)
+
+        async def go():
+            async with ac:
+                return await asyncio.gather(*[ac.get_subject(subject_id) for subject_id in range(subjects)])
+        return run(go())
+
+    def test_limiter_waited_for(self):
+        limiter = AIMDLimiter(initial=2, maximum=2)
+        results = self.gather_with_limiter(limiter, 8)
+        self.assertTrue(all(result.status_code == 200 for result in results))
+        self.assertEqual(2, self.max_in_flight)
+        self.assertEqual(0, limiter.in_flight)
+        self.assertEqual([], limiter.waiters)
+
+    def test_semaphore_queue_not_latency(self):
+        # Each request takes 10ms but queues behind the others for the one connection, which must not count as slow
+        limiter = AIMDLimiter(initial=8, maximum=8, latency_threshold=0.04)
+        self.gather_with_limiter(limiter, 8, max_concurrency=1)
+        self.assertEqual(1, self.max_in_flight)
+        self.assertEqual(None, limiter.last_decrease)
+        self.assertEqual(8, limiter.limit)
+
+    def test_duplicate_gets_coalesced(self):
+        async def go():
+            async with self.make_client() as ac:
+                return await asyncio.gather(*[ac.get_subject(1) for _ in range(5)] + [ac.get_subject(2)])
+
+        results = run(go())
+        self.assertEqual(2, len(self.requests))
+        self.assertTrue(all(result is results[0] for result in results[:5]))
+
+    def test_model(self):
+        async def go():
+            async with self.make_client() as ac:
+                return await ac.get_study(123, model=True)
+
+        # The mock transport echoes the path, not a study, so only the type can be checked
+        self.assertEqual('Study', type(run(go())).__name__)
+
+    def test_stream_refused(self):
+        ac = self.make_client()
+        self.assertRaises(TypeError, ac.get_subject_daily_minutes, 999, datetime.date(2014, 5, 29), stream=True)
+        self.assertRaises(TypeError, ac.get_subject_bout_periods, 999, stream=True)
+        self.assertEqual([], self.requests)
+
+    def test_thread_pool_methods_refused(self):
+        ac = self.make_client()
+        self.assertRaises(TypeError, ac.get_study_snapshot, 1)
+        self.assertRaises(TypeError, ac.iter_subject_daily_minutes, 999, datetime.date(2014, 5, 29),
+                          datetime.date(2014, 5, 30))
+        self.assertEqual([], self.requests)
+
+    def test_sync_context_manager_refused(self):
+        def do():
+            with self.make_client():
+                pass
+        self.assertRaises(TypeError, do)
+
+
+if __name__ == '__main__':
+    unittest.main()
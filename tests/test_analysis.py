@@ -0,0 +1,113 @@
+__author__ = 'isparks'
+
+import datetime
+import math
+import unittest
+
+try:
+    import numpy as np
+    from actigraph.analysis import cole_kripke, pad_nights, sadeh, score_nights, sleep_summary
+except ImportError:
+    np = None
+
+from actigraph.client import ActigraphClient
+from actigraph.fakeserver import FakeActigraphServer, SUBJECTS_PER_STUDY
+
+EXAMPLE_ACCESS_KEY = u'testaccesskey'
+EXAMPLE_SECRET_KEY = u'testsecretkey'
+
+
+def reference_cole_kripke(counts):
+    """Epoch by epoch Cole-Kripke as ActiLife describes it"""
+    scaled = [min(count / 100.0, 300.0) for count in counts]
+    at = lambda i: scaled[i] if 0 <= i < len(scaled) else 0.0
+    return [0.001 * (106 * at(i - 4) + 54 * at(i - 3) + 58 * at(i - 2) + 76 * at(i - 1) + 230 * at(i) +
+                     74 * at(i + 1) + 67 * at(i + 2)) < 1 for i in range(len(scaled))]
+
+
+def reference_sadeh(counts):
+    """Epoch by epoch Sadeh"""
+    capped = [min(count, 300.0) for count in counts]
+    sleep = []
+    for i, count in enumerate(capped):
+        window = capped[max(i - 5, 0):i + 6]
+        mean = sum(window) / len(window)
+        nat = len([c for c in window if 50 <= c < 100])
+        last = capped[max(i - 5, 0):i + 1]
+        last_mean = sum(last) / len(last)
+        sd = math.sqrt(sum((c - last_mean) ** 2 for c in last) / len(last))
+        sleep.append(7.601 - 0.065 * mean - 1.08 * nat - 0.056 * sd - 0.703 * math.log(count + 1) > -4)
+    return sleep
+
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestScoring(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(7)
+        # Quiet nights with bursts of movement, of different lengths
+        self.nights = [np.where(rng.uniform(size=n) < 0.2, rng.randint(0, 3000, n), rng.randint(0, 120, n))
+                       for n in (480, 300, 517)]
+
+    def test_cole_kripke_spike(self):
+        self.assertEqual([True, True, False, False, False, False, False, False, False],
+                         cole_kripke([0, 0, 0, 0, 10000, 0, 0, 0, 0]).tolist())
+
+    def test_cole_kripke_reference(self):
+        counts, lengths = pad_nights(self.nights)
+        scored = cole_kripke(counts)
+        for i, night in enumerate(self.nights):
+            self.assertEqual(reference_cole_kripke(night.tolist()), scored[i, :lengths[i]].tolist())
+            self.assertFalse(scored[i, lengths[i]:].any())
+
+    def test_sadeh_reference(self):
+        counts, lengths = pad_nights(self.nights)
+        scored = sadeh(counts)
+        for i, night in enumerate(self.nights):
+            self.assertEqual(reference_sadeh(night.tolist()), scored[i, :lengths[i]].tolist())
+            self.assertFalse(scored[i, lengths[i]:].any())
+
+    def test_summary(self):
+        summary = sleep_summary([[False, False, True, True, False, True, False, False],
+                                 [True, True, False, True, False, False, False, False]], lengths=[8, 4])
+        self.assertEqual([8, 4], summary['TotalMinutesInBed'].tolist())
+        self.assertEqual([3, 3], summary['TotalSleepTime'].tolist())
+        self.assertEqual([2, 0], summary['Latency'].tolist())
+        self.assertEqual([3, 1], summary['WakeAfterSleepOnset'].tolist())
+        self.assertEqual([37.5, 75.0], summary['Efficiency'].tolist())
+
+    def test_summary_no_sleep(self):
+        summary = sleep_summary([False, False], epoch_seconds=30)
+        self.assertEqual([1.0], summary['Latency'].tolist())
+        self.assertEqual([0.0], summary['WakeAfterSleepOnset'].tolist())
+
+    def test_unknown_algorithm(self):
+        self.assertRaises(ValueError, score_nights, self.nights, algorithm='oakley')
+
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestScoreFetchedNights(unittest.TestCase):
+    """Scoring epochs fetched from the fake server"""
+
+    def test_matches_sleep_score(self):
+        with FakeActigraphServer(EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY, subjects=2, days=3) as server:
+            with ActigraphClient(server.base_url, EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY) as ac:
+                windows = [(subject_id, datetime.datetime(2014, 6, day, 22, 30), datetime.datetime(2014, 6, day + 1, 6))
+                           for subject_id in (SUBJECTS_PER_STUDY + 1, SUBJECTS_PER_STUDY + 2) for day in (1, 2)]
+                nights = [ac.get_subject_sleep_epochs(*window) for window in windows]
+                scores = [ac.get_subject_sleep_score(*window).json() for window in windows]
+
+        # The fake server scores with the epochs' Sleep flags, summarising them gives its sleep scores
+        flags, lengths = pad_nights(nights, key='Sleep')
+        summary = sleep_summary(flags == 1, lengths)
+        for score, row in zip(scores, summary):
+            for key in ('TotalSleepTime', 'WakeAfterSleepOnset', 'Latency'):
+                self.assertEqual(score[key], row[key])
+            self.assertAlmostEqual(score['Efficiency'], row['Efficiency'], places=2)
+
+        self.assertEqual(4, len(score_nights(nights)))
+        self.assertEqual(4, len(score_nights(nights, algorithm='sadeh')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,290 @@
+__author__ = 'isparks'
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+import requests
+
+from actigraph.cache import CacheRule, FOREVER, RangeCache, ResponseCache
+from actigraph.client import ActigraphClient, isodate, isodatetime
+from actigraph.fakeserver import FakeActigraphServer, SUBJECTS_PER_STUDY
+
+EXAMPLE_ACCESS_KEY = u'testaccesskey'
+EXAMPLE_SECRET_KEY = u'testsecretkey'
+
+
+def make_response(body=b'{"Minutes": []}', status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers['Content-Type'] = 'application/json; charset=utf-8'
+    response._content = body
+    return response
+
+
+def days_ago(days):
+    return isodate(datetime.datetime.utcnow().date() - datetime.timedelta(days=days))
+
+
+class TestCacheRules(unittest.TestCase):
+    """Tests of which URLs are cached and for how long"""
+
+    def setUp(self):
+        self.cache = ResponseCache()
+
+    def test_old_day_minutes_never_expire(self):
+        self.assertEqual(FOREVER, self.cache.ttl('http://example.com/v1/subjects/1/dayminutes/%s' % days_ago(30)))
+
+    def test_recent_day_minutes_not_cached(self):
+        self.assertEqual(None, self.cache.ttl('http://example.com/v1/subjects/1/dayminutes/%s' % days_ago(0)))
+
+    def test_old_sleep_epochs_never_expire(self):
+        url = 'http://example.com/v1/subjects/1/sleepepochs?inbed=%sT20:00:00&outbed=%sT08:00:00' % (days_ago(10),
+                                                                                                   days_ago(9))
+        self.assertEqual(FOREVER, self.cache.ttl(url))
+
+    def test_unmatched_not_cached(self):
+        self.assertEqual(None, self.cache.ttl('http://example.com/v1/subjects/1'))
+
+    def test_ttl_rule(self):
+        cache = ResponseCache(rules=[CacheRule(r'/daystats$', ttl=60)])
+        self.assertEqual(60, cache.ttl('http://example.com/v1/subjects/1/daystats'))
+
+
+class TestResponseCache(unittest.TestCase):
+    """Tests of storing and evicting responses"""
+
+    def setUp(self):
+        self.url = 'http://example.com/v1/subjects/1/dayminutes/%s' % days_ago(30)
+
+    def test_hit_and_miss(self):
+        cache = ResponseCache()
+        self.assertEqual(None, cache.get(self.url))
+        cache.put(self.url, make_response())
+        cached = cache.get(self.url)
+        self.assertEqual(200, cached.status_code)
+        self.assertEqual({'Minutes': []}, cached.json())
+        self.assertEqual('application/json; charset=utf-8', cached.headers['content-type'])
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_failures_not_cached(self):
+        cache = ResponseCache()
+        cache.put(self.url, make_response(status_code=500))
+        self.assertEqual(None, cache.get(self.url))
+
+    def test_expiry(self):
+        cache = ResponseCache(rules=[CacheRule(r'/daystats$', ttl=60)])
+        url = 'http://example.com/v1/subjects/1/daystats'
+        with mock.patch('time.time', return_value=1000.0):
+            cache.put(url, make_response())
+        with mock.patch('time.time', return_value=1059.0):
+            self.assertNotEqual(None, cache.get(url))
+        with mock.patch('time.time', return_value=1061.0):
+            self.assertEqual(None, cache.get(url))
+        self.assertEqual(0, cache.size)
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_bytes=250)
+        urls = ['http://example.com/v1/subjects/%d/dayminutes/%s' % (i, days_ago(30)) for i in range(3)]
+        with mock.patch('time.time', return_value=1.0):
+            cache.put(urls[0], make_response(b'a' * 100))
+        with mock.patch('time.time', return_value=2.0):
+            cache.put(urls[1], make_response(b'b' * 100))
+        with mock.patch('time.time', return_value=3.0):
+            cache.get(urls[0])
+        with mock.patch('time.time', return_value=4.0):
+            cache.put(urls[2], make_response(b'c' * 100))
+        self.assertEqual(200, cache.size)
+        self.assertEqual(None, cache.get(urls[1]))
+        self.assertNotEqual(None, cache.get(urls[0]))
+        self.assertNotEqual(None, cache.get(urls[2]))
+
+    def test_persistent(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'cache.db')
+            cache = ResponseCache(path)
+            cache.put(self.url, make_response())
+            cache.close()
+            cache = ResponseCache(path)
+            self.assertEqual({'Minutes': []}, cache.get(self.url).json())
+            cache.close()
+        finally:
+            shutil.rmtree(tmp)
+
+
+class TestClientCache(unittest.TestCase):
+    """Tests of the client going through the cache"""
+
+    def test_warm_cache_skips_network(self):
+        ac = ActigraphClient('http://example.com', EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY, cache=ResponseCache())
+        date = datetime.datetime.utcnow() - datetime.timedelta(days=30)
+        with mock.patch.object(ac.session, 'get', return_value=make_response()) as mocked:
+            ac.get_subject_daily_minutes(1, date)
+            result = ac.get_subject_daily_minutes(1, date)
+            ac.get_subject(1)
+            ac.get_subject(1)
+        self.assertEqual(3, mocked.call_count)
+        self.assertEqual({'Minutes': []}, result.json())
+        self.assertEqual(1, ac.cache.hits)
+
+
+
+def day(day, hour=0):
+    return datetime.datetime(2014, 6, day, hour)
+
+
+class TestRangeCache(unittest.TestCase):
+    """Bout and bed time ranges answered from a RangeCache in front of the fake server"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeActigraphServer(EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY, subjects=2).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset_counters()
+        self.ac = ActigraphClient(self.server.base_url, EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY,
+                                  range_cache=RangeCache())
+        self.plain = ActigraphClient(self.server.base_url, EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY)
+
+    def tearDown(self):
+        self.ac.close()
+        self.plain.close()
+
+    def bouts(self, client, start, stop, subject_id=SUBJECTS_PER_STUDY + 1):
+        response = client.get_subject_bout_periods(subject_id, start=start, stop=stop)
+        self.assertEqual(200, response.status_code)
+        return response.json()
+
+    def test_overlapping_ranges(self):
+        ranges = [(day(5), day(10)), (day(8), day(15)), (day(6, 12), day(9, 6)), (day(1), day(20)),
+                  (day(2, 12), day(3))]
+        for start, stop in ranges:
+            self.assertEqual(self.bouts(self.plain, start, stop), self.bouts(self.ac, start, stop))
+        self.server.reset_counters()
+        for start, stop in ranges:
+            self.bouts(self.ac, start, stop)
+        self.assertEqual(0, self.server.requests)
+        # One request for the first range, the one gap of the second and the two of the fourth
+        self.assertEqual(4, self.ac.range_cache.requests)
+        self.assertEqual(2 + len(ranges), self.ac.range_cache.hits)
+        self.assertEqual(3, self.ac.range_cache.misses)
+
+    def test_bed_times(self):
+        bed_times = self.ac.get_subject_bed_times(SUBJECTS_PER_STUDY + 1, start=day(3), stop=day(6))
+        self.assertEqual(['2014-06-02T22:30:00', '2014-06-03T22:30:00', '2014-06-04T22:30:00',
+                          '2014-06-05T22:30:00'], [bed_time['InBed'] for bed_time in bed_times.json()])
+        models = self.ac.get_subject_bed_times(SUBJECTS_PER_STUDY + 1, start=day(4), stop=day(5), model=True)
+        self.assertEqual([day(3, 22), day(4, 22)], [model.inbed.replace(minute=0) for model in models])
+        self.assertEqual(1, self.ac.range_cache.requests)
+
+    def test_subjects_and_endpoints_apart(self):
+        self.bouts(self.ac, day(1), day(5))
+        self.bouts(self.ac, day(1), day(5), subject_id=SUBJECTS_PER_STUDY + 2)
+        self.ac.get_subject_bed_times(SUBJECTS_PER_STUDY + 1, start=day(1), stop=day(5))
+        self.assertEqual(3, self.ac.range_cache.requests)
+
+    def test_open_ranges_not_cached(self):
+        self.ac.get_subject_bout_periods(SUBJECTS_PER_STUDY + 1)
+        self.ac.get_subject_bout_periods(SUBJECTS_PER_STUDY + 1, start=day(1))
+        self.assertEqual(2, self.server.requests)
+        self.assertEqual(0, self.ac.range_cache.requests)
+
+    def test_failure_not_cached(self):
+        response = self.ac.get_subject_bout_periods(99, start=day(1), stop=day(5))
+        self.assertEqual(404, response.status_code)
+        self.ac.get_subject_bout_periods(99, start=day(1), stop=day(5))
+        self.assertEqual(2, self.server.requests)
+
+
+class TestRangeCacheExpiry(unittest.TestCase):
+    """RangeCache against a fetch function serving a period each morning and one still open"""
+
+    def setUp(self):
+        self.now = datetime.datetime.utcnow().replace(microsecond=0)
+        # A bout started two hours ago is still open, ending now
+        self.open_start = self.now - datetime.timedelta(hours=2)
+        self.calls = []
+        self.lock = threading.Lock()
+        self.cache = RangeCache()
+
+    def fetch(self, start, stop):
+        with self.lock:
+            self.calls.append((start, stop))
+        time.sleep(0.01)
+        periods = []
+        day = datetime.datetime.combine(start.date(), datetime.time())
+        while day < stop:
+            if day + datetime.timedelta(hours=12) <= self.open_start and day + datetime.timedelta(hours=12) > start:
+                periods.append({'StartDateTime': isodatetime(day),
+                                'EndDateTime': isodatetime(day + datetime.timedelta(hours=12))})
+            day += datetime.timedelta(days=1)
+        if self.open_start < stop:
+            periods.append({'StartDateTime': isodatetime(self.open_start), 'EndDateTime': isodatetime(self.now)})
+        return make_response(json.dumps(periods).encode('utf-8'))
+
+    def get(self, start, stop, url='/v1/subjects/1/bouts'):
+        response = self.cache.get(url, start, stop, ('StartDateTime', 'EndDateTime'), self.fetch)
+        return response.json()
+
+    def test_recent_ranges_fetched_again(self):
+        start = self.now - datetime.timedelta(days=10)
+        first = self.get(start, self.now)
+        self.assertEqual(first, self.get(start, self.now))
+        self.assertEqual(2, len(self.calls))
+        # The second call only fetched what is too recent to be final
+        self.assertTrue(self.calls[1][0] > self.now - datetime.timedelta(days=3))
+        self.assertEqual(self.now, self.calls[1][1])
+
+    def test_open_period_not_held(self):
+        start = self.now - datetime.timedelta(days=1)
+        stop = self.now + datetime.timedelta(hours=1)
+        self.assertEqual(isodatetime(self.now), self.get(start, stop)[-1]['EndDateTime'])
+        self.now += datetime.timedelta(minutes=30)
+        periods = self.get(start, stop)
+        starts = [period['StartDateTime'] for period in periods]
+        self.assertEqual(1, starts.count(isodatetime(self.open_start)))
+        self.assertEqual(isodatetime(self.now), periods[-1]['EndDateTime'])
+
+    def test_old_ranges_held(self):
+        start = datetime.datetime(2014, 6, 1)
+        self.get(start, start + datetime.timedelta(days=5))
+        self.get(start + datetime.timedelta(days=1), start + datetime.timedelta(days=3))
+        self.assertEqual(1, len(self.calls))
+
+    def test_max_resources(self):
+        self.cache = RangeCache(max_resources=2)
+        start = datetime.datetime(2014, 6, 1)
+        stop = start + datetime.timedelta(days=1)
+        for subject_id in (1, 2, 1, 3, 1, 2):
+            self.get(start, stop, url='/v1/subjects/%d/bouts' % subject_id)
+        self.assertEqual(2, len(self.cache.resources))
+        # 2 was dropped for 3 as 1 was used more recently
+        self.assertEqual(4, len(self.calls))
+
+    def test_concurrent_gap_fetched_once(self):
+        start = datetime.datetime(2014, 6, 1)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.get(start, start + datetime.timedelta(days=5))))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, len(self.calls))
+        self.assertEqual(4, len(results))
+        self.assertTrue(all(result == results[0] for result in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+__author__ = 'isparks'
+
+import json
+import unittest
+
+import requests
+
+try:
+    import numpy as np
+    from actigraph.decode import DAY_MINUTES, decode_day_minutes, decode_day_stats, decode_many, \
+        decode_sleep_epochs
+except ImportError:
+    np = None
+
+
+def make_response(payload):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps(payload).encode('utf-8')
+    return response
+
+
+def minutes(date, count):
+    return {'SubjectId': 1, 'Date': date,
+            'Minutes': [{'Timestamp': '%sT00:%02d:00Z' % (date, i), 'AxisYCounts': i * 10, 'Steps': i,
+                         'Calories': 0.5 * i} for i in range(count)]}
+
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestDecode(unittest.TestCase):
+    """Tests of decoding payloads to structured arrays"""
+
+    def test_decode_day_minutes(self):
+        decoded = decode_day_minutes(make_response(minutes('2014-06-11', 3)))
+        self.assertEqual(3, len(decoded))
+        self.assertEqual(np.datetime64('2014-06-11T00:02:00'), decoded['Timestamp'][2])
+        self.assertEqual([0, 10, 20], decoded['AxisYCounts'].tolist())
+        self.assertEqual([0.0, 0.5, 1.0], decoded['Calories'].tolist())
+        # Missing keys are filled
+        self.assertEqual([0, 0, 0], decoded['AxisXCounts'].tolist())
+        self.assertTrue(np.isnan(decoded['HeartRate']).all())
+
+    def test_missing_mask(self):
+        decoded, missing = decode_sleep_epochs([{'Timestamp': '2014-06-11T22:00:00', 'AxisYCounts': 0},
+                                                {'Timestamp': '2014-06-11T22:01:00', 'AxisYCounts': None}],
+                                               mask=True)
+        self.assertEqual([0, 0], decoded['AxisYCounts'].tolist())
+        self.assertEqual([False, True], missing['AxisYCounts'].tolist())
+        self.assertEqual([True, True], missing['Sleep'].tolist())
+        self.assertEqual([False, False], missing['Timestamp'].tolist())
+
+    def test_decode_many_mask(self):
+        decoded, missing = decode_many([minutes('2014-06-11', 3), minutes('2014-06-12', 2)], DAY_MINUTES, mask=True)
+        self.assertEqual(5, len(decoded))
+        self.assertEqual(5, len(missing))
+        self.assertTrue(missing['HeartRate'].all())
+        self.assertFalse(missing['Steps'].any())
+        decoded, missing = decode_many([], DAY_MINUTES, mask=True)
+        self.assertEqual((0, 0), (len(decoded), len(missing)))
+
+    def test_decode_sleep_epochs(self):
+        decoded = decode_sleep_epochs([{'Timestamp': '2014-06-11T22:00:00', 'AxisYCounts': 5, 'Sleep': True},
+                                       {'Timestamp': '2014-06-11T22:01:00', 'AxisYCounts': 0}])
+        self.assertEqual([True, False], decoded['Sleep'].tolist())
+
+    def test_decode_day_stats(self):
+        decoded = decode_day_stats([{'Date': '2014-06-11T00:00:00', 'Steps': 1000, 'Calories': 20.5}])
+        self.assertEqual(np.datetime64('2014-06-11'), decoded['Date'][0])
+        self.assertEqual(1000, decoded['Steps'][0])
+
+    def test_decode_many(self):
+        decoded = decode_many([minutes('2014-06-11', 3), make_response(minutes('2014-06-12', 2))], DAY_MINUTES)
+        self.assertEqual(5, len(decoded))
+        self.assertEqual(np.datetime64('2014-06-12T00:01:00'), decoded['Timestamp'][-1])
+
+    def test_decode_many_empty(self):
+        self.assertEqual(0, len(decode_many([], DAY_MINUTES)))
+
+
+if __name__ == '__main__':
+    unittest.main()
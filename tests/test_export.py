@@ -0,0 +1,224 @@
+__author__ = 'isparks'
+
+import csv
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+import mock
+import requests
+
+from actigraph.client import ActigraphClient
+from actigraph.export import StudyExporter, main
+from actigraph.fakeserver import FakeActigraphServer, SUBJECTS_PER_STUDY
+
+EXAMPLE_ACCESS_KEY = u'testaccesskey'
+EXAMPLE_SECRET_KEY = u'testsecretkey'
+
+START = datetime.date(2014, 6, 1)
+END = datetime.date(2014, 6, 3)
+
+
+def read_ndjson(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+class TestStudyExporter(unittest.TestCase):
+    """Exports of a study from the fake server"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeActigraphServer(EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY, subjects=2, days=5).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.ac = ActigraphClient(self.server.base_url, EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY)
+
+    def tearDown(self):
+        self.ac.close()
+        shutil.rmtree(self.output_dir)
+
+    def path(self, name):
+        return os.path.join(self.output_dir, name)
+
+    def test_ndjson(self):
+        counts = StudyExporter(self.ac, self.output_dir, max_workers=4).run(1, START, END)
+        self.assertEqual({'subjects': 2, 'daystats': 10, 'dayminutes': 2 * 3 * 1440, 'sleepepochs': 2 * 3 * 1440,
+                          'bouts': 2 * 3, 'bedtimes': 2 * 3}, counts)
+        minutes = read_ndjson(self.path('dayminutes.ndjson'))
+        self.assertEqual(counts['dayminutes'], len(minutes))
+        self.assertEqual(set([SUBJECTS_PER_STUDY + 1, SUBJECTS_PER_STUDY + 2]),
+                         set(minute['SubjectId'] for minute in minutes))
+        epochs = read_ndjson(self.path('sleepepochs.ndjson'))
+        self.assertEqual(len(epochs), len(set((epoch['SubjectId'], epoch['Timestamp']) for epoch in epochs)))
+
+    def test_csv(self):
+        StudyExporter(self.ac, self.output_dir, format='csv', endpoints=['subjects', 'daystats']).run(1)
+        with open(self.path('daystats.csv')) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(10, len(rows))
+        self.assertEqual(['Calories', 'Date', 'Steps', 'SubjectId', 'WearMinutes'], sorted(rows[0]))
+
+    def test_resume(self):
+        get_minutes = self.ac.get_subject_daily_minutes
+        calls = []
+
+        def failing(subject_id, date, stream=False):
+            calls.append(date)
+            if len(calls) == 4:
+                raise KeyboardInterrupt()
+            return get_minutes(subject_id, date, stream=stream)
+
+        exporter = StudyExporter(self.ac, self.output_dir, endpoints=['dayminutes'], max_workers=1,
+                                 checkpoint_every=2)
+        with mock.patch.object(self.ac, 'get_subject_daily_minutes', side_effect=failing):
+            self.assertRaises(KeyboardInterrupt, exporter.run, 1, START, END)
+        self.assertEqual(3 * 1440, len(read_ndjson(self.path('dayminutes.ndjson'))))
+
+        self.server.reset_counters()
+        counts = exporter.run(1, START, END)
+        self.assertEqual(3 * 1440, counts['dayminutes'])
+        # One request for the subjects and one for each of the three days left
+        self.assertEqual(4, self.server.requests)
+        minutes = read_ndjson(self.path('dayminutes.ndjson'))
+        self.assertEqual(6 * 1440, len(set((minute['SubjectId'], minute['Timestamp']) for minute in minutes)))
+        self.assertEqual(6 * 1440, len(minutes))
+
+        self.server.reset_counters()
+        self.assertEqual({'dayminutes': 0}, exporter.run(1, START, END))
+        self.assertEqual(1, self.server.requests)
+
+    def test_failed_unit_skipped(self):
+        get_minutes = self.ac.get_subject_daily_minutes
+
+        def failing(subject_id, date, stream=False):
+            if subject_id == SUBJECTS_PER_STUDY + 2 and date == START:
+                raise requests.HTTPError("404 Client Error: Not Found")
+            return get_minutes(subject_id, date, stream=stream)
+
+        exporter = StudyExporter(self.ac, self.output_dir, endpoints=['dayminutes'], max_workers=2)
+        with mock.patch.object(self.ac, 'get_subject_daily_minutes', side_effect=failing):
+            counts = exporter.run(1, START, END)
+        self.assertEqual(5 * 1440, counts['dayminutes'])
+        key = 'dayminutes/%s/2014-06-01' % (SUBJECTS_PER_STUDY + 2)
+        self.assertEqual([key], list(exporter.failed))
+        with open(self.path('checkpoint.json')) as f:
+            self.assertEqual([key], list(json.load(f)['failed']))
+
+        # Running again retries only the failed unit
+        self.server.reset_counters()
+        self.assertEqual({'dayminutes': 1440}, exporter.run(1, START, END))
+        self.assertEqual(2, self.server.requests)
+        self.assertEqual({}, exporter.failed)
+        self.assertEqual(6 * 1440, len(read_ndjson(self.path('dayminutes.ndjson'))))
+
+    def test_main_reports_failures(self):
+        with mock.patch('sys.stdout'), mock.patch('sys.stderr') as stderr, \
+                mock.patch.object(ActigraphClient, 'get_subject_daily_minutes', side_effect=requests.HTTPError('404')):
+            status = main(['1', self.output_dir, '--url', self.server.base_url, '--access-key', EXAMPLE_ACCESS_KEY,
+                           '--secret-key', EXAMPLE_SECRET_KEY, '--endpoints', 'dayminutes',
+                           '--start', '2014-06-01', '--end', '2014-06-02'])
+        self.assertEqual(1, status)
+        self.assertEqual('4 units failed, run again to retry them\n', stderr.write.call_args_list[-1][0][0])
+
+    def test_csv_fixed_columns(self):
+        StudyExporter(self.ac, self.output_dir, format='csv', endpoints=['bouts']).run(1, START, END)
+        with open(self.path('bouts.csv')) as f:
+            self.assertEqual('SubjectId,StartDateTime,EndDateTime,Type\n', f.readline())
+
+    def extra_field(self):
+        """Patch daily stats to answer with a key not in the exported fields"""
+        get_stats = self.ac.get_subject_daily_stats
+
+        def extra(subject_id):
+            response = get_stats(subject_id)
+            response._content = json.dumps([dict(day, Extra=1) for day in response.json()]).encode('utf-8')
+            return response
+        return mock.patch.object(self.ac, 'get_subject_daily_stats', side_effect=extra)
+
+    def test_unknown_field_dropped(self):
+        exporter = StudyExporter(self.ac, self.output_dir, format='csv', endpoints=['daystats'])
+        with self.extra_field(), warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            counts = exporter.run(1)
+        self.assertEqual({'daystats': 10}, counts)
+        self.assertEqual({}, exporter.failed)
+        self.assertEqual({'daystats': ['Extra']}, exporter.dropped)
+        # Warned once, not for every record
+        self.assertEqual(1, len(caught))
+        with open(self.path('daystats.csv')) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(10, len(rows))
+        self.assertFalse('Extra' in rows[0])
+
+    def test_unknown_field_ndjson(self):
+        exporter = StudyExporter(self.ac, self.output_dir, endpoints=['daystats'])
+        with self.extra_field():
+            exporter.run(1)
+        self.assertEqual({}, exporter.dropped)
+        with open(self.path('daystats.ndjson')) as f:
+            self.assertTrue(all(json.loads(line)['Extra'] == 1 for line in f))
+
+    def test_resume_truncates(self):
+        exporter = StudyExporter(self.ac, self.output_dir, endpoints=['daystats'])
+        exporter.run(1)
+        with open(self.path('daystats.ndjson'), 'a') as f:
+            f.write('{"partial": ')
+        exporter.run(1)
+        self.assertEqual(10, len(read_ndjson(self.path('daystats.ndjson'))))
+
+    def test_different_export(self):
+        StudyExporter(self.ac, self.output_dir, endpoints=['daystats']).run(1)
+        self.assertRaises(ValueError, StudyExporter(self.ac, self.output_dir, endpoints=['bouts']).run, 1, START, END)
+
+    def test_validation(self):
+        self.assertRaises(ValueError, StudyExporter, self.ac, self.output_dir, format='xml')
+        self.assertRaises(ValueError, StudyExporter, self.ac, self.output_dir, endpoints=['stats'])
+        self.assertRaises(ValueError, StudyExporter(self.ac, self.output_dir).run, 1)
+
+    def test_parquet(self):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise unittest.SkipTest("pyarrow not installed")
+        StudyExporter(self.ac, self.output_dir, format='parquet', endpoints=['daystats'], checkpoint_every=1).run(1)
+        table = pyarrow.parquet.read_table(self.path('daystats.parquet'))
+        self.assertEqual(10, table.num_rows)
+
+    def test_parquet_parts_share_schema(self):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise unittest.SkipTest("pyarrow not installed")
+        # HeartRate is null in every minute, a part at a time
+        StudyExporter(self.ac, self.output_dir, format='parquet', endpoints=['dayminutes'], checkpoint_every=1).run(
+            1, START, END)
+        table = pyarrow.parquet.read_table(self.path('dayminutes.parquet'))
+        self.assertEqual(6 * 1440, table.num_rows)
+        self.assertEqual(pyarrow.float64(), table.schema.field('HeartRate').type)
+
+    def test_main(self):
+        with mock.patch('sys.stdout'):
+            status = main(['1', self.output_dir, '--url', self.server.base_url, '--access-key', EXAMPLE_ACCESS_KEY,
+                           '--secret-key', EXAMPLE_SECRET_KEY, '--endpoints', 'subjects,bouts',
+                           '--start', '2014-06-01', '--end', '2014-06-02'])
+        self.assertEqual(0, status)
+        self.assertEqual(2, len(read_ndjson(self.path('subjects.ndjson'))))
+        self.assertEqual(4, len(read_ndjson(self.path('bouts.ndjson'))))
+
+    def test_main_needs_dates(self):
+        with mock.patch('sys.stderr'):
+            self.assertRaises(SystemExit, main, ['1', self.output_dir, '--access-key', 'a', '--secret-key', 's'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+__author__ = 'isparks'
+
+import datetime
+import unittest
+
+from actigraph.client import ActigraphClient
+from actigraph.fakeserver import FakeActigraphServer, SUBJECTS_PER_STUDY
+
+EXAMPLE_ACCESS_KEY = u'testaccesskey'
+EXAMPLE_SECRET_KEY = u'testsecretkey'
+
+SUBJECT_ID = SUBJECTS_PER_STUDY + 1
+
+
+class TestFakeServer(unittest.TestCase):
+    """End to end tests of the client against the fake server"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeActigraphServer(EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY, subjects=3, days=10).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset_counters()
+        self.ac = ActigraphClient(self.server.base_url, EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY)
+
+    def tearDown(self):
+        self.ac.close()
+
+    def test_signature_accepted(self):
+        result = self.ac.get_all_studies()
+        self.assertEqual(200, result.status_code)
+        self.assertEqual(1, result.json()[0]['Id'])
+
+    def test_bad_signature_rejected(self):
+        with ActigraphClient(self.server.base_url, EXAMPLE_ACCESS_KEY, u'wrongsecret') as ac:
+            self.assertEqual(401, ac.get_study(1).status_code)
+        self.assertEqual(1, self.server.rejected)
+
+    def test_not_found(self):
+        self.assertEqual(404, self.ac.get_subject(99).status_code)
+
+    def test_keep_alive(self):
+        for _ in range(5):
+            self.ac.get_subject(SUBJECT_ID)
+        self.assertEqual(5, self.server.requests)
+        self.assertEqual(1, self.server.connections)
+
+    def test_snapshot(self):
+        snapshots = list(self.ac.get_study_snapshot(1, max_workers=3))
+        self.assertEqual(3, len(snapshots))
+        self.assertTrue(all(snapshot.ok for snapshot in snapshots))
+        self.assertEqual(10, len(snapshots[0].results['daily_stats'].json()))
+
+    def test_day_minutes(self):
+        days = list(self.ac.iter_subject_daily_minutes(SUBJECT_ID, datetime.date(2014, 6, 1),
+                                                       datetime.date(2014, 6, 3)))
+        self.assertEqual(3, len(days))
+        self.assertEqual(24 * 60, len(days[0][1].json()['Minutes']))
+
+    def test_sleep_epochs_with_params(self):
+        inbed = datetime.datetime(2014, 6, 1, 22, 30)
+        epochs = list(self.ac.iter_subject_sleep_epochs(SUBJECT_ID, inbed, inbed + datetime.timedelta(days=2)))
+        self.assertEqual(2 * 24 * 60 + 1, len(epochs))
+
+    def test_bouts_with_params(self):
+        bouts = self.ac.get_subject_bout_periods(SUBJECT_ID, start=datetime.datetime(2014, 6, 2, 12),
+                                                 stop=datetime.datetime(2014, 6, 4, 12)).json()
+        self.assertEqual(['2014-06-02T00:00:00', '2014-06-03T00:00:00', '2014-06-04T00:00:00'],
+                         [bout['StartDateTime'] for bout in bouts])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+__author__ = 'isparks'
+
+import asyncio
+import datetime
+import unittest
+
+import mock
+import requests
+
+from actigraph.client import ActigraphClient
+from actigraph.fakeserver import SUBJECTS_PER_STUDY
+from actigraph.scheduler import RequestScheduler, RetryPolicy
+
+try:
+    import h2
+    import httpx
+    from actigraph.aio import AsyncActigraphClient
+    from actigraph.fakeserver import FakeHTTP2Server
+    from actigraph.http2 import HTTP2Adapter, HTTP2Body
+except ImportError:
+    h2 = None
+
+EXAMPLE_ACCESS_KEY = u'testaccesskey'
+EXAMPLE_SECRET_KEY = u'testsecretkey'
+
+SUBJECT_ID = SUBJECTS_PER_STUDY + 1
+
+
+@unittest.skipIf(h2 is None, "httpx or h2 not installed")
+class TestHTTP2(unittest.TestCase):
+    """End to end tests of the HTTP/2 transport against the fake HTTP/2 server"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeHTTP2Server(EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY, subjects=3, days=10,
+                                     latency=0.01).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset_counters()
+        self.ac = ActigraphClient(self.server.base_url, EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY,
+                                  adapter=HTTP2Adapter(http1=False))
+
+    def tearDown(self):
+        self.ac.close()
+
+    def test_signature_accepted(self):
+        result = self.ac.get_all_studies()
+        self.assertEqual(200, result.status_code)
+        self.assertEqual(1, result.json()[0]['Id'])
+        self.assertEqual('application/json; charset=utf-8', result.headers['content-type'])
+
+    def test_bad_signature_rejected(self):
+        with ActigraphClient(self.server.base_url, EXAMPLE_ACCESS_KEY, u'wrongsecret',
+                             adapter=HTTP2Adapter(http1=False)) as ac:
+            self.assertEqual(401, ac.get_study(1).status_code)
+        self.assertEqual(1, self.server.rejected)
+
+    def test_stream(self):
+        minutes = list(self.ac.get_subject_daily_minutes(SUBJECT_ID, datetime.date(2014, 6, 1), stream=True))
+        self.assertEqual(24 * 60, len(minutes))
+
+    def test_multiplexed(self):
+        days = list(self.ac.iter_subject_daily_minutes(SUBJECT_ID, datetime.date(2014, 6, 1),
+                                                       datetime.date(2014, 6, 10), max_workers=10))
+        self.assertEqual(10, len(days))
+        self.assertTrue(all(response.ok for _, response in days))
+        self.assertEqual(10, self.server.requests)
+        self.assertEqual(1, self.server.connections)
+
+    def test_async(self):
+        async def gather():
+            async with AsyncActigraphClient(self.server.base_url, EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY,
+                                            http2=True, http1=False, coalesce=False) as ac:
+                responses = await asyncio.gather(*[ac.get_subject(SUBJECT_ID) for _ in range(10)])
+                return [response.http_version for response in responses]
+
+        self.assertEqual(['HTTP/2'] * 10, asyncio.run(gather()))
+        self.assertEqual(1, self.server.connections)
+
+
+@unittest.skipIf(h2 is None, "httpx or h2 not installed")
+class TestHTTP2Adapter(unittest.TestCase):
+    """Settings the adapter is given by requests"""
+
+    def test_proxy_honoured(self):
+        with FakeHTTP2Server(EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY) as server:
+            ac = ActigraphClient(server.base_url, EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY,
+                                 adapter=HTTP2Adapter(http1=False),
+                                 scheduler=RequestScheduler(retry=RetryPolicy(max_retries=0)))
+            # Nothing listens on the proxy port, so the request fails rather than going straight to the server
+            ac.session.proxies = {'http': 'http://127.0.0.1:9'}
+            self.assertRaises(requests.ConnectionError, ac.get_all_studies)
+            self.assertEqual(0, server.requests)
+            ac.close()
+
+    def test_cert_passed(self):
+        adapter = HTTP2Adapter()
+        request = requests.Request('GET', 'https://example.com/v1/studies').prepare()
+        with mock.patch('actigraph.http2.ssl_context') as ssl_context, mock.patch('httpx.Client') as client:
+            client.return_value.send.side_effect = httpx.ConnectError('refused')
+            self.assertRaises(requests.ConnectionError, adapter.send, request, verify=False,
+                              cert=['client.pem', 'client.key'])
+        ssl_context.assert_called_once_with(False, ('client.pem', 'client.key'))
+        self.assertEqual(ssl_context.return_value, client.call_args[1]['verify'])
+
+    def test_body_read(self):
+        response = mock.Mock()
+        response.iter_bytes.return_value = iter([b'abc', b'defg', b'h'])
+        body = HTTP2Body(response)
+        self.assertEqual(b'ab', body.read(2))
+        self.assertEqual(b'cdef', body.read(4))
+        self.assertEqual(b'gh', body.read())
+        self.assertEqual(b'', body.read(10))
+
+
+if __name__ == '__main__':
+    unittest.main()
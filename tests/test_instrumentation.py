@@ -0,0 +1,114 @@
+__author__ = 'isparks'
+
+import socket
+import unittest
+
+import requests
+
+from actigraph.client import ActigraphClient
+from actigraph.fakeserver import FakeActigraphServer, SUBJECTS_PER_STUDY
+from actigraph.instrumentation import Histogram, Instrumentation, MetricsAggregator, RequestEvent, \
+    StatsdExporter, endpoint_template
+
+EXAMPLE_ACCESS_KEY = u'testaccesskey'
+EXAMPLE_SECRET_KEY = u'testsecretkey'
+
+
+class TestEndpointTemplate(unittest.TestCase):
+
+    def test_templates(self):
+        self.assertEqual('/v1/studies', endpoint_template('http://example.com/v1/studies'))
+        self.assertEqual('/v1/studies/{study_id}/subjects', endpoint_template('http://example.com/v1/studies/9/subjects'))
+        self.assertEqual('/v1/subjects/{subject_id}/dayminutes/{date}',
+                         endpoint_template('http://example.com/v1/subjects/123/dayminutes/2014-06-11'))
+        self.assertEqual('/v1/subjects/{subject_id}/sleepepochs',
+                         endpoint_template('http://example.com/v1/subjects/123/sleepepochs?inbed=2014-06-11T22:00:00'))
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram(self):
+        histogram = Histogram(buckets=(0.1, 1.0, float('inf')))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value)
+        self.assertEqual([(0.1, 1), (1.0, 3), (float('inf'), 4)], histogram.cumulative())
+        self.assertEqual(1.0, histogram.quantile(0.5))
+        self.assertEqual(6.05, round(histogram.sum, 2))
+
+    def test_prometheus(self):
+        metrics = MetricsAggregator(buckets=(0.1, float('inf')))
+        metrics(RequestEvent('/v1/studies', 'http://example.com/v1/studies', status=200, latency=0.05, sign=0.001,
+                             bytes=100, retries=1))
+        metrics(RequestEvent('/v1/studies', 'http://example.com/v1/studies', latency=0.5, error=ValueError()))
+        text = metrics.to_prometheus()
+        self.assertTrue('actigraph_requests_total{endpoint="/v1/studies",status="200"} 1\n' in text)
+        self.assertTrue('actigraph_requests_total{endpoint="/v1/studies",status="error"} 1\n' in text)
+        self.assertTrue('actigraph_response_bytes_total{endpoint="/v1/studies"} 100\n' in text)
+        self.assertTrue('actigraph_retries_total{endpoint="/v1/studies"} 1\n' in text)
+        self.assertTrue('actigraph_request_duration_seconds_bucket{endpoint="/v1/studies",le="0.1"} 1\n' in text)
+        self.assertTrue('actigraph_request_duration_seconds_bucket{endpoint="/v1/studies",le="+Inf"} 2\n' in text)
+        self.assertTrue('actigraph_request_phase_seconds_count{endpoint="/v1/studies",phase="sign"} 1\n' in text)
+
+    def test_statsd(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(5)
+        exporter = StatsdExporter(port=receiver.getsockname()[1])
+        exporter(RequestEvent('/v1/subjects/{subject_id}', 'http://example.com/v1/subjects/1', status=200,
+                              latency=0.25, bytes=10))
+        lines = receiver.recv(4096).decode('utf-8').split('\n')
+        exporter.close()
+        receiver.close()
+        self.assertTrue('actigraph.v1.subjects.subject_id.requests.200:1|c' in lines)
+        self.assertTrue('actigraph.v1.subjects.subject_id.latency:250.000|ms' in lines)
+        self.assertTrue('actigraph.v1.subjects.subject_id.bytes:10|c' in lines)
+
+
+class TestClientInstrumentation(unittest.TestCase):
+    """Events emitted by the client against the fake server"""
+
+    def setUp(self):
+        self.server = FakeActigraphServer(EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY, subjects=2).start()
+        self.events = []
+        self.ac = ActigraphClient(self.server.base_url, EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY,
+                                  instrumentation=Instrumentation([self.events.append]))
+
+    def tearDown(self):
+        self.ac.close()
+        self.server.stop()
+
+    def test_events(self):
+        self.ac.get_subject(SUBJECTS_PER_STUDY + 1)
+        self.ac.get_subject(SUBJECTS_PER_STUDY + 2)
+        first, second = self.events
+        self.assertEqual('/v1/subjects/{subject_id}', first.endpoint)
+        self.assertEqual(200, first.status)
+        self.assertTrue(first.connect > 0)
+        self.assertEqual(0.0, second.connect)
+        for event in self.events:
+            self.assertTrue(event.sign > 0)
+            self.assertTrue(event.ttfb >= 0 and event.body >= 0)
+            self.assertTrue(event.latency >= event.ttfb)
+            self.assertTrue(event.bytes > 0)
+            self.assertEqual(0, event.retries)
+
+    def test_untimed_adapter(self):
+        with ActigraphClient(self.server.base_url, EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY,
+                             instrumentation=Instrumentation([self.events.append]),
+                             adapter=requests.adapters.HTTPAdapter()) as ac:
+            ac.get_subject(SUBJECTS_PER_STUDY + 1)
+        event = self.events[0]
+        self.assertEqual(200, event.status)
+        self.assertEqual(None, event.connect)
+        self.assertEqual(None, event.ttfb)
+        metrics = MetricsAggregator()
+        metrics(event)
+        self.assertEqual(0, metrics.endpoints[event.endpoint].phases['ttfb'].count)
+
+    def test_streamed_event(self):
+        self.ac.get('/v1/subjects/%d/bouts' % (SUBJECTS_PER_STUDY + 1), stream=True)
+        self.assertEqual(int(self.events[0].bytes), self.events[0].bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
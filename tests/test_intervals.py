@@ -0,0 +1,47 @@
+__author__ = 'isparks'
+
+import unittest
+
+from actigraph.intervals import IntervalIndex
+
+
+class TestIntervalIndex(unittest.TestCase):
+
+    def test_merge(self):
+        index = IntervalIndex([(10, 20), (30, 40), (50, 60)])
+        self.assertEqual([(10, 20), (30, 40), (50, 60)], list(index))
+        # Meeting intervals are merged
+        index.add(20, 25)
+        self.assertEqual([(10, 25), (30, 40), (50, 60)], list(index))
+        # An interval spanning several swallows them
+        index.add(24, 55)
+        self.assertEqual([(10, 60)], list(index))
+        index.add(0, 5)
+        index.add(70, 80)
+        self.assertEqual([(0, 5), (10, 60), (70, 80)], list(index))
+        # Empty intervals are ignored
+        index.add(90, 90)
+        self.assertEqual(3, len(index))
+
+    def test_overlaps(self):
+        index = IntervalIndex([(10, 20), (30, 40)])
+        self.assertTrue(index.overlaps(15, 16))
+        self.assertTrue(index.overlaps(5, 11))
+        self.assertTrue(index.overlaps(19, 31))
+        self.assertFalse(index.overlaps(20, 30))
+        self.assertFalse(index.overlaps(0, 10))
+        self.assertFalse(index.overlaps(40, 50))
+        self.assertFalse(IntervalIndex().overlaps(0, 10))
+
+    def test_gaps(self):
+        index = IntervalIndex([(10, 20), (30, 40)])
+        self.assertEqual([(0, 10), (20, 30), (40, 50)], index.gaps(0, 50))
+        self.assertEqual([(20, 25)], index.gaps(15, 25))
+        self.assertEqual([], index.gaps(12, 18))
+        self.assertEqual([(0, 5)], index.gaps(0, 5))
+        self.assertTrue(index.covers(30, 40))
+        self.assertFalse(index.covers(30, 41))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+__author__ = 'isparks'
+
+import datetime
+import unittest
+
+import requests
+
+from actigraph.client import ActigraphClient
+from actigraph.fakeserver import FakeActigraphServer, SUBJECTS_PER_STUDY
+from actigraph.models import BoutPeriod, DayStat, SleepEpoch, Study, Subject
+
+EXAMPLE_ACCESS_KEY = u'testaccesskey'
+EXAMPLE_SECRET_KEY = u'testsecretkey'
+
+
+class TestModels(unittest.TestCase):
+
+    def test_from_record(self):
+        study = Study.from_record({'Id': 21, 'Name': 'Demo Study', 'DateCreated': '2014-05-28T21:12:36Z'})
+        self.assertEqual(21, study.id)
+        self.assertEqual('Demo Study', study.name)
+        self.assertEqual(datetime.datetime(2014, 5, 28, 21, 12, 36), study.date_created)
+
+    def test_lazy_parse(self):
+        epoch = SleepEpoch.from_record({'Timestamp': '2014-06-11T22:00:00', 'AxisYCounts': 5, 'Sleep': True})
+        self.assertEqual('2014-06-11T22:00:00', epoch._timestamp)
+        self.assertEqual(datetime.datetime(2014, 6, 11, 22), epoch.timestamp)
+        self.assertEqual(datetime.datetime(2014, 6, 11, 22), epoch._timestamp)
+        self.assertEqual(None, epoch.axis_x_counts)
+
+    def test_dates(self):
+        self.assertEqual(datetime.date(2014, 6, 11), DayStat.from_record({'Date': '2014-06-11T00:00:00'}).date)
+        self.assertEqual(datetime.date(1980, 1, 1), Subject.from_record({'DOB': '1980-01-01T00:00:00'}).dob)
+
+    def test_slots(self):
+        bout = BoutPeriod.from_record({'StartDateTime': '2014-06-11T00:00:00', 'Type': 'Wear'})
+        self.assertFalse(hasattr(bout, '__dict__'))
+        self.assertRaises(AttributeError, setattr, bout, 'other', 1)
+
+    def test_to_record(self):
+        record = {'Id': 21, 'Name': 'Demo Study', 'DateCreated': '2014-05-28T21:12:36'}
+        study = Study.from_record(record)
+        self.assertEqual(record, study.to_record())
+        study.date_created
+        self.assertEqual(record, study.to_record())
+        self.assertEqual(study, Study.from_record(record))
+
+
+class TestClientModels(unittest.TestCase):
+    """API methods returning models from the fake server"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeActigraphServer(EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY, subjects=3, days=5).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.ac = ActigraphClient(self.server.base_url, EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY)
+
+    def tearDown(self):
+        self.ac.close()
+
+    def test_models(self):
+        self.assertEqual([1], [study.id for study in self.ac.get_all_studies(model=True)])
+        self.assertEqual('Study 1', self.ac.get_study(1, model=True).name)
+        subjects = self.ac.get_all_subjects(1, model=True)
+        self.assertEqual([SUBJECTS_PER_STUDY + i for i in (1, 2, 3)], [subject.id for subject in subjects])
+        self.assertEqual(1, self.ac.get_subject(subjects[0].id, model=True).study_id)
+        self.assertEqual(5, len(self.ac.get_subject_daily_stats(subjects[0].id, model=True)))
+
+    def test_streamed_models(self):
+        inbed = datetime.datetime(2014, 6, 1, 22)
+        epochs = list(self.ac.get_subject_sleep_epochs(SUBJECTS_PER_STUDY + 1, inbed,
+                                                       inbed + datetime.timedelta(hours=8), stream=True, model=True))
+        self.assertEqual(8 * 60 + 1, len(epochs))
+        self.assertEqual(inbed, epochs[0].timestamp)
+
+    def test_failure_raises(self):
+        self.assertRaises(requests.HTTPError, self.ac.get_subject, 99, model=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
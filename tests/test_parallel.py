@@ -0,0 +1,66 @@
+__author__ = 'isparks'
+
+import threading
+import time
+import unittest
+
+from actigraph.parallel import imap_ordered, imap_unordered
+
+
+class TestParallel(unittest.TestCase):
+    """Tests of the worker pool helpers"""
+
+    def test_imap_unordered(self):
+        results = list(imap_unordered(lambda i: i * 2, range(20), max_workers=4))
+        self.assertEqual([(i, i * 2) for i in range(20)], sorted(results))
+
+    def test_imap_ordered(self):
+        # Early items are slowest, results must still come back in order
+        def slow(i):
+            time.sleep((5 - i) * 0.01 if i < 5 else 0)
+            return i * 2
+        self.assertEqual([(i, i * 2) for i in range(20)], list(imap_ordered(slow, range(20), max_workers=4)))
+
+    def test_imap_ordered_window(self):
+        lock = threading.Lock()
+        started = []
+
+        def record(i):
+            with lock:
+                started.append(i)
+            return i
+
+        results = imap_ordered(record, range(100), max_workers=2, window=3)
+        next(results)
+        time.sleep(0.05)
+        self.assertTrue(len(started) <= 4)
+        results.close()
+
+    def test_imap_ordered_prefetch(self):
+        # While the consumer holds an item the window items after it are fetched, even with a window of one
+        for window in (1, 3):
+            lock = threading.Lock()
+            started = []
+
+            def record(i):
+                with lock:
+                    started.append(i)
+                return i
+
+            results = imap_ordered(record, range(100), max_workers=window, window=window)
+            self.assertEqual((0, 0), next(results))
+            time.sleep(0.05)
+            with lock:
+                self.assertEqual(list(range(window + 1)), sorted(started))
+            self.assertEqual((1, 1), next(results))
+            time.sleep(0.05)
+            with lock:
+                self.assertEqual(list(range(window + 2)), sorted(started))
+            results.close()
+
+    def test_exception_raised(self):
+        def fail(i):
+            if i == 3:
+                raise ValueError(i)
+            return i
+        self.assertRaises(ValueError, list, imap_ordered(fail, range(10), max_workers=2))
@@ -0,0 +1,104 @@
+__author__ = 'isparks'
+
+import datetime
+import unittest
+
+from actigraph.client import ActigraphClient
+from actigraph.fakeserver import FakeActigraphServer, FakeData, SUBJECTS_PER_STUDY
+from actigraph.intervals import IntervalIndex
+from actigraph.planner import WearPlan, WearPlanner
+
+EXAMPLE_ACCESS_KEY = u'testaccesskey'
+EXAMPLE_SECRET_KEY = u'testsecretkey'
+
+SUBJECT_ID = SUBJECTS_PER_STUDY + 1
+START_DATE = datetime.date(2014, 6, 1)
+END_DATE = datetime.date(2014, 6, 30)
+
+
+class TestWearPlanner(unittest.TestCase):
+    """Planned fetches from a fake server whose subjects wear the device on about a quarter of days"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeActigraphServer(EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY, subjects=1, wear_fraction=0.25)
+        cls.server.start()
+        data = FakeData(subjects=1, wear_fraction=0.25)
+        cls.worn = [date for date in (START_DATE + datetime.timedelta(days=i) for i in range(30))
+                    if data.worn(SUBJECT_ID, date)]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.ac = ActigraphClient(self.server.base_url, EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY)
+        self.server.reset_counters()
+
+    def tearDown(self):
+        self.ac.close()
+
+    def test_daily_minutes(self):
+        planner = WearPlanner(self.ac, max_workers=4)
+        days = list(planner.iter_subject_daily_minutes(SUBJECT_ID, START_DATE, END_DATE))
+        self.assertTrue(0 < len(self.worn) < 15)
+        self.assertEqual(self.worn, [date for date, _ in days])
+        self.assertTrue(all(response.ok for _, response in days))
+        self.assertEqual(len(self.worn), planner.requested)
+        self.assertEqual(30 - len(self.worn), planner.skipped)
+        self.assertEqual(30 - len(self.worn) - 1, planner.saved)
+        self.assertEqual(len(self.worn) + 1, self.server.requests)
+
+    def test_daily_minutes_stream(self):
+        planner = WearPlanner(self.ac)
+        for date, records in planner.iter_subject_daily_minutes(SUBJECT_ID, START_DATE, END_DATE, stream=True):
+            self.assertEqual(1440, len(list(records)))
+
+    def test_sleep_epochs_bed_times(self):
+        planner = WearPlanner(self.ac, use_bed_times=True)
+        start, end = datetime.datetime(2014, 6, 1), datetime.datetime(2014, 7, 1)
+        nights = list(planner.iter_subject_sleep_epochs(SUBJECT_ID, start, end))
+        self.assertEqual([datetime.datetime.combine(date, datetime.time(22, 30)) for date in self.worn],
+                         [inbed for inbed, _, _ in nights])
+        self.assertEqual(2, planner.planning_requests)
+        # Every bed time overlaps wear, so nothing is skipped
+        self.assertEqual(0, planner.skipped)
+        self.assertEqual(len(self.worn) + 2, self.server.requests)
+
+    def test_sleep_score_windows(self):
+        planner = WearPlanner(self.ac)
+        start, end = datetime.datetime(2014, 6, 1), datetime.datetime(2014, 7, 1)
+        scores = list(planner.iter_subject_sleep_score(SUBJECT_ID, start, end))
+        self.assertEqual(self.worn, [inbed.date() for inbed, _, _ in scores])
+        self.assertEqual(30 - len(self.worn), planner.skipped)
+
+    def test_shared_plan(self):
+        planner = WearPlanner(self.ac, use_bed_times=True)
+        start, end = datetime.datetime(2014, 6, 1), datetime.datetime(2014, 7, 1)
+        plan = planner.plan(SUBJECT_ID, start, end)
+        list(planner.iter_subject_daily_minutes(SUBJECT_ID, START_DATE, END_DATE, plan=plan))
+        list(planner.iter_subject_sleep_epochs(SUBJECT_ID, start, end, plan=plan))
+        self.assertEqual(2, planner.planning_requests)
+        self.assertEqual(2 * len(self.worn) + 2, self.server.requests)
+
+    def test_long_bed_time_split(self):
+        planner = WearPlanner(self.ac, use_bed_times=True)
+        start, end = datetime.datetime(2014, 6, 1), datetime.datetime(2014, 6, 4)
+        inbed, outbed = datetime.datetime(2014, 6, 1, 22), datetime.datetime(2014, 6, 3, 4)
+        plan = WearPlan(SUBJECT_ID, start, end, IntervalIndex([(start, end)]), [(inbed, outbed)])
+        nights = list(planner.iter_subject_sleep_epochs(SUBJECT_ID, start, end, plan=plan))
+        midway = inbed + datetime.timedelta(hours=24)
+        self.assertEqual([(inbed, midway), (midway, outbed)], [(night[0], night[1]) for night in nights])
+        self.assertTrue(all(response.ok for _, _, response in nights))
+        self.assertEqual(2, self.server.requests)
+
+    def test_validation(self):
+        planner = WearPlanner(self.ac)
+        self.assertRaises(ValueError, planner.iter_subject_daily_minutes, SUBJECT_ID, END_DATE, START_DATE)
+        self.assertRaises(ValueError, planner.iter_subject_sleep_epochs, SUBJECT_ID,
+                          datetime.datetime(2014, 6, 2), datetime.datetime(2014, 6, 1))
+        self.assertEqual(0, self.server.requests)
+
+
+if __name__ == '__main__':
+    unittest.main()
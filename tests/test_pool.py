@@ -0,0 +1,89 @@
+__author__ = 'isparks'
+
+import unittest
+
+import mock
+
+from actigraph.fakeserver import FakeActigraphServer, SUBJECTS_PER_STUDY
+from actigraph.pool import ActigraphClientPool
+from actigraph.scheduler import RequestScheduler
+
+EXAMPLE_ACCESS_KEY = u'testaccesskey'
+EXAMPLE_SECRET_KEY = u'testsecretkey'
+OTHER_ACCESS_KEY = u'otheraccesskey'
+OTHER_SECRET_KEY = u'othersecretkey'
+
+
+class TestClientPool(unittest.TestCase):
+    """Routing across two keys of a fake server with two studies"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeActigraphServer(EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY, studies=2, subjects=10)
+        cls.server.add_key(OTHER_ACCESS_KEY, OTHER_SECRET_KEY)
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset_counters()
+        self.pool = ActigraphClientPool(self.server.base_url, [(EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY, [1]),
+                                                               (OTHER_ACCESS_KEY, OTHER_SECRET_KEY, [1, 2])])
+        self.gets = [mock.patch.object(client, 'get', wraps=client.get).start() for client in self.pool.clients]
+
+    def tearDown(self):
+        mock.patch.stopall()
+        self.pool.close()
+
+    def test_study_routing(self):
+        for _ in range(4):
+            self.assertEqual(200, self.pool.get_study(2).status_code)
+        self.assertEqual([0, 4], [get.call_count for get in self.gets])
+        self.assertRaises(ValueError, self.pool.get_study, 3)
+
+    def test_shared_study_spread(self):
+        snapshots = list(self.pool.get_study_snapshot(1, include=['stats'], max_workers=4))
+        self.assertEqual(10, len(snapshots))
+        self.assertTrue(all(snapshot.ok for snapshot in snapshots))
+        calls = [get.call_count for get in self.gets]
+        # The subject list and ten stats calls, shared between the keys
+        self.assertEqual(11, sum(calls))
+        self.assertTrue(min(calls) >= 3)
+
+    def test_subject_routing(self):
+        self.pool.get_all_subjects(2)
+        self.assertEqual(200, self.pool.get_subject_daily_stats(2 * SUBJECTS_PER_STUDY + 1).status_code)
+        self.assertEqual([0, 2], [get.call_count for get in self.gets])
+
+    def test_subject_lookup(self):
+        self.assertEqual(200, self.pool.get_subject_stats(2 * SUBJECTS_PER_STUDY + 3).status_code)
+        self.assertEqual('2', self.pool.study_of(2 * SUBJECTS_PER_STUDY + 3))
+        self.assertRaises(ValueError, self.pool.get_subject_stats, 99)
+
+    def test_iter_study_subject_data(self):
+        snapshots = list(self.pool.iter_study_subject_data(1, fetch=['subject'], prefetch=3))
+        self.assertEqual([SUBJECTS_PER_STUDY + i for i in range(1, 11)], [s.subject_id for s in snapshots])
+
+    def test_discover_studies(self):
+        pool = ActigraphClientPool(self.server.base_url, [(EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY)])
+        self.assertEqual(200, pool.get_study(2).status_code)
+        self.assertEqual(set(['1', '2']), pool.clients[0].studies)
+        self.assertEqual(['1', '2'], sorted(str(study['Id']) for study in pool.get_all_studies()))
+        pool.close()
+
+    def test_scheduler_per_key(self):
+        pool = ActigraphClientPool(self.server.base_url, [(EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY),
+                                                          (OTHER_ACCESS_KEY, OTHER_SECRET_KEY)],
+                                   make_scheduler=lambda: RequestScheduler(rate=100))
+        self.assertFalse(pool.clients[0].scheduler is pool.clients[1].scheduler)
+        self.assertFalse(pool.clients[0].session is pool.clients[1].session)
+        pool.close()
+
+    def test_unknown_method(self):
+        self.assertRaises(AttributeError, getattr, self.pool, 'get_everything')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+__author__ = 'isparks'
+
+import io
+import unittest
+
+import mock
+import requests
+from requests.adapters import BaseAdapter
+
+from actigraph.client import ActigraphClient
+from actigraph.scheduler import AIMDLimiter, RequestScheduler, RetryPolicy, TokenBucket
+
+EXAMPLE_ACCESS_KEY = u'testaccesskey'
+EXAMPLE_SECRET_KEY = u'testsecretkey'
+
+
+def make_response(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response._content = b'[]'
+    response.raw = io.BytesIO()
+    return response
+
+
+class SequenceAdapter(BaseAdapter):
+    """Transport adapter answering with a sequence of statuses (or exceptions), recording the requests sent"""
+    def __init__(self, outcomes):
+        super(SequenceAdapter, self).__init__()
+        self.outcomes = list(outcomes)
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append(request)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = make_response(outcome)
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        with mock.patch('time.time', return_value=100.0):
+            bucket = TokenBucket(rate=10, burst=2)
+            self.assertEqual([0.0, 0.0], [bucket.reserve(), bucket.reserve()])
+            self.assertAlmostEqual(0.1, bucket.reserve())
+            self.assertAlmostEqual(0.2, bucket.reserve())
+        with mock.patch('time.time', return_value=101.0):
+            self.assertEqual(0.0, bucket.reserve())
+
+
+class TestAIMDLimiter(unittest.TestCase):
+
+    def test_limit_enforced(self):
+        limiter = AIMDLimiter(initial=2)
+        self.assertTrue(limiter.try_acquire())
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+
+    def test_additive_increase(self):
+        limiter = AIMDLimiter(initial=2)
+        for _ in range(4):
+            limiter.acquire()
+            limiter.release()
+        self.assertTrue(limiter.limit >= 3)
+
+    def test_multiplicative_decrease(self):
+        limiter = AIMDLimiter(initial=16)
+        limiter.acquire()
+        limiter.release(throttled=True)
+        self.assertEqual(8, limiter.limit)
+
+    def test_one_decrease_per_window(self):
+        limiter = AIMDLimiter(initial=16)
+        for _ in range(4):
+            limiter.acquire()
+        with mock.patch('time.time', return_value=100.0):
+            for _ in range(4):
+                limiter.release(throttled=True, latency=0.5)
+        self.assertEqual(8, limiter.limit)
+        # A request sent after the cut cuts it again
+        limiter.acquire()
+        with mock.patch('time.time', return_value=101.0):
+            limiter.release(throttled=True, latency=0.5)
+        self.assertEqual(4, limiter.limit)
+
+    def test_failure_leaves_limit(self):
+        limiter = AIMDLimiter(initial=4)
+        limiter.acquire()
+        limiter.release(failed=True)
+        self.assertEqual(4, limiter.limit)
+        self.assertEqual(0, limiter.in_flight)
+
+    def test_slow_response_decreases(self):
+        limiter = AIMDLimiter(initial=16, latency_threshold=1.0, minimum=10)
+        limiter.acquire()
+        limiter.release(latency=2.0)
+        self.assertEqual(10, limiter.limit)
+
+    def test_waiters_told_of_release(self):
+        limiter = AIMDLimiter(initial=1)
+        waiter = mock.Mock()
+        limiter.add_waiter(waiter)
+        limiter.acquire()
+        limiter.release()
+        self.assertEqual(1, waiter.call_count)
+        limiter.remove_waiter(waiter)
+        limiter.acquire()
+        limiter.release()
+        self.assertEqual(1, waiter.call_count)
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_retry_after_seconds(self):
+        policy = RetryPolicy()
+        self.assertEqual(7.0, policy.delay(0, make_response(429, {'Retry-After': '7'})))
+
+    def test_retry_after_date(self):
+        policy = RetryPolicy()
+        with mock.patch('time.time', return_value=1402500000.0):
+            delay = policy.delay(0, make_response(503, {'Retry-After': 'Wed, 11 Jun 2014 15:20:10 GMT'}))
+        self.assertEqual(10.0, delay)
+
+    def test_retry_after_capped(self):
+        policy = RetryPolicy(max_backoff=5.0)
+        self.assertEqual(5.0, policy.delay(0, make_response(429, {'Retry-After': '3600'})))
+
+    def test_backoff_capped(self):
+        policy = RetryPolicy(backoff=1.0, max_backoff=5.0)
+        for attempt in range(10):
+            self.assertTrue(0 <= policy.delay(attempt, make_response(500)) <= min(5.0, 2 ** attempt))
+
+
+class TestRequestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.sleep = mock.patch('time.sleep').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_retries_then_succeeds(self):
+        responses = [make_response(429, {'Retry-After': '3'}), make_response(503), make_response(200)]
+        response = RequestScheduler(retry=RetryPolicy(max_retries=3)).call(lambda: responses.pop(0))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(3.0, self.sleep.call_args_list[0][0][0])
+
+    def test_budget_exhausted_returns_last_response(self):
+        send = mock.MagicMock(side_effect=lambda: make_response(503))
+        response = RequestScheduler(retry=RetryPolicy(max_retries=2)).call(send)
+        self.assertEqual(503, response.status_code)
+        self.assertEqual(3, send.call_count)
+
+    def test_not_retried(self):
+        send = mock.MagicMock(side_effect=lambda: make_response(404))
+        self.assertEqual(404, RequestScheduler().call(send).status_code)
+        self.assertEqual(1, send.call_count)
+
+    def test_error_does_not_grow_limit(self):
+        limiter = AIMDLimiter(initial=4)
+        scheduler = RequestScheduler(limiter=limiter)
+
+        def send():
+            raise ValueError()
+        self.assertRaises(ValueError, scheduler.call, send)
+        self.assertRaises(requests.ConnectionError, scheduler.call,
+                          mock.MagicMock(side_effect=requests.ConnectionError), retry_errors=(requests.ConnectionError,))
+        self.assertEqual(4, limiter.limit)
+        self.assertEqual(0, limiter.in_flight)
+
+    def test_errors_retried_then_raised(self):
+        send = mock.MagicMock(side_effect=requests.ConnectionError('down'))
+        scheduler = RequestScheduler(retry=RetryPolicy(max_retries=1), limiter=AIMDLimiter(initial=4))
+        self.assertRaises(requests.ConnectionError, scheduler.call, send, retry_errors=(requests.ConnectionError,))
+        self.assertEqual(2, send.call_count)
+        self.assertEqual(0, scheduler.limiter.in_flight)
+
+    def test_client_resigns_each_attempt(self):
+        ac = ActigraphClient('http://example.com', EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY)
+        adapter = SequenceAdapter([requests.ConnectionError('reset'), 429, 200])
+        ac.session.mount('http://', adapter)
+        with mock.patch.object(ac.auth, 'make_headers', wraps=ac.auth.make_headers) as make_headers:
+            response = ac.get_study(1)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(3, make_headers.call_count)
+        self.assertTrue(all('Authorization' in request.headers for request in adapter.sent))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+__author__ = 'isparks'
+
+import threading
+import time
+import unittest
+
+import mock
+
+from actigraph.client import ActigraphClient
+from actigraph.singleflight import SingleFlight
+
+EXAMPLE_ACCESS_KEY = u'testaccesskey'
+EXAMPLE_SECRET_KEY = u'testsecretkey'
+
+
+def run_threads(count, target):
+    # All threads wait until the last has started, then call target at once
+    lock = threading.Lock()
+    go = threading.Event()
+    started = [0]
+    results = [None] * count
+
+    def work(i):
+        with lock:
+            started[0] += 1
+            if started[0] == count:
+                go.set()
+        go.wait()
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_share_one(self):
+        flight = SingleFlight()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return object()
+
+        results = run_threads(8, lambda: flight.do('key', slow))
+        self.assertEqual(1, len(calls))
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual({}, flight.calls)
+
+    def test_error_shared(self):
+        flight = SingleFlight()
+
+        def fail():
+            time.sleep(0.1)
+            raise ValueError('boom')
+
+        results = run_threads(4, lambda: flight.do('key', fail))
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    def test_sequential_calls_not_shared(self):
+        flight = SingleFlight()
+        self.assertEqual([1, 2], [flight.do('key', lambda: 1), flight.do('key', lambda: 2)])
+
+
+class TestClientCoalescing(unittest.TestCase):
+
+    def slow_get(self, *args, **kwargs):
+        time.sleep(0.1)
+        return mock.MagicMock(status_code=200)
+
+    def test_duplicate_gets_coalesced(self):
+        ac = ActigraphClient('http://example.com', EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY)
+        with mock.patch.object(ac.session, 'get', side_effect=self.slow_get) as mocked:
+            results = run_threads(6, lambda: ac.get_subject(1))
+        self.assertEqual(1, mocked.call_count)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_coalesce_off(self):
+        ac = ActigraphClient('http://example.com', EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY, coalesce=False)
+        with mock.patch.object(ac.session, 'get', side_effect=self.slow_get) as mocked:
+            run_threads(3, lambda: ac.get_subject(1))
+        self.assertEqual(3, mocked.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+__author__ = 'isparks'
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import numpy as np
+    from actigraph.store import DAYMINUTES, SLEEPEPOCHS, EpochStore
+except ImportError:
+    np = None
+
+from actigraph.client import ActigraphClient
+from actigraph.fakeserver import FakeActigraphServer, SUBJECTS_PER_STUDY
+from actigraph.sync import SyncEngine, WatermarkStore
+
+EXAMPLE_ACCESS_KEY = u'testaccesskey'
+EXAMPLE_SECRET_KEY = u'testsecretkey'
+
+SUBJECT_ID = SUBJECTS_PER_STUDY + 1
+
+
+def minutes(date, hours=24):
+    start = datetime.datetime.combine(date, datetime.time())
+    return {'Minutes': [{'Timestamp': (start + datetime.timedelta(minutes=i)).strftime('%Y-%m-%dT%H:%M:%S'),
+                         'AxisYCounts': i, 'Steps': i % 7} for i in range(hours * 60)]}
+
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestEpochStore(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = EpochStore(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_append_read(self):
+        for day in (1, 2, 3):
+            self.assertEqual(1440, self.store.append(DAYMINUTES, 1, minutes(datetime.date(2014, 6, day))))
+        self.assertEqual(3 * 1440, self.store.rows(DAYMINUTES, 1))
+        everything = self.store.read(DAYMINUTES, 1)
+        self.assertEqual(list(range(1440)) * 3, everything['AxisYCounts'].tolist())
+        self.assertTrue(isinstance(everything['AxisYCounts'], np.memmap))
+
+        part = self.store.read(DAYMINUTES, 1, datetime.datetime(2014, 6, 1, 23, 58), datetime.datetime(2014, 6, 2, 0, 2))
+        self.assertEqual([1438, 1439, 0, 1], part['AxisYCounts'].tolist())
+        self.assertEqual(np.datetime64('2014-06-01T23:58:00'), part['Timestamp'][0])
+        self.assertEqual(1440, len(self.store.read(DAYMINUTES, 1, datetime.date(2014, 6, 3))['Steps']))
+        self.assertEqual(0, len(self.store.read(DAYMINUTES, 1, datetime.date(2014, 7, 1))['Steps']))
+        self.assertEqual(0, len(self.store.read(DAYMINUTES, 1, None, datetime.date(2014, 5, 1))['Steps']))
+
+    def test_overlap_dropped(self):
+        self.store.append(DAYMINUTES, 1, minutes(datetime.date(2014, 6, 1), hours=12))
+        self.assertEqual(720, self.store.append(DAYMINUTES, 1, minutes(datetime.date(2014, 6, 1))))
+        self.assertEqual(0, self.store.append(DAYMINUTES, 1, minutes(datetime.date(2014, 6, 1))))
+        self.assertEqual(list(range(1440)), self.store.read(DAYMINUTES, 1)['AxisYCounts'].tolist())
+        self.assertEqual(datetime.datetime(2014, 6, 1, 23, 59), self.store.last_timestamp(DAYMINUTES, 1))
+
+    def test_interrupted_append(self):
+        self.store.append(DAYMINUTES, 1, minutes(datetime.date(2014, 6, 1)))
+        # Half a row written to one column
+        with open(os.path.join(self.path, DAYMINUTES, '1', 'Steps.bin'), 'ab') as f:
+            f.write(b'\x01\x00')
+        self.assertEqual(1440, self.store.rows(DAYMINUTES, 1))
+        self.store.append(DAYMINUTES, 1, minutes(datetime.date(2014, 6, 2)))
+        self.assertEqual([i % 7 for i in range(1440)] * 2, self.store.read(DAYMINUTES, 1)['Steps'].tolist())
+
+    def test_empty(self):
+        self.assertEqual(0, self.store.rows(SLEEPEPOCHS, 1))
+        self.assertEqual(None, self.store.last_timestamp(SLEEPEPOCHS, 1))
+        self.assertEqual(0, len(self.store.read(SLEEPEPOCHS, 1)['Sleep']))
+        self.assertRaises(ValueError, self.store.read, 'bouts', 1)
+
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestStoreFetch(unittest.TestCase):
+    """Writing fetched and synced data into a store"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeActigraphServer(EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY, subjects=1, days=5).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = EpochStore(self.path)
+        self.ac = ActigraphClient(self.server.base_url, EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY)
+        self.server.reset_counters()
+
+    def tearDown(self):
+        self.ac.close()
+        shutil.rmtree(self.path)
+
+    def test_fetch_daily_minutes(self):
+        start, end = datetime.date(2014, 6, 1), datetime.date(2014, 6, 3)
+        self.assertEqual(3 * 1440, self.store.fetch_daily_minutes(self.ac, SUBJECT_ID, start, end))
+        self.assertEqual(3, self.server.requests)
+        # Days already stored are not fetched again, bar the last in case it was stored in part
+        self.assertEqual(1440, self.store.fetch_daily_minutes(self.ac, SUBJECT_ID, start, datetime.date(2014, 6, 4)))
+        self.assertEqual(5, self.server.requests)
+        stored = self.store.read(DAYMINUTES, SUBJECT_ID, datetime.date(2014, 6, 2), datetime.date(2014, 6, 3))
+        day = self.ac.get_subject_daily_minutes(SUBJECT_ID, datetime.date(2014, 6, 2)).json()['Minutes']
+        self.assertEqual([minute['AxisYCounts'] for minute in day], stored['AxisYCounts'].tolist())
+
+    def test_fetch_daily_minutes_completes_partial_day(self):
+        date = datetime.date(2014, 6, 1)
+        morning = self.ac.get_subject_daily_minutes(SUBJECT_ID, date).json()['Minutes'][:12 * 60]
+        self.store.append(DAYMINUTES, SUBJECT_ID, morning)
+        self.assertEqual(12 * 60, self.store.fetch_daily_minutes(self.ac, SUBJECT_ID, date, date))
+        self.assertEqual(1440, self.store.rows(DAYMINUTES, SUBJECT_ID))
+
+    def test_fetch_sleep_epochs(self):
+        start, end = datetime.datetime(2014, 6, 1, 22), datetime.datetime(2014, 6, 3, 6)
+        self.assertEqual(32 * 60 + 1, self.store.fetch_sleep_epochs(self.ac, SUBJECT_ID, start, end))
+        self.assertEqual(0, self.store.fetch_sleep_epochs(self.ac, SUBJECT_ID, start, end))
+        epochs = self.store.read(SLEEPEPOCHS, SUBJECT_ID)
+        self.assertEqual(np.datetime64('2014-06-03T06:00:00'), epochs['Timestamp'][-1])
+
+    def test_sync_handler(self):
+        delivered = []
+        engine = SyncEngine(self.ac, WatermarkStore(), start=datetime.datetime(2014, 6, 1), max_workers=2)
+        engine.sync_subject(SUBJECT_ID, self.store.sync_handler(lambda *args: delivered.append(args[1])),
+                            endpoints=['dayminutes', 'bouts'], until=datetime.datetime(2014, 6, 3, 12))
+        self.assertEqual(2 * 1440, self.store.rows(DAYMINUTES, SUBJECT_ID))
+        self.assertEqual(['bouts', 'dayminutes', 'dayminutes'], sorted(delivered))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+__author__ = 'isparks'
+
+import datetime
+import io
+import json
+import unittest
+
+import mock
+import requests
+
+from actigraph.client import ActigraphClient
+from actigraph.streaming import iter_json_records, iter_response_records
+
+EXAMPLE_ACCESS_KEY = u'testaccesskey'
+EXAMPLE_SECRET_KEY = u'testsecretkey'
+
+RECORDS = [{'Timestamp': '2014-06-11T00:%02d:00' % i, 'Steps': i * 100, 'Calories': 1.5, 'Wear': i % 2 == 0,
+            'Note': u'café [%d], {}' % i} for i in range(20)]
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def make_response(payload, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(json.dumps(payload).encode('utf-8'))
+    return response
+
+
+class TestIterJsonRecords(unittest.TestCase):
+    """Tests of incremental parsing at every chunk boundary"""
+
+    def check(self, payload, expected):
+        text = json.dumps(payload, indent=1)
+        for size in (1, 2, 3, 7, 64, len(text)):
+            self.assertEqual(expected, list(iter_json_records(chunked(text, size))))
+
+    def test_array(self):
+        self.check(RECORDS, RECORDS)
+
+    def test_nested_array(self):
+        self.check({'SubjectId': 12345, 'Date': '2014-06-11', 'Nested': {'a': [1]}, 'Minutes': RECORDS,
+                    'After': 1}, RECORDS)
+
+    def test_empty(self):
+        self.check([], [])
+        self.check({'SubjectId': 1, 'Minutes': []}, [])
+
+    def test_no_records(self):
+        self.assertRaises(ValueError, list, iter_json_records(['{"SubjectId": 1}']))
+
+    def test_truncated(self):
+        text = json.dumps(RECORDS)
+        self.assertRaises(ValueError, list, iter_json_records(chunked(text[:-20], 10)))
+
+    def test_records_yielded_before_end(self):
+        def chunks():
+            yield '[{"a": 1}, '
+            raise AssertionError("Read too far")
+        self.assertEqual({'a': 1}, next(iter_json_records(chunks())))
+
+
+class TestClientStream(unittest.TestCase):
+    """Tests of the client streaming mode"""
+
+    def setUp(self):
+        self.ac = ActigraphClient('http://example.com', EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY)
+
+    def test_iter_response_records(self):
+        response = make_response({'Minutes': RECORDS})
+        self.assertEqual(RECORDS, list(iter_response_records(response, chunk_size=5)))
+
+    def test_get_stream(self):
+        with mock.patch.object(self.ac.session, 'get', return_value=make_response({'Minutes': RECORDS})) as mocked:
+            records = self.ac.get_subject_daily_minutes(1, datetime.date(2014, 6, 11), stream=True)
+            self.assertTrue(mocked.call_args[1]['stream'])
+            self.assertEqual(RECORDS, list(records))
+
+    def test_stream_failure_raises(self):
+        with mock.patch.object(self.ac.session, 'get', return_value=make_response({}, 404)):
+            self.assertRaises(requests.HTTPError, self.ac.get, '/v1/subjects/1/bouts', stream=True)
+
+    def test_iter_daily_minutes_stream(self):
+        with mock.patch.object(self.ac.session, 'get', side_effect=lambda *a, **k: make_response(RECORDS)):
+            days = [(date, list(records)) for date, records in
+                    self.ac.iter_subject_daily_minutes(1, datetime.date(2014, 6, 11), datetime.date(2014, 6, 12),
+                                                       stream=True)]
+        self.assertEqual([(datetime.date(2014, 6, 11), RECORDS), (datetime.date(2014, 6, 12), RECORDS)], days)
+
+    def test_iter_sleep_epochs_stream(self):
+        with mock.patch.object(self.ac.session, 'get', side_effect=lambda *a, **k: make_response(RECORDS)):
+            start = datetime.datetime(2014, 6, 10, 12, 0)
+            epochs = list(self.ac.iter_subject_sleep_epochs(1, start, start + datetime.timedelta(hours=36),
+                                                            stream=True))
+        # Both windows return the same epochs, the repeats are dropped
+        self.assertEqual(RECORDS, epochs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+__author__ = 'isparks'
+
+import datetime
+import json
+import unittest
+
+import mock
+import requests
+
+from actigraph.client import ActigraphClient, isodate, isodatetime
+from actigraph.sync import SyncEngine, WatermarkStore
+
+EXAMPLE_ACCESS_KEY = u'testaccesskey'
+EXAMPLE_SECRET_KEY = u'testsecretkey'
+
+
+def make_response(payload):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps(payload).encode('utf-8')
+    return response
+
+
+class TestWatermarkStore(unittest.TestCase):
+
+    def test_get_set(self):
+        store = WatermarkStore()
+        self.assertEqual(None, store.get(1, 'bouts'))
+        store.set(1, 'bouts', datetime.datetime(2014, 6, 1, 12, 30))
+        self.assertEqual(datetime.datetime(2014, 6, 1, 12, 30), store.get(1, 'bouts'))
+        self.assertEqual(None, store.get(2, 'bouts'))
+
+
+class TestSyncEngine(unittest.TestCase):
+    """Tests that each run only fetches what is new"""
+
+    def setUp(self):
+        self.ac = ActigraphClient('http://example.com', EXAMPLE_ACCESS_KEY, EXAMPLE_SECRET_KEY)
+        self.ac.get = mock.MagicMock('get', side_effect=self.fake_get)
+        self.engine = SyncEngine(self.ac, WatermarkStore(), start=datetime.datetime(2014, 6, 1), max_workers=2)
+        self.delivered = []
+        # Days the device has not uploaded yet
+        self.late = set()
+
+    def fake_get(self, url):
+        if url == '/v1/studies/9/subjects':
+            return make_response([{'Id': 1}, {'Id': 2}])
+        if url.endswith('/daystats'):
+            dates = [datetime.date(2014, 6, 1) + datetime.timedelta(days=i) for i in range(30)]
+            return make_response([{'Date': isodate(date)} for date in dates if isodate(date) not in self.late])
+        if '/dayminutes/' in url:
+            date = url.rsplit('/', 1)[1]
+            return make_response({'Minutes': [] if date in self.late else [{'Timestamp': date + 'T00:00:00'}]})
+        return make_response([{'Url': url}])
+
+    def handler(self, subject_id, endpoint, records):
+        self.delivered.append((subject_id, endpoint, len(records)))
+
+    def urls(self):
+        return [c[0][0] for c in self.ac.get.call_args_list]
+
+    def test_first_sync(self):
+        counts = self.engine.sync_subject(1, self.handler, until=datetime.datetime(2014, 6, 4, 9, 0))
+        self.assertEqual({'daystats': 3, 'dayminutes': 3, 'bouts': 1, 'bedtimes': 1}, counts)
+        self.assertTrue('/v1/subjects/1/dayminutes/2014-06-03' in self.urls())
+        self.assertFalse('/v1/subjects/1/dayminutes/2014-06-04' in self.urls())
+
+    def test_second_sync_fetches_delta(self):
+        self.engine.sync_subject(1, self.handler, until=datetime.datetime(2014, 6, 4, 9, 0))
+        self.ac.get.reset_mock()
+        counts = self.engine.sync_subject(1, self.handler, until=datetime.datetime(2014, 6, 8, 9, 0))
+        # The last two days of the first run were not settled so are fetched again
+        self.assertEqual(6, counts['daystats'])
+        self.assertEqual(['/v1/subjects/1/dayminutes/2014-06-%02d' % day for day in range(2, 8)],
+                         sorted(url for url in self.urls() if '/dayminutes/' in url))
+        bouts = [url for url in self.urls() if '/bouts' in url][0]
+        self.assertTrue('start=%s' % isodatetime(datetime.datetime(2014, 6, 2, 9, 0)) in bouts)
+        self.assertEqual(datetime.datetime(2014, 6, 6), self.engine.store.get(1, 'dayminutes'))
+        self.assertEqual(datetime.datetime(2014, 6, 6, 9, 0), self.engine.store.get(1, 'bouts'))
+
+    def test_same_day_fetches_no_minutes(self):
+        engine = SyncEngine(self.ac, WatermarkStore(), start=datetime.datetime(2014, 6, 1), immutable_after=0)
+        engine.sync_subject(1, self.handler, until=datetime.datetime(2014, 6, 4, 9, 0))
+        self.ac.get.reset_mock()
+        counts = engine.sync_subject(1, self.handler, until=datetime.datetime(2014, 6, 4, 10, 0))
+        self.assertEqual(0, counts['dayminutes'])
+        self.assertEqual(0, counts['daystats'])
+
+    def test_late_upload_fetched(self):
+        self.late = {'2014-06-03'}
+        self.engine.sync_subject(1, self.handler, endpoints=['daystats', 'dayminutes'],
+                                 until=datetime.datetime(2014, 6, 4, 9, 0))
+        self.assertEqual([(1, 'daystats', 2), (1, 'dayminutes', 1), (1, 'dayminutes', 1), (1, 'dayminutes', 0)],
+                         self.delivered)
+        # The device uploads the day after the first sync
+        self.late = set()
+        self.delivered = []
+        self.engine.sync_subject(1, self.handler, endpoints=['daystats', 'dayminutes'],
+                                 until=datetime.datetime(2014, 6, 5, 9, 0))
+        self.assertEqual([(1, 'daystats', 3), (1, 'dayminutes', 1), (1, 'dayminutes', 1), (1, 'dayminutes', 1)],
+                         self.delivered)
+
+    def test_unknown_endpoint(self):
+        self.assertRaises(ValueError, self.engine.sync_subject, 1, self.handler, endpoints=['steps'])
+        self.assertEqual(0, self.ac.get.call_count)
+
+    def test_sync_study(self):
+        results = dict(self.engine.sync_study(9, self.handler, endpoints=['bouts'],
+                                              until=datetime.datetime(2014, 6, 4)))
+        self.assertEqual({1: {'bouts': 1}, 2: {'bouts': 1}}, results)
+
+
+if __name__ == '__main__':
+    unittest.main()